@@ -57,6 +57,7 @@ Domain Experts:
 Configuration Details:
 Environment Variables:
  - OPENAI_API_KEY              : Secure API access for AI model operations.
+ - AGENT_MODEL / AGENT_FAST_MODEL / AGENT_FALLBACK_MODEL : Models each agent routes between.
  - MAX_WEBSOCKET_CONNECTIONS   : Upper limit for simultaneous WebSocket connections.
  - RATE_LIMIT_PER_MINUTE       : Maximum allowed requests per client per minute.
 
@@ -83,28 +84,43 @@ For more details, refer to inline documentation and the project wiki.
 """
 
 import asyncio
+import json
 import os
+import sys
 from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import Dict, List
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
 
-import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+
+# shared/ lives next to the service directories
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from shared.assets import AssetFiles, cached_templates, register_asset_helpers  # noqa: E402
+from shared.logs import SAMPLED, RequestIdMiddleware, configure_logging  # noqa: E402
+from shared.metrics import DURATION_BUCKETS, instrument  # noqa: E402
+from shared.profiling import add_profiling  # noqa: E402
+
+from .routing import AgentModels, ModelRouter, ModelTarget  # noqa: E402
 
 # Load environment variables early
 load_dotenv()
 
 app = FastAPI(title="DunamisMax AI Agents")
+app.add_middleware(RequestIdMiddleware)
 
 # Define base directory and mount static files and templates
-from pathlib import Path
-
 BASE_DIR = Path(__file__).parent
-app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
-templates = Jinja2Templates(directory=BASE_DIR / "templates")
+logger = configure_logging("ai_agents", "DunamisMaxAgents", BASE_DIR / "logs" / "ai-agents.log")
+app.mount("/static", AssetFiles(directory=BASE_DIR / "static"), name="static")
+templates = cached_templates(BASE_DIR / "templates")
+register_asset_helpers(templates, BASE_DIR / "static")
+metrics = instrument(app, "ai_agents")
+watchdog = add_profiling(app, logger)
 
 # -----------------------------------------------------------------------------
 # Chatbot Configurations
@@ -221,11 +237,123 @@ class RateLimiter:
         return False
 
 
+# ---------------------------------------------------------------------
+# Model Routing
+# ---------------------------------------------------------------------
+# Model for agent replies
+AGENT_MODEL = os.getenv("AGENT_MODEL", "chatgpt-4o-latest")
+# Faster, cheaper model for short prompts without code; empty to always use AGENT_MODEL
+AGENT_FAST_MODEL = os.getenv("AGENT_FAST_MODEL", "gpt-4o-mini")
+# Backup model when the others are slow or failing; empty for none
+AGENT_FALLBACK_MODEL = os.getenv("AGENT_FALLBACK_MODEL", "gpt-4o")
+# OpenAI-compatible endpoint serving the backup model (default: OpenAI itself)
+AGENT_FALLBACK_BASE_URL = os.getenv("AGENT_FALLBACK_BASE_URL", "")
+# Per-agent overrides, e.g. {"python_developer": {"model": "gpt-4o", "fast_model": null}}
+AGENT_MODELS = os.getenv("AGENT_MODELS", "")
+# Seconds a model gets to produce its first token before the next one is tried
+MODEL_FIRST_TOKEN_DEADLINE = float(os.getenv("MODEL_FIRST_TOKEN_DEADLINE", "8"))
+# Seconds a model that timed out or failed is tried last
+MODEL_COOLDOWN = float(os.getenv("MODEL_COOLDOWN", "60"))
+# Prompts up to this many characters (and without code) go to AGENT_FAST_MODEL
+SIMPLE_PROMPT_CHARS = int(os.getenv("SIMPLE_PROMPT_CHARS", "280"))
+
+
+def load_agent_models() -> dict[str, dict]:
+    if not AGENT_MODELS:
+        return {}
+    try:
+        overrides = json.loads(AGENT_MODELS)
+    except json.JSONDecodeError as e:
+        logger.error(f"Ignoring AGENT_MODELS: invalid JSON ({e})")
+        return {}
+    unknown = set(overrides) - set(AVAILABLE_AGENTS)
+    if unknown:
+        logger.warning(f"AGENT_MODELS names unknown agents: {', '.join(sorted(unknown))}")
+    return overrides
+
+
+fallback_model = AGENT_FALLBACK_MODEL or (AGENT_MODEL if AGENT_FALLBACK_BASE_URL else "")
+model_router = ModelRouter(
+    AgentModels(
+        ModelTarget(AGENT_MODEL),
+        ModelTarget(AGENT_FAST_MODEL) if AGENT_FAST_MODEL else None,
+        (
+            (ModelTarget(fallback_model, AGENT_FALLBACK_BASE_URL, "AGENT_FALLBACK_API_KEY"),)
+            if fallback_model
+            else ()
+        ),
+    ),
+    load_agent_models(),
+    deadline=MODEL_FIRST_TOKEN_DEADLINE,
+    cooldown=MODEL_COOLDOWN,
+    simple_prompt_chars=SIMPLE_PROMPT_CHARS,
+)
+# (base URL, API key) -> AsyncOpenAI client, reused across messages
+openai_clients: dict = {}
+
+
+def openai_client(target: ModelTarget):
+    from openai import AsyncOpenAI
+
+    api_key = os.getenv(target.api_key_env or "OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY environment variable not set")
+    key = (target.base_url, api_key)
+    if key not in openai_clients:
+        openai_clients[key] = AsyncOpenAI(api_key=api_key, base_url=target.base_url)
+    return openai_clients[key]
+
+
+def open_reply_stream(agent_id: str, message: str):
+    """Returns a function that starts the agent's reply on a given model."""
+    messages = [
+        {"role": "system", "content": AVAILABLE_AGENTS[agent_id]["system_prompt"]},
+        {"role": "user", "content": message},
+    ]
+
+    async def open_stream(target: ModelTarget) -> AsyncIterator[str]:
+        stream = await openai_client(target).chat.completions.create(
+            model=target.model, messages=messages, stream=True
+        )
+        return content_chunks(stream)
+
+    return open_stream
+
+
+async def content_chunks(stream) -> AsyncIterator[str]:
+    """The non-empty text deltas of a chat completion stream."""
+    try:
+        async for chunk in stream:
+            if chunk.choices and getattr(chunk.choices[0].delta, "content", None):
+                yield chunk.choices[0].delta.content
+    finally:
+        # Closes the HTTP response when a slow model is abandoned
+        await stream.close()
+
+
+async def prepend(first: Optional[str], rest: AsyncIterator[str]) -> AsyncIterator[str]:
+    if first is not None:
+        yield first
+    async for content in rest:
+        yield content
+
+
+def answered(target: ModelTarget, seconds: float) -> None:
+    first_token_latency.observe(seconds, model=target.label)
+
+
+def failed_over(target: ModelTarget, reason: str) -> None:
+    model_failovers.inc(model=target.label, reason=reason)
+    logger.warning(f"Model {target.label} {reason} before its first token; failing over")
+
+
 # ---------------------------------------------------------------------
 # Agent Manager
 # ---------------------------------------------------------------------
 MAX_WEBSOCKET_CONNECTIONS = int(os.getenv("MAX_WEBSOCKET_CONNECTIONS", "1000"))
 RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "10"))
+# /health reports "degraded" above this share of MAX_WEBSOCKET_CONNECTIONS
+HEALTH_DEGRADED_RATIO = float(os.getenv("HEALTH_DEGRADED_RATIO", "0.9"))
 
 
 class AgentManager:
@@ -281,43 +409,31 @@ class AgentManager:
             return
 
         try:
-            # Import and initialize the OpenAI client using your API key
-            from openai import OpenAI
-
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                raise ValueError("OPENAI_API_KEY environment variable not set")
-            client = OpenAI(api_key=api_key)
-
-            # Create a streaming chat completion using the new OpenAI API.
-            # Make sure to use model "chatgpt-4o-latest" everywhere.
-            stream = client.chat.completions.create(
-                model="chatgpt-4o-latest",
-                messages=[
-                    {"role": "system", "content": AVAILABLE_AGENTS[agent_id]["system_prompt"]},
-                    {"role": "user", "content": message},
-                ],
-                stream=True,
-            )
+            # The whole reply streams for a while; only the wait for its start counts as slow
+            with watchdog.watch(f"WS /ws/chat/{agent_id} first token"):
+                target, first, chunks = await model_router.stream(
+                    agent_id,
+                    message,
+                    open_reply_stream(agent_id, message),
+                    on_first_token=answered,
+                    on_failover=failed_over,
+                )
+            logger.info(f"Agent {agent_id} answered by {target.label}", extra=SAMPLED)
 
             first_chunk = True
             # Stream response chunks to the client
-            for chunk in stream:
-                # The new API returns a delta object for each chunk.
-                if hasattr(chunk.choices[0].delta, "content"):
-                    content = chunk.choices[0].delta.content
-                    if content:
-                        await websocket.send_json(
-                            {
-                                "type": "message",
-                                "role": "assistant",
-                                "content": content,
-                                "is_chunk": True,
-                                "is_first_chunk": first_chunk,
-                            }
-                        )
-                        first_chunk = False
-                        await asyncio.sleep(0.01)
+            async for content in prepend(first, chunks):
+                await websocket.send_json(
+                    {
+                        "type": "message",
+                        "role": "assistant",
+                        "content": content,
+                        "is_chunk": True,
+                        "is_first_chunk": first_chunk,
+                    }
+                )
+                first_chunk = False
+                await asyncio.sleep(0.01)
             # Signal that the response stream is complete
             await websocket.send_json(
                 {
@@ -328,7 +444,7 @@ class AgentManager:
                 }
             )
         except Exception as e:
-            print(f"Error getting response from OpenAI: {e}")
+            logger.exception(f"Error getting response from OpenAI: {e}")
             await websocket.send_json(
                 {
                     "type": "message",
@@ -341,6 +457,28 @@ class AgentManager:
 
 agent_manager = AgentManager()
 
+metrics.gauge(
+    "ai_agents_websocket_connections",
+    "Open agent chat WebSocket connections",
+    lambda: agent_manager.total_connections,
+)
+metrics.gauge(
+    "ai_agents_websocket_connections_max",
+    "Configured WebSocket connection limit",
+    lambda: MAX_WEBSOCKET_CONNECTIONS,
+)
+model_failovers = metrics.counter(
+    "ai_agents_model_failovers_total",
+    "Replies moved to the next model (reason: timeout or error before the first token)",
+    labels=("model", "reason"),
+)
+first_token_latency = metrics.histogram(
+    "ai_agents_first_token_seconds",
+    "Time from request to the first reply token, by model",
+    labels=("model",),
+    buckets=DURATION_BUCKETS,
+)
+
 
 # ---------------------------------------------------------------------
 # HTTP Endpoints
@@ -382,6 +520,26 @@ async def chat_page(request: Request, agent_name: str):
     return templates.TemplateResponse("chat.html", {"request": request, "agent": agent})
 
 
+@app.get("/health")
+async def health_check():
+    """
+    Report WebSocket capacity, whether an OpenAI key is configured and the
+    time to first token and failures per model;
+    "degraded" once connections pass HEALTH_DEGRADED_RATIO of the limit
+    or when no key is set.
+    """
+    connections = agent_manager.total_connections
+    full = connections >= MAX_WEBSOCKET_CONNECTIONS * HEALTH_DEGRADED_RATIO
+    status = "degraded" if full or not os.getenv("OPENAI_API_KEY") else "ok"
+    return {
+        "status": status,
+        "connections": connections,
+        "capacity": MAX_WEBSOCKET_CONNECTIONS,
+        "openai_configured": bool(os.getenv("OPENAI_API_KEY")),
+        "models": model_router.snapshot(),
+    }
+
+
 @app.get("/privacy")
 async def privacy(request: Request):
     """
@@ -410,7 +568,7 @@ async def websocket_endpoint(websocket: WebSocket, agent_name: str):
     except WebSocketDisconnect:
         await agent_manager.disconnect(websocket)
     except Exception as e:
-        print(f"Error in websocket: {e}")
+        logger.exception(f"Error in websocket: {e}")
         await agent_manager.disconnect(websocket)
 
 
@@ -418,4 +576,6 @@ async def websocket_endpoint(websocket: WebSocket, agent_name: str):
 # Run the Application
 # ---------------------------------------------------------------------
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8200)
+    import uvicorn
+
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8200)
@@ -0,0 +1,260 @@
+"""
+Model routing for the AI agents.
+
+Each agent has a primary model, an optional fast model for short, simple
+prompts, and optional fallbacks (another model, or the same model behind a
+different OpenAI-compatible endpoint). For every message the router orders
+these candidates:
+
+  1. the fast model, if the prompt is simple (short, no code, few lines),
+  2. the primary model,
+  3. the fallbacks, in the order configured,
+
+then moves any candidate that is currently slow or failing to the back.
+
+A candidate gets MODEL_FIRST_TOKEN_DEADLINE seconds to produce its first token.
+If it misses the deadline or fails before then, the next candidate is tried.
+The last candidate has no deadline because there is nothing left to fail
+over to. Once a token has been sent to the client the reply is committed to
+that model; later errors are not retried, because the client already shows
+half an answer.
+
+Time to first token, timeouts and errors are recorded per model. A model is
+slow when the median of its samples from the last LATENCY_MAX_AGE cooldowns
+is past the deadline; older samples no longer count, so a model that was moved
+to the back is tried again once its slow samples expire. It is failing for
+MODEL_COOLDOWN seconds after a timeout or an error.
+"""
+
+import asyncio
+import time
+from collections import deque
+from statistics import median
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from urllib.parse import urlparse
+
+# Samples of time to first token kept per model
+LATENCY_WINDOW = 50
+# Samples older than this many cooldowns no longer count towards "slow"
+LATENCY_MAX_AGE = 10
+
+CODE_MARKERS = ("```", "def ", "class ", "function ", "#include", "SELECT ", "Traceback")
+
+
+class FirstTokenTimeout(Exception):
+    """Raised when a model does not produce its first token before the deadline."""
+
+
+class ModelTarget:
+    """
+    A model name and, for fallbacks, the OpenAI-compatible endpoint that
+    serves it and the environment variable holding its API key.
+    """
+
+    __slots__ = ("model", "base_url", "api_key_env")
+
+    def __init__(
+        self, model: str, base_url: Optional[str] = None, api_key_env: Optional[str] = None
+    ) -> None:
+        self.model = model
+        self.base_url = base_url or None
+        self.api_key_env = api_key_env or None
+
+    @property
+    def label(self) -> str:
+        if self.base_url is None:
+            return self.model
+        return f"{self.model}@{urlparse(self.base_url).netloc or self.base_url}"
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, ModelTarget) and self.label == other.label
+
+    def __hash__(self) -> int:
+        return hash(self.label)
+
+    def __repr__(self) -> str:
+        return f"ModelTarget({self.label!r})"
+
+
+class AgentModels:
+    """The models one agent may use."""
+
+    __slots__ = ("primary", "fast", "fallbacks")
+
+    def __init__(
+        self,
+        primary: ModelTarget,
+        fast: Optional[ModelTarget] = None,
+        fallbacks: tuple[ModelTarget, ...] = (),
+    ) -> None:
+        self.primary = primary
+        self.fast = fast
+        self.fallbacks = fallbacks
+
+    def override(self, config: dict) -> "AgentModels":
+        """
+        A copy with the keys of config replaced: "model", "fast_model" (null
+        for none) and "fallback_model" (null for none).
+        """
+        primary, fast, fallbacks = self.primary, self.fast, self.fallbacks
+        if config.get("model"):
+            primary = ModelTarget(config["model"])
+        if "fast_model" in config:
+            fast = ModelTarget(config["fast_model"]) if config["fast_model"] else None
+        if "fallback_model" in config:
+            # Served by the same endpoint as the default fallback
+            model, endpoint = config["fallback_model"], self.fallbacks[:1]
+            base_url = endpoint[0].base_url if endpoint else None
+            api_key_env = endpoint[0].api_key_env if endpoint else None
+            fallbacks = (ModelTarget(model, base_url, api_key_env),) if model else ()
+        return AgentModels(primary, fast, fallbacks)
+
+
+class ModelStats:
+    """Recent time-to-first-token samples and failures of one model."""
+
+    __slots__ = ("samples", "requests", "timeouts", "errors", "failed_at")
+
+    def __init__(self) -> None:
+        # (time.monotonic() when recorded, seconds to first token)
+        self.samples: deque[tuple[float, float]] = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.failed_at: Optional[float] = None
+
+    def record(self, first_token: float) -> None:
+        self.requests += 1
+        self.samples.append((time.monotonic(), first_token))
+        self.failed_at = None
+
+    def record_failure(self, timed_out: bool) -> None:
+        self.requests += 1
+        if timed_out:
+            self.timeouts += 1
+        else:
+            self.errors += 1
+        self.failed_at = time.monotonic()
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(first_token for _, first_token in self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def healthy(self, deadline: float, cooldown: float) -> bool:
+        now = time.monotonic()
+        if self.failed_at is not None and now - self.failed_at < cooldown:
+            return False
+        since = now - LATENCY_MAX_AGE * cooldown
+        recent = [first_token for recorded, first_token in self.samples if recorded >= since]
+        return not recent or median(recent) <= deadline
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "first_token_p50": self.percentile(0.5),
+            "first_token_p95": self.percentile(0.95),
+        }
+
+
+class ModelRouter:
+    """Chooses and orders the models for each message and tracks their latency."""
+
+    def __init__(
+        self,
+        defaults: AgentModels,
+        overrides: dict[str, dict],
+        deadline: float,
+        cooldown: float,
+        simple_prompt_chars: int,
+    ) -> None:
+        self.defaults = defaults
+        self.agents = {
+            agent_id: defaults.override(config) for agent_id, config in overrides.items()
+        }
+        self.deadline = deadline
+        self.cooldown = cooldown
+        self.simple_prompt_chars = simple_prompt_chars
+        self.stats: dict[ModelTarget, ModelStats] = {}
+
+    def models_for(self, agent_id: str) -> AgentModels:
+        return self.agents.get(agent_id, self.defaults)
+
+    def stats_for(self, target: ModelTarget) -> ModelStats:
+        stats = self.stats.get(target)
+        if stats is None:
+            stats = self.stats[target] = ModelStats()
+        return stats
+
+    def is_simple(self, message: str) -> bool:
+        """Short prompts without code that a smaller model answers as well."""
+        if len(message) > self.simple_prompt_chars or message.count("\n") > 3:
+            return False
+        return not any(marker in message for marker in CODE_MARKERS)
+
+    def candidates(self, agent_id: str, message: str) -> list[ModelTarget]:
+        models = self.models_for(agent_id)
+        ordered = [models.primary, *models.fallbacks]
+        if models.fast is not None and self.is_simple(message):
+            ordered.insert(0, models.fast)
+        unique = list(dict.fromkeys(ordered))
+        # Stable sort: healthy candidates first, each group in preference order
+        return sorted(unique, key=lambda target: not self.healthy(target))
+
+    def healthy(self, target: ModelTarget) -> bool:
+        return self.stats_for(target).healthy(self.deadline, self.cooldown)
+
+    async def stream(
+        self,
+        agent_id: str,
+        message: str,
+        open_stream: Callable[[ModelTarget], Awaitable[AsyncIterator[str]]],
+        on_first_token: Optional[Callable[[ModelTarget, float], None]] = None,
+        on_failover: Optional[Callable[[ModelTarget, str], None]] = None,
+    ) -> tuple[ModelTarget, Optional[str], AsyncIterator[str]]:
+        """
+        Open a reply stream on the first candidate that produces a token in
+        time. Returns the model used, its first chunk (None if the reply was
+        empty) and an iterator over the remaining chunks. Raises the last
+        error if every candidate fails. on_first_token gets the model and its
+        time to first token; on_failover the model given up on and why
+        ("timeout" or "error").
+        """
+        candidates = self.candidates(agent_id, message)
+        error: Optional[BaseException] = None
+        for position, target in enumerate(candidates):
+            last = position == len(candidates) - 1
+            started = time.perf_counter()
+            opened: list[AsyncIterator[str]] = []
+
+            async def first_token() -> Optional[str]:
+                chunks = await open_stream(target)
+                opened.append(chunks)
+                try:
+                    return await chunks.__anext__()
+                except StopAsyncIteration:
+                    return None
+
+            try:
+                first = await asyncio.wait_for(first_token(), None if last else self.deadline)
+            except Exception as e:
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                self.stats_for(target).record_failure(timed_out)
+                error = FirstTokenTimeout(target.label) if timed_out else e
+                if opened and hasattr(opened[0], "aclose"):
+                    await opened[0].aclose()
+                if on_failover is not None and not last:
+                    on_failover(target, "timeout" if timed_out else "error")
+                continue
+            elapsed = time.perf_counter() - started
+            self.stats_for(target).record(elapsed)
+            if on_first_token is not None:
+                on_first_token(target, elapsed)
+            return target, first, opened[0]
+        raise error if error is not None else RuntimeError("No models configured")
+
+    def snapshot(self) -> dict:
+        return {target.label: stats.to_dict() for target, stats in self.stats.items()}
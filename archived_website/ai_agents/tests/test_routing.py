@@ -0,0 +1,139 @@
+import asyncio
+import time
+
+import pytest
+
+from app import routing
+from app.routing import AgentModels, FirstTokenTimeout, ModelRouter, ModelTarget
+
+PRIMARY = ModelTarget("big")
+FAST = ModelTarget("small")
+FALLBACK = ModelTarget("big", "https://backup.example.com/v1", "BACKUP_KEY")
+
+
+def router(deadline=0.05, cooldown=60.0, overrides=None):
+    return ModelRouter(
+        AgentModels(PRIMARY, FAST, (FALLBACK,)),
+        overrides or {},
+        deadline=deadline,
+        cooldown=cooldown,
+        simple_prompt_chars=40,
+    )
+
+
+async def chunks(*texts, delay=0.0):
+    for text in texts:
+        await asyncio.sleep(delay)
+        yield text
+
+
+def test_targets_are_identified_by_model_and_endpoint():
+    assert PRIMARY == ModelTarget("big")
+    assert PRIMARY != FALLBACK
+    assert FALLBACK.label == "big@backup.example.com"
+
+
+def test_simple_prompts():
+    r = router()
+    assert r.is_simple("What's the capital of France?")
+    assert not r.is_simple("x" * 41)
+    assert not r.is_simple("fix this:\n```\nprint(1)\n```")
+    assert not r.is_simple("a\nb\nc\nd\ne")
+
+
+def test_candidate_order():
+    r = router()
+    assert r.candidates("general", "hi") == [FAST, PRIMARY, FALLBACK]
+    assert r.candidates("general", "def f(): pass") == [PRIMARY, FALLBACK]
+
+
+def test_overrides_keep_the_fallback_endpoint():
+    r = router(overrides={"coder": {"model": "coder", "fast_model": None, "fallback_model": "b"}})
+    fallback = ModelTarget("b", FALLBACK.base_url, FALLBACK.api_key_env)
+    assert r.candidates("coder", "hi") == [ModelTarget("coder"), fallback]
+
+
+def test_duplicates_are_tried_once():
+    r = ModelRouter(AgentModels(PRIMARY, PRIMARY, (PRIMARY,)), {}, 1.0, 60.0, 40)
+    assert r.candidates("general", "hi") == [PRIMARY]
+
+
+def test_failing_models_move_to_the_back():
+    r = router()
+    r.stats_for(FAST).record_failure(timed_out=True)
+    assert r.candidates("general", "hi") == [PRIMARY, FALLBACK, FAST]
+
+
+def test_slow_models_move_to_the_back():
+    r = router(deadline=1.0)
+    for _ in range(5):
+        r.stats_for(PRIMARY).record(2.0)
+    assert r.candidates("general", "a question with code: def f(): pass") == [FALLBACK, PRIMARY]
+
+
+def test_slow_verdict_expires(monkeypatch):
+    r = router(deadline=1.0, cooldown=1.0)
+    for _ in range(5):
+        r.stats_for(PRIMARY).record(2.0)
+    assert not r.healthy(PRIMARY)
+    later = time.monotonic() + routing.LATENCY_MAX_AGE + 1
+    monkeypatch.setattr(routing.time, "monotonic", lambda: later)
+    assert r.healthy(PRIMARY)
+    # A fresh slow sample demotes it again
+    r.stats_for(PRIMARY).record(2.0)
+    assert not r.healthy(PRIMARY)
+
+def test_stream_fails_over_on_timeout_and_error():
+    r = router()
+    tried, failovers = [], []
+
+    async def open_stream(target):
+        tried.append(target)
+        if target == FAST:
+            return chunks("late", delay=1.0)
+        if target == PRIMARY:
+            raise ConnectionError("down")
+        return chunks("Hello", " there")
+
+    async def run():
+        target, first, rest = await r.stream(
+            "general", "hi", open_stream, on_failover=lambda t, why: failovers.append((t, why))
+        )
+        return target, first, [text async for text in rest]
+
+    assert asyncio.run(run()) == (FALLBACK, "Hello", [" there"])
+    assert tried == [FAST, PRIMARY, FALLBACK]
+    assert failovers == [(FAST, "timeout"), (PRIMARY, "error")]
+    assert r.stats_for(FAST).timeouts == 1 and r.stats_for(PRIMARY).errors == 1
+
+
+def test_last_candidate_has_no_deadline():
+    r = router(deadline=0.01)
+
+    async def open_stream(target):
+        if target != FALLBACK:
+            raise ConnectionError("down")
+        return chunks("slow but only option", delay=0.05)
+
+    target, first, _ = asyncio.run(r.stream("general", "hi", open_stream))
+    assert (target, first) == (FALLBACK, "slow but only option")
+
+
+def test_every_candidate_failing_raises_the_last_error():
+    r = router(deadline=0.01)
+
+    async def open_stream(target):
+        if target == FALLBACK:
+            raise ValueError("fallback broke")
+        return chunks("late", delay=1.0)
+
+    with pytest.raises(ValueError, match="fallback broke"):
+        asyncio.run(r.stream("general", "hi", open_stream))
+
+
+def test_empty_reply():
+    async def open_stream(target):
+        return chunks()
+
+    target, first, _ = asyncio.run(router().stream("general", "hi", open_stream))
+    assert (target, first) == (FAST, None)
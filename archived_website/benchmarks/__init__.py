@@ -0,0 +1,7 @@
+"""
+Performance benchmarks for the DunamisMax services.
+
+Run from the archived_website directory:
+    python -m benchmarks.startup        # import time and time to first response
+    python -m benchmarks.asgi           # throughput, latency and allocations a request
+"""
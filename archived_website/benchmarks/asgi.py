@@ -0,0 +1,551 @@
+"""
+Request micro-benchmarks for the DunamisMax services.
+
+    python -m benchmarks.asgi                          # every service, 200 requests per scenario
+    python -m benchmarks.asgi notes converter_service -n 500
+    python -m benchmarks.asgi -c 8                     # 8 concurrent clients
+    python -m benchmarks.asgi --save-baseline          # store the results as the baseline
+    python -m benchmarks.asgi --json asgi.json         # also save the results
+
+Each service runs in its own interpreter (they all are the `app` package) and
+is driven in-process through its ASGI interface: no sockets, no server, so the
+numbers are the cost of the application itself. Scenarios:
+
+  dunamismax         GET / and GET /privacy (prerendered pages)
+  messenger          GET / and GET /privacy
+  ai_agents          GET /, GET /privacy and a streamed chat reply over the
+                     WebSocket, from a stand-in model that answers at once
+  converter_service  GET /, an MP3 -> WAV conversion from upload to
+                     "completed", a resumable upload and a status poll, with
+                     stand-in ffmpeg/ffprobe scripts that copy the input
+  notes              log in, then create, list, edit form, update and delete
+                     notes on the SQLite stand-in
+
+For every scenario, after a warm-up, it reports:
+  - throughput   requests a second over the timed run
+  - p50/p95/p99  latency in milliseconds
+  - alloc        peak memory allocated while serving one request (KiB, median)
+  - retained     memory still held after it (bytes a request, mean)
+
+Allocations are measured with tracemalloc in a separate, shorter run, so its
+overhead does not show in the timings.
+
+--save-baseline stores the results in benchmarks/baseline.json (or
+--baseline FILE); later runs are compared with it and exit with status 1 when
+a scenario's p50 or p95 latency or its allocations grew by more than
+--threshold (default 25%). Numbers only compare on the same machine, so keep
+the baseline where the check runs (e.g. the deploy host) rather than in git.
+The agent stream includes the service's 10 ms pause between chunks.
+"""
+
+import argparse
+import asyncio
+import importlib
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Optional
+
+from .startup import ROOT_DIR, SERVICES, lifespan, service_env
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# Metrics compared with the baseline, and the change below which a difference
+# is noise whatever the percentage (milliseconds, milliseconds, KiB)
+COMPARED = {"p50": 0.1, "p95": 0.2, "alloc": 4.0}
+
+NOTES_PASSWORD = "benchmark"
+
+# Stand-ins for the FFmpeg binaries: a successful -version, a plain audio
+# stream for ffprobe, and a "conversion" that copies the input to the output
+FAKE_FFMPEG = """#!/bin/sh
+if [ "$1" = "-version" ]; then echo "ffmpeg version benchmark"; exit 0; fi
+prev=""
+for arg; do
+    [ "$prev" = "-i" ] && input="$arg"
+    prev="$arg"
+done
+exec cp "$input" "$prev"
+"""
+FAKE_FFPROBE = """#!/bin/sh
+echo '{"format": {"duration": "1.0"},'
+echo ' "streams": [{"index": 0, "codec_type": "audio", "codec_name": "mp3"}]}'
+"""
+
+# Reply of the stand-in model, one chunk per entry
+REPLY_CHUNKS = ("Hello", "! How", " can I", " help", " today?")
+
+
+class Scenario:
+    """A named request (or short exchange) to repeat; run gets the iteration number."""
+
+    __slots__ = ("name", "run", "setup", "limit")
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[int], Awaitable[None]],
+        setup: Optional[Callable[[], Awaitable[None]]] = None,
+        limit: Optional[int] = None,
+    ) -> None:
+        self.name = name
+        self.run = run
+        self.setup = setup
+        # Most iterations worth running (for exchanges with built-in pauses)
+        self.limit = limit
+
+
+def expect(response, status: int = 200) -> None:
+    if response.status_code != status:
+        raise RuntimeError(
+            f"{response.request.method} {response.request.url.path}: "
+            f"{response.status_code} (expected {status})"
+        )
+
+
+def get(client, path: str) -> Callable[[int], Awaitable[None]]:
+    async def run(i: int) -> None:
+        expect(await client.get(path))
+
+    return run
+
+
+def pages(client, *paths: str) -> list[Scenario]:
+    return [Scenario(f"GET {path}", get(client, path)) for path in paths]
+
+
+# -------------------------------------------------------------------------
+# In-process WebSocket Client
+# -------------------------------------------------------------------------
+class WebSocketSession:
+    """A WebSocket connection to an ASGI app, without a server in between."""
+
+    def __init__(self, app, path: str) -> None:
+        self.app = app
+        self.path = path
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "WebSocketSession":
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": self.path,
+            "raw_path": self.path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"localhost")],
+            "client": ("127.0.0.1", 50000),
+            "server": ("localhost", 80),
+            "subprotocols": [],
+            "state": {},
+        }
+        self.task = asyncio.create_task(self.app(scope, self.inbox.get, self.outbox.put))
+        await self.inbox.put({"type": "websocket.connect"})
+        message = await self.outbox.get()
+        if message["type"] != "websocket.accept":
+            raise RuntimeError(f"WS {self.path}: {message['type']}")
+        return self
+
+    async def send_text(self, text: str) -> None:
+        await self.inbox.put({"type": "websocket.receive", "text": text})
+
+    async def receive_json(self) -> dict:
+        message = await self.outbox.get()
+        if message["type"] != "websocket.send":
+            raise RuntimeError(f"WS {self.path}: {message['type']}")
+        return json.loads(message["text"])
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.inbox.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, timeout=5)
+
+
+# -------------------------------------------------------------------------
+# Scenarios
+# -------------------------------------------------------------------------
+async def dunamismax_scenarios(module, client) -> list[Scenario]:
+    return pages(client, "/", "/privacy")
+
+
+async def messenger_scenarios(module, client) -> list[Scenario]:
+    return pages(client, "/", "/privacy")
+
+
+class FakeCompletions:
+    """chat.completions of an OpenAI client whose model answers immediately."""
+
+    async def create(self, **kwargs):
+        return FakeStream(REPLY_CHUNKS)
+
+
+class FakeStream:
+    def __init__(self, texts) -> None:
+        self.chunks = iter(
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+            for text in texts
+        )
+
+    def __aiter__(self) -> "FakeStream":
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def close(self) -> None:
+        pass
+
+
+async def ai_agents_scenarios(module, client) -> list[Scenario]:
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    module.openai_client = lambda target: fake_client
+
+    async def chat(i: int) -> None:
+        async with WebSocketSession(module.app, "/ws/chat/general_assistant") as ws:
+            await ws.send_text("Hi there")
+            while True:
+                message = await ws.receive_json()
+                if message.get("is_error"):
+                    raise RuntimeError(f"Chat reply failed: {message['content']}")
+                if message.get("is_complete"):
+                    break
+
+    return [*pages(client, "/", "/privacy"), Scenario("chat stream", chat, limit=50)]
+
+
+async def converter_service_scenarios(module, client) -> list[Scenario]:
+    audio = os.urandom(64 * 1024)
+    completed: list[str] = []
+
+    async def convert(i: int) -> None:
+        response = await client.post(
+            "/api/convert",
+            files={"file": ("clip.mp3", audio, "audio/mpeg")},
+            data={"output_format": "wav"},
+        )
+        expect(response)
+        task_id = response.json()["task_id"]
+        while True:
+            response = await client.get(f"/api/conversion-status/{task_id}")
+            expect(response)
+            status = response.json()["status"]
+            if status == "completed":
+                break
+            if status != "processing":
+                raise RuntimeError(f"Conversion {status}: {response.json()['error']}")
+            await asyncio.sleep(0.001)
+        completed.append(task_id)
+
+    async def upload(i: int) -> None:
+        response = await client.post(
+            "/api/uploads", json={"filename": "clip.mp3", "size": len(audio)}
+        )
+        expect(response, 201)
+        path = f"/api/uploads/{response.json()['upload_id']}"
+        expect(await client.put(path, content=audio, headers={"Upload-Offset": "0"}))
+        expect(await client.get(path))
+        expect(await client.delete(path), 204)
+
+    async def status(i: int) -> None:
+        expect(await client.get(f"/api/conversion-status/{completed[i % len(completed)]}"))
+
+    return [
+        *pages(client, "/"),
+        Scenario("convert mp3 -> wav", convert),
+        Scenario("resumable upload", upload),
+        Scenario("GET /api/conversion-status", status),
+    ]
+
+
+async def notes_scenarios(module, client) -> list[Scenario]:
+    expect(await client.post("/login", data={"password": NOTES_PASSWORD}), 302)
+    ids: list[int] = []
+
+    async def load_ids() -> None:
+        if not ids:
+            rows = await module.db.fetch_all("SELECT id FROM notes ORDER BY id")
+            ids.extend(row["id"] for row in rows)
+
+    def note(i: int) -> dict:
+        return {"title": f"Note {i}", "content": f"Benchmark note {i}\n" * 20}
+
+    async def create(i: int) -> None:
+        expect(await client.post("/notes/create", data=note(i)), 302)
+
+    async def edit_form(i: int) -> None:
+        expect(await client.get(f"/notes/{ids[i]}/edit"))
+
+    async def update(i: int) -> None:
+        expect(await client.post(f"/notes/{ids[i]}/edit", data=note(i + 1)), 302)
+
+    async def delete(i: int) -> None:
+        expect(await client.post(f"/notes/{ids[i]}/delete"), 302)
+
+    # Every scenario runs as often as "create", so each id is used once per step
+    return [
+        Scenario("create note", create),
+        Scenario("GET /", get(client, "/")),
+        Scenario("edit form", edit_form, setup=load_ids),
+        Scenario("update note", update, setup=load_ids),
+        Scenario("delete note", delete, setup=load_ids),
+    ]
+
+
+SCENARIOS = {
+    "dunamismax": dunamismax_scenarios,
+    "messenger": messenger_scenarios,
+    "ai_agents": ai_agents_scenarios,
+    "converter_service": converter_service_scenarios,
+    "notes": notes_scenarios,
+}
+
+
+def benchmark_env(service: str, work_dir: Path) -> dict[str, str]:
+    """service_env() plus the stand-ins and limits the scenarios need."""
+    for name, script in (("ffmpeg", FAKE_FFMPEG), ("ffprobe", FAKE_FFPROBE)):
+        path = work_dir / name
+        path.write_text(script)
+        path.chmod(0o755)
+    env = service_env(service, work_dir, template_cache=True)
+    env.update(
+        {
+            "FFMPEG_PATH": str(work_dir / "ffmpeg"),
+            "FFPROBE_PATH": str(work_dir / "ffprobe"),
+            # Conversions go through FFmpeg; no worker processes to start
+            "IMAGE_WORKERS": "0",
+            "NOTES_ADMIN_PASSWORD": NOTES_PASSWORD,
+            "RATE_LIMIT_PER_MINUTE": "1000000000",
+            # A benchmark is not a slow request
+            "SLOW_REQUEST_THRESHOLD": "0",
+        }
+    )
+    return env
+
+
+# -------------------------------------------------------------------------
+# Measurement
+# -------------------------------------------------------------------------
+def percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def timed(scenario: Scenario, numbers, iterations: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+
+    async def worker() -> None:
+        for i in itertools.islice(numbers, iterations // concurrency):
+            started = time.perf_counter()
+            await scenario.run(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "throughput": round(len(ordered) / elapsed, 1),
+        "p50": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99": round(percentile(ordered, 0.99) * 1000, 3),
+    }
+
+
+async def allocations(scenario: Scenario, numbers, iterations: int) -> dict:
+    """Peak KiB allocated during one request (median) and bytes retained after it (mean)."""
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for i in itertools.islice(numbers, iterations):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await scenario.run(i)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    return {
+        "alloc": round(statistics.median(peaks) / 1024, 1),
+        "retained": round(statistics.mean(retained)),
+    }
+
+
+async def run_service(service: str, iterations: int, concurrency: int) -> dict[str, dict]:
+    """Run every scenario of service (inside the service's own interpreter)."""
+    import httpx
+
+    # As `uvicorn app.main:app` run from the service directory
+    sys.path.insert(0, str(ROOT_DIR / service))
+    module = importlib.import_module("app.main")
+    results = {}
+    async with lifespan(module.app):
+        transport = httpx.ASGITransport(app=module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+            for scenario in await SCENARIOS[service](module, client):
+                count = min(iterations, scenario.limit or iterations)
+                warmup = max(1, count // 10)
+                numbers = itertools.count()
+                if scenario.setup is not None:
+                    await scenario.setup()
+                for i in itertools.islice(numbers, warmup):
+                    await scenario.run(i)
+                result = await timed(scenario, numbers, count, concurrency)
+                result.update(await allocations(scenario, numbers, max(1, count // 4)))
+                results[scenario.name] = result
+    return results
+
+
+def run_in_subprocess(service: str, iterations: int, concurrency: int) -> dict[str, dict]:
+    with tempfile.TemporaryDirectory(prefix=f"asgi-{service}-") as tmp:
+        work_dir = Path(tmp)
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.asgi",
+                "--run",
+                service,
+                "-n",
+                str(iterations),
+                "-c",
+                str(concurrency),
+            ],
+            cwd=work_dir,
+            env={**benchmark_env(service, work_dir), "PYTHONPATH": str(ROOT_DIR)},
+            capture_output=True,
+            text=True,
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f"{service} failed:\n{result.stderr.strip()}")
+    # The results are the last line; services may print to stdout before it
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# -------------------------------------------------------------------------
+# Reporting
+# -------------------------------------------------------------------------
+def compare(results: dict, baseline: dict, threshold: float) -> dict[tuple[str, str], dict]:
+    """Relative change of each compared metric, per (service, scenario) in both runs."""
+    changes = {}
+    for service, scenarios in results.items():
+        for name, result in scenarios.items():
+            before = baseline.get(service, {}).get(name)
+            if before is None:
+                continue
+            changes[service, name] = {}
+            for metric, noise in COMPARED.items():
+                old, new = before[metric], result[metric]
+                change = (new - old) / old if old else 0.0
+                regressed = change > threshold and new - old > noise
+                changes[service, name][metric] = (change, regressed)
+    return changes
+
+
+def print_table(results: dict, changes: dict) -> None:
+    columns = ("throughput", "p50", "p95", "p99", "alloc", "retained")
+    print(f"{'scenario':<44}" + "".join(f"{column:>12}" for column in columns))
+    for service, scenarios in results.items():
+        for name, result in scenarios.items():
+            print(f"{service + ' ' + name:<44}" + "".join(f"{result[c]:>12}" for c in columns))
+            change = changes.get((service, name))
+            if change:
+                cells = "".join(
+                    f"{f'{change[c][0]:+.0%}' + ('!' if change[c][1] else ''):>12}"
+                    if c in change
+                    else " " * 12
+                    for c in columns
+                )
+                print(f"{'  vs baseline':<44}{cells}")
+    print("requests/s, milliseconds, KiB peak a request, bytes retained a request")
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark requests to the DunamisMax services")
+    parser.add_argument("services", nargs="*", help=f"Any of: {', '.join(SERVICES)}")
+    parser.add_argument(
+        "-n", "--iterations", type=int, default=200, help="timed requests per scenario"
+    )
+    parser.add_argument("-c", "--concurrency", type=int, default=1, help="concurrent clients")
+    parser.add_argument(
+        "--baseline", metavar="FILE", type=Path, default=DEFAULT_BASELINE, help="baseline file"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="store these results as the baseline"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="relative increase that counts as a regression (default 0.25)",
+    )
+    parser.add_argument("--json", metavar="FILE", help="also write the results to FILE")
+    parser.add_argument("--run", metavar="SERVICE", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run:
+        print(json.dumps(asyncio.run(run_service(args.run, args.iterations, args.concurrency))))
+        return
+
+    unknown = set(args.services) - set(SERVICES)
+    if unknown:
+        parser.error(f"unknown service(s): {', '.join(sorted(unknown))}")
+    results = {}
+    for service in args.services or SERVICES:
+        results[service] = run_in_subprocess(service, args.iterations, args.concurrency)
+
+    report = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "iterations": args.iterations,
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+    changes = {}
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if (baseline["iterations"], baseline["concurrency"]) != (
+            args.iterations,
+            args.concurrency,
+        ):
+            print(
+                f"Baseline was run with -n {baseline['iterations']} -c {baseline['concurrency']};"
+                " comparing anyway",
+                file=sys.stderr,
+            )
+        changes = compare(results, baseline["results"], args.threshold)
+    print_table(results, changes)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+    regressions = [
+        f"{service} {name} {metric} {change:+.0%}"
+        for (service, name), metrics in changes.items()
+        for metric, (change, regressed) in metrics.items()
+        if regressed
+    ]
+    if regressions:
+        print(f"Regressions (over {args.threshold:.0%}):", *regressions, sep="\n  ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
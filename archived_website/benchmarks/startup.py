@@ -0,0 +1,195 @@
+"""
+Cold-start benchmark for the DunamisMax services.
+
+    python -m benchmarks.startup                        # every service, 5 runs each
+    python -m benchmarks.startup notes messenger -n 10
+    python -m benchmarks.startup --json startup.json    # also save the results
+    python -m benchmarks.startup --no-template-cache    # compile templates every time
+
+Every run starts a fresh interpreter, imports one service as uvicorn would
+and measures:
+  - import     importing the service's app.main (FastAPI and the other
+               dependencies included; httpx, used to drive the app, is not)
+  - startup    running its startup handlers (lifespan)
+  - first      the first GET of its landing page (cold template, route and
+               code caches)
+  - second     the same request again, for comparison
+  - total      interpreter launch to the end of the first response
+
+One discarded run per service comes first, so .pyc files and the Jinja
+bytecode cache are in place and the numbers describe a restart or a new
+worker, not a first deploy. Each service runs with its files in a temporary
+directory (notes on the SQLite stand-in, the converter without a RAM tier) so
+the benchmark needs no database and leaves nothing behind. Medians and
+minimums are reported in milliseconds.
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+SERVICES = ["dunamismax", "messenger", "ai_agents", "converter_service", "notes"]
+
+# Page each service is measured on (notes redirects "/" to the login page)
+LANDING_PAGES = {
+    "dunamismax": "/",
+    "messenger": "/",
+    "ai_agents": "/",
+    "converter_service": "/",
+    "notes": "/login",
+}
+PHASES = ("import", "startup", "first", "second", "total")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Run an ASGI app's startup handlers on entry and its shutdown handlers on exit."""
+    inbox: asyncio.Queue = asyncio.Queue()
+    outbox: asyncio.Queue = asyncio.Queue()
+    scope = {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}
+    task = asyncio.create_task(app(scope, inbox.get, outbox.put))
+    await inbox.put({"type": "lifespan.startup"})
+    message = await outbox.get()
+    if message["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"Startup failed: {message.get('message', message['type'])}")
+    try:
+        yield
+    finally:
+        await inbox.put({"type": "lifespan.shutdown"})
+        await outbox.get()
+        await task
+
+
+def service_env(service: str, work_dir: Path, template_cache: bool) -> dict[str, str]:
+    """Environment for one benchmark process: everything it writes goes to work_dir."""
+    env = dict(os.environ)
+    env.update(
+        {
+            "TEMPORARY_STORAGE": str(work_dir / "converter"),
+            "SCRATCH_MEMORY_DIR": "",
+            "NOTES_DB_BACKEND": "sqlite",
+            "NOTES_SQLITE_PATH": str(work_dir / "notes.sqlite3"),
+            "TEMPLATE_CACHE_DIR": str(work_dir / "jinja") if template_cache else "",
+            "LOG_LEVEL": "WARNING",
+        }
+    )
+    return env
+
+
+# -------------------------------------------------------------------------
+# Measured Process
+# -------------------------------------------------------------------------
+async def measure(service: str) -> dict[str, float]:
+    """Load service and time its start-up (runs inside the fresh interpreter)."""
+    import httpx
+
+    # As `uvicorn app.main:app` run from the service directory
+    sys.path.insert(0, str(ROOT_DIR / service))
+    started = time.perf_counter()
+    app = importlib.import_module("app.main").app
+    imported = time.perf_counter()
+
+    timings = {"import": imported - started}
+    async with lifespan(app):
+        timings["startup"] = time.perf_counter() - imported
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+            for phase in ("first", "second"):
+                request_started = time.perf_counter()
+                response = await client.get(LANDING_PAGES[service])
+                timings[phase] = time.perf_counter() - request_started
+                if phase == "first":
+                    timings["responded_at"] = time.time()
+                if response.status_code != 200:
+                    raise RuntimeError(f"GET {LANDING_PAGES[service]}: {response.status_code}")
+    return timings
+
+
+def run_once(service: str, work_dir: Path, template_cache: bool) -> dict[str, float]:
+    launched = time.time()
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--measure", service],
+        cwd=work_dir,
+        env={**service_env(service, work_dir, template_cache), "PYTHONPATH": str(ROOT_DIR)},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{service} failed:\n{result.stderr.strip()}")
+    # The timings are the last line; services may print to stdout before it
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    # Up to the first response; the second request and shutdown are not part of a cold start
+    timings["total"] = timings.pop("responded_at") - launched
+    return timings
+
+
+def benchmark(service: str, runs: int, template_cache: bool) -> dict[str, dict[str, float]]:
+    """Median and minimum of each phase over runs, in milliseconds."""
+    with tempfile.TemporaryDirectory(prefix=f"startup-{service}-") as tmp:
+        work_dir = Path(tmp)
+        run_once(service, work_dir, template_cache)  # warm-up: .pyc and template caches
+        samples = [run_once(service, work_dir, template_cache) for _ in range(runs)]
+    return {
+        phase: {
+            "median": round(statistics.median(s[phase] for s in samples) * 1000, 1),
+            "min": round(min(s[phase] for s in samples) * 1000, 1),
+        }
+        for phase in PHASES
+    }
+
+
+def print_table(results: dict[str, dict[str, dict[str, float]]]) -> None:
+    print(f"{'service':<18}" + "".join(f"{phase:>18}" for phase in PHASES))
+    for service, phases in results.items():
+        cells = "".join(
+            f"{phases[phase]['median']:>10.1f} ({phases[phase]['min']:>5.1f})" for phase in PHASES
+        )
+        print(f"{service:<18}{cells}")
+    print("milliseconds: median (min)")
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Measure cold start of the DunamisMax services")
+    parser.add_argument("services", nargs="*", help=f"Any of: {', '.join(SERVICES)}")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="measured runs per service")
+    parser.add_argument("--json", metavar="FILE", help="also write the results to FILE")
+    parser.add_argument(
+        "--no-template-cache", action="store_true", help="compile templates on every run"
+    )
+    parser.add_argument("--measure", metavar="SERVICE", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(asyncio.run(measure(args.measure))))
+        return
+
+    unknown = set(args.services) - set(SERVICES)
+    if unknown:
+        parser.error(f"unknown service(s): {', '.join(sorted(unknown))}")
+    results = {}
+    for service in args.services or SERVICES:
+        results[service] = benchmark(service, args.runs, not args.no_template_cache)
+    print_table(results)
+    if args.json:
+        report = {
+            "python": sys.version.split()[0],
+            "runs": args.runs,
+            "template_cache": not args.no_template_cache,
+            "results": results,
+        }
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
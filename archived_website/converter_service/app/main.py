@@ -1,19 +1,43 @@
 import asyncio
 import json
-import logging
 import os
 import re
+import shutil
+import sys
 import time
 import uuid
 from pathlib import Path
+from typing import Optional
 
 import aiofiles
-import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import FileResponse, JSONResponse
+from starlette.requests import ClientDisconnect
+
+# shared/ lives next to the service directories
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from shared.assets import AssetFiles, cached_templates, register_asset_helpers  # noqa: E402
+from shared.images import ImageEngine, UnsupportedImage  # noqa: E402
+from shared.logs import SAMPLED, RequestIdMiddleware, configure_logging  # noqa: E402
+from shared.metrics import DURATION_BUCKETS, instrument  # noqa: E402
+from shared.profiling import add_profiling  # noqa: E402
+
+from .storage import ScratchStorage, Tier  # noqa: E402
+from .tasks import BatchStatusRequest, TaskRegistry  # noqa: E402
+from .media import ProbeError, encode_segmented, probe, remux_args  # noqa: E402
+from .uploads import (  # noqa: E402
+    ChunkConflict,
+    CompleteUploadRequest,
+    CreateUploadRequest,
+    UploadError,
+    UploadSession,
+    parse_checksum,
+    write_chunk,
+)
 
 # Load environment variables
 load_dotenv()
@@ -28,6 +52,11 @@ MAX_FILE_SIZE_STR = os.getenv("MAX_FILE_SIZE", "10GB")
 UPLOAD_RETENTION_HOURS = int(os.getenv("UPLOAD_RETENTION_HOURS", "24"))
 CONVERSION_TIMEOUT = int(os.getenv("CONVERSION_TIMEOUT", "300"))
 FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+# Defaults to the ffprobe next to FFMPEG_PATH
+FFPROBE_PATH = os.getenv(
+    "FFPROBE_PATH",
+    str(Path(FFMPEG_PATH).with_name("ffprobe")) if os.sep in FFMPEG_PATH else "ffprobe",
+)
 ALLOWED_FORMATS_ENV = os.getenv("ALLOWED_FORMATS", None)
 MAX_CONCURRENT_CONVERSIONS = int(os.getenv("MAX_CONCURRENT_CONVERSIONS", "4"))
 TEMPORARY_STORAGE = os.getenv("TEMPORARY_STORAGE", None)
@@ -35,6 +64,37 @@ ENABLE_FILE_VALIDATION = os.getenv("ENABLE_FILE_VALIDATION", "true").lower() ==
 SANITIZE_FILENAMES = os.getenv("SANITIZE_FILENAMES", "true").lower() == "true"
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "60"))
+# Resumable uploads: suggested and maximum chunk size, and sessions open at once
+UPLOAD_CHUNK_SIZE_STR = os.getenv("UPLOAD_CHUNK_SIZE", "8MB")
+MAX_CHUNK_SIZE_STR = os.getenv("MAX_CHUNK_SIZE", "64MB")
+MAX_UPLOAD_SESSIONS = int(os.getenv("MAX_UPLOAD_SESSIONS", "32"))
+# Finished tasks remembered for status queries (they also expire with their files)
+MAX_TRACKED_TASKS = int(os.getenv("MAX_TRACKED_TASKS", "10000"))
+# RAM-backed scratch directory for small jobs ("" to keep everything on disk)
+SCRATCH_MEMORY_DIR = os.getenv(
+    "SCRATCH_MEMORY_DIR", "/dev/shm/dunamismax-converter" if Path("/dev/shm").is_dir() else ""
+)
+SCRATCH_MEMORY_BUDGET_STR = os.getenv("SCRATCH_MEMORY_BUDGET", "256MB")
+# Inputs larger than this always go to disk
+SCRATCH_SMALL_FILE_STR = os.getenv("SCRATCH_SMALL_FILE", "32MB")
+# How often /health re-checks the FFmpeg binary, in seconds
+FFMPEG_CHECK_INTERVAL = int(os.getenv("FFMPEG_CHECK_INTERVAL", "300"))
+# /health reports "degraded" when this many conversions wait per slot
+HEALTH_QUEUE_DEGRADED = float(os.getenv("HEALTH_QUEUE_DEGRADED", "2"))
+# Worker processes for in-process image conversion (0 sends images to FFmpeg)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(os.cpu_count() or 1)))
+# Largest width/height accepted for image resizing
+MAX_IMAGE_DIMENSION = int(os.getenv("MAX_IMAGE_DIMENSION", "10000"))
+# Copy streams the target container can hold instead of re-encoding them
+REMUX_ENABLED = os.getenv("REMUX_ENABLED", "true").lower() == "true"
+# Encode long videos as parallel segments joined without re-encoding
+SEGMENTED_ENCODING = os.getenv("SEGMENTED_ENCODING", "false").lower() == "true"
+# Only videos at least this long (seconds) are segmented
+SEGMENT_MIN_DURATION = float(os.getenv("SEGMENT_MIN_DURATION", "600"))
+# Target segment length in seconds (cuts happen at the next keyframe)
+SEGMENT_DURATION = float(os.getenv("SEGMENT_DURATION", "60"))
+# Segments of one video encoded at once (each also needs a conversion slot)
+SEGMENT_PARALLELISM = int(os.getenv("SEGMENT_PARALLELISM", str(MAX_CONCURRENT_CONVERSIONS)))
 
 
 def parse_size(size_str: str) -> int:
@@ -51,6 +111,10 @@ def parse_size(size_str: str) -> int:
 
 
 MAX_FILE_SIZE_BYTES = parse_size(MAX_FILE_SIZE_STR)
+UPLOAD_CHUNK_SIZE = parse_size(UPLOAD_CHUNK_SIZE_STR)
+MAX_CHUNK_SIZE = parse_size(MAX_CHUNK_SIZE_STR)
+SCRATCH_MEMORY_BUDGET = parse_size(SCRATCH_MEMORY_BUDGET_STR)
+SCRATCH_SMALL_FILE = parse_size(SCRATCH_SMALL_FILE_STR)
 
 # === Determine Directories ===
 BASE_DIR = Path(__file__).parent
@@ -59,25 +123,34 @@ LOG_DIR = BASE_DIR / "logs"
 TEMP_DIR = Path(TEMPORARY_STORAGE) if TEMPORARY_STORAGE else BASE_DIR
 UPLOAD_DIR = TEMP_DIR / "uploads"
 CONVERTED_DIR = TEMP_DIR / "converted"
-
-for directory in (LOG_DIR, UPLOAD_DIR, CONVERTED_DIR):
-    directory.mkdir(parents=True, exist_ok=True)
+SEGMENT_DIR = TEMP_DIR / "segments"
 
 # === Configure Logging ===
-logging.basicConfig(
-    level=LOG_LEVEL,
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler(LOG_DIR / "file-converter.log", mode="a"),
-    ],
+# Console plus a rotating JSON file, written by a background thread
+logger = configure_logging(
+    "converter_service", "DunamisMaxFiles", LOG_DIR / "file-converter.log", level=LOG_LEVEL
+)
+
+# === Scratch Storage ===
+# Small jobs live in RAM, everything else in UPLOAD_DIR / CONVERTED_DIR
+memory_root = Path(SCRATCH_MEMORY_DIR) if SCRATCH_MEMORY_DIR else None
+scratch = ScratchStorage(
+    disk=Tier("disk", TEMP_DIR, UPLOAD_DIR, CONVERTED_DIR),
+    memory=Tier("memory", memory_root, memory_root / "uploads", memory_root / "converted")
+    if memory_root
+    else None,
+    memory_budget=SCRATCH_MEMORY_BUDGET,
+    small_file_limit=SCRATCH_SMALL_FILE,
 )
-logger = logging.getLogger("DunamisMaxFiles")
 
 # === Create FastAPI App ===
 app = FastAPI(title=APP_NAME)
-app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
-templates = Jinja2Templates(directory=BASE_DIR / "templates")
+app.add_middleware(RequestIdMiddleware)
+app.mount("/static", AssetFiles(directory=BASE_DIR / "static"), name="static")
+templates = cached_templates(BASE_DIR / "templates")
+register_asset_helpers(templates, BASE_DIR / "static")
+metrics = instrument(app, "converter_service")
+watchdog = add_profiling(app, logger)
 
 # === Allowed Formats & Codec Parameters ===
 # Default codec parameters for each format:
@@ -135,11 +208,68 @@ else:
         "image": default_image,
     }
 
+# remux form field: "auto" copies streams when the target container can hold
+# them, "always" copies regardless (FFmpeg fails if it cannot), "never" re-encodes
+REMUX_MODES = ("auto", "always", "never")
+
 # === Concurrency Control ===
 conversion_semaphore = asyncio.Semaphore(MAX_CONCURRENT_CONVERSIONS)
 
-# In-memory tracking of conversion tasks
-conversion_tasks = {}
+# In-memory tracking of conversion tasks, forgotten along with their files
+conversion_tasks = TaskRegistry(MAX_TRACKED_TASKS, ttl=UPLOAD_RETENTION_HOURS * 3600)
+
+# Resumable uploads in progress, by upload id
+upload_sessions: dict[str, UploadSession] = {}
+
+# Still images are converted in warm worker processes; FFmpeg is the fallback
+image_engine = ImageEngine(IMAGE_WORKERS, timeout=CONVERSION_TIMEOUT)
+# Background task warming the image workers (see startup_event)
+image_engine_start = {"task": None}
+
+# === Metrics ===
+conversions_queued = metrics.gauge(
+    "converter_conversions_queued", "FFmpeg runs waiting for a free conversion slot"
+)
+conversions_running = metrics.gauge("converter_conversions_running", "FFmpeg runs in progress")
+conversion_wait = metrics.histogram(
+    "converter_conversion_wait_seconds",
+    "Time a conversion waited for a free slot",
+    buckets=DURATION_BUCKETS,
+)
+conversion_duration = metrics.histogram(
+    "converter_conversion_duration_seconds",
+    "Run time per conversion",
+    labels=("engine", "format", "status"),
+    buckets=DURATION_BUCKETS,
+)
+image_fallbacks = metrics.counter(
+    "converter_image_fallbacks_total", "Images the image engine handed to FFmpeg"
+)
+metrics.gauge(
+    "converter_image_workers",
+    "Image engine worker processes",
+    lambda: image_engine.workers if image_engine.available else 0,
+)
+metrics.gauge(
+    "converter_conversion_slots", "Concurrent conversion limit", lambda: MAX_CONCURRENT_CONVERSIONS
+)
+metrics.gauge(
+    "converter_scratch_memory_bytes", "Bytes held or reserved in the RAM scratch tier",
+    lambda: scratch.memory_used,
+)
+metrics.gauge(
+    "converter_scratch_memory_budget_bytes", "Size of the RAM scratch tier",
+    lambda: scratch.stats()["memory_budget"],
+)
+metrics.gauge("converter_tasks_tracked", "Conversion tasks held in memory", lambda: len(conversion_tasks))
+metrics.counter(
+    "converter_tasks_evicted_total",
+    "Conversion tasks forgotten (expired or least recently used)",
+    lambda: conversion_tasks.evicted,
+)
+
+# Result of the last FFmpeg check, refreshed in the background by /health
+ffmpeg_status = {"available": False, "checked_at": 0.0, "task": None}
 
 
 def sanitize_filename(filename: str) -> str:
@@ -147,6 +277,25 @@ def sanitize_filename(filename: str) -> str:
     return re.sub(r"[^A-Za-z0-9_.-]", "", filename)
 
 
+def image_options_args(
+    output_format: str, width: Optional[int], height: Optional[int], quality: Optional[int]
+) -> list[str]:
+    """FFmpeg arguments for resizing and quality, matching the image engine."""
+    args = []
+    if width or height:
+        # Fit inside the box, keep the aspect ratio, never enlarge
+        box_w = f"min(iw\\,{width})" if width else "iw"
+        box_h = f"min(ih\\,{height})" if height else "ih"
+        args += ["-vf", f"scale=w='{box_w}':h='{box_h}':force_original_aspect_ratio=decrease"]
+    if quality:
+        if output_format in ("jpg", "jpeg"):
+            # mjpeg uses qscale 2 (best) to 31 (worst)
+            args += ["-q:v", str(round(31 - (quality - 1) * 29 / 99))]
+        elif output_format == "webp":
+            args += ["-quality", str(quality)]
+    return args
+
+
 # === Helper Functions ===
 
 
@@ -166,6 +315,12 @@ async def verify_ffmpeg() -> bool:
         return False
 
 
+async def refresh_ffmpeg_status() -> bool:
+    available = await verify_ffmpeg()
+    ffmpeg_status.update(available=available, checked_at=time.time())
+    return available
+
+
 async def save_upload_file(upload_file: UploadFile, destination: Path) -> None:
     """
     Save an uploaded file to disk in chunks to avoid memory issues.
@@ -192,10 +347,82 @@ async def root(request: Request):
     return templates.TemplateResponse("files.html", {"request": request})
 
 
+def check_conversion_request(
+    file_ext: str,
+    output_format: str,
+    width: Optional[int],
+    height: Optional[int],
+    quality: Optional[int],
+    remux: str,
+) -> None:
+    """Raise a 400 HTTPException if the formats or options are not acceptable."""
+    # Build a set of valid formats from ALLOWED_FORMATS
+    valid_formats = {fmt for category in ALLOWED_FORMATS.values() for fmt in category.keys()}
+    if file_ext not in valid_formats or output_format not in valid_formats:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {output_format}")
+
+    if width or height or quality:
+        if output_format not in ALLOWED_FORMATS["image"]:
+            raise HTTPException(
+                status_code=400, detail="Resize and quality apply to image output only"
+            )
+        for name, value in (("width", width), ("height", height)):
+            if value is not None and not 1 <= value <= MAX_IMAGE_DIMENSION:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"{name} must be between 1 and {MAX_IMAGE_DIMENSION}",
+                )
+        if quality is not None and not 1 <= quality <= 100:
+            raise HTTPException(status_code=400, detail="quality must be between 1 and 100")
+
+    if remux not in REMUX_MODES:
+        raise HTTPException(
+            status_code=400, detail=f"remux must be one of: {', '.join(REMUX_MODES)}"
+        )
+
+
+def start_conversion(
+    task_id: str,
+    upload_path: Path,
+    tier: Tier,
+    output_format: str,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    quality: Optional[int] = None,
+    remux: str = "auto",
+) -> dict:
+    """
+    Track a conversion of upload_path and start it in the background. The
+    output goes to the same tier, in the room reserved when the input was placed.
+    """
+    output_path = tier.converted / f"{task_id}.{output_format}"
+    scratch.claim_output(upload_path, output_path)
+    conversion_tasks.add(task_id, output_path)
+    asyncio.create_task(
+        process_conversion(
+            task_id, upload_path, output_path, output_format, width, height, quality, remux
+        )
+    )
+    return {
+        "task_id": task_id,
+        "status": "processing",
+        "download_url": f"/download/{output_path.name}",
+    }
+
+
 @app.post("/api/convert")
-async def convert_file(file: UploadFile = File(...), output_format: str = Form(...)):
+async def convert_file(
+    file: UploadFile = File(...),
+    output_format: str = Form(...),
+    width: Optional[int] = Form(None),
+    height: Optional[int] = Form(None),
+    quality: Optional[int] = Form(None),
+    remux: str = Form("auto"),
+):
     try:
-        logger.info(f"Received conversion request: {file.filename} -> {output_format}")
+        logger.info(
+            f"Received conversion request: {file.filename} -> {output_format}", extra=SAMPLED
+        )
         if not file.filename:
             raise HTTPException(status_code=400, detail="No file provided")
 
@@ -205,11 +432,8 @@ async def convert_file(file: UploadFile = File(...), output_format: str = Form(.
 
         file_ext = Path(original_filename).suffix[1:].lower()
         output_format = output_format.lower()
-
-        # Build a set of valid formats from ALLOWED_FORMATS
-        valid_formats = {fmt for category in ALLOWED_FORMATS.values() for fmt in category.keys()}
-        if file_ext not in valid_formats or output_format not in valid_formats:
-            raise HTTPException(status_code=400, detail=f"Unsupported format: {output_format}")
+        remux = remux.lower()
+        check_conversion_request(file_ext, output_format, width, height, quality, remux)
 
         if ENABLE_FILE_VALIDATION:
             # Validate file size by seeking to the end of the underlying file
@@ -226,25 +450,28 @@ async def convert_file(file: UploadFile = File(...), output_format: str = Form(.
                 logger.error(f"Failed to validate file size: {e}")
 
         task_id = str(uuid.uuid4())
-        upload_path = UPLOAD_DIR / f"{task_id}_original.{file_ext}"
-        output_path = CONVERTED_DIR / f"{task_id}.{output_format}"
+        # Size unknown (no Content-Length on the part): treat as large
+        size = file.size if file.size is not None else MAX_FILE_SIZE_BYTES
+        upload_path = scratch.place(f"{task_id}_original.{file_ext}", size)
 
         # Save the uploaded file in chunks
-        await save_upload_file(file, upload_path)
+        try:
+            await save_upload_file(file, upload_path)
+        except Exception:
+            scratch.remove(upload_path)
+            raise
 
         # Track the conversion task and kick off processing asynchronously
-        conversion_tasks[task_id] = {
-            "status": "processing",
-            "output_path": output_path,
-            "error": None,
-        }
-        asyncio.create_task(process_conversion(task_id, upload_path, output_path, output_format))
-
-        return {
-            "task_id": task_id,
-            "status": "processing",
-            "download_url": f"/download/{output_path.name}",
-        }
+        return start_conversion(
+            task_id,
+            upload_path,
+            scratch.tier_of(upload_path),
+            output_format,
+            width,
+            height,
+            quality,
+            remux,
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -252,81 +479,407 @@ async def convert_file(file: UploadFile = File(...), output_format: str = Form(.
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+# === Resumable Uploads ===
+
+
+def get_upload_session(upload_id: str) -> UploadSession:
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+
+@app.post("/api/uploads", status_code=201)
+async def create_upload(body: CreateUploadRequest):
+    filename = sanitize_filename(body.filename) if SANITIZE_FILENAMES else body.filename
+    file_ext = Path(filename).suffix[1:].lower()
+    valid_formats = {fmt for category in ALLOWED_FORMATS.values() for fmt in category.keys()}
+    if file_ext not in valid_formats:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {file_ext}")
+    if body.size > MAX_FILE_SIZE_BYTES:
+        raise HTTPException(
+            status_code=400, detail=f"File too large. Maximum allowed is {MAX_FILE_SIZE_STR}."
+        )
+    if len(upload_sessions) >= MAX_UPLOAD_SESSIONS:
+        raise HTTPException(status_code=503, detail="Too many uploads in progress, try again later")
+
+    upload_id = uuid.uuid4().hex
+    path = scratch.place(f"{upload_id}.part", body.size)
+    session = UploadSession(upload_id, filename, file_ext, body.size, path)
+    try:
+        await asyncio.to_thread(session.preallocate)
+    except OSError as e:
+        scratch.remove(session.path)
+        logger.error(f"Could not reserve {body.size} bytes for upload {upload_id}: {e}")
+        raise HTTPException(status_code=507, detail="Not enough storage for this upload")
+    upload_sessions[upload_id] = session
+    logger.info(f"Created upload {upload_id}: {filename} ({body.size} bytes)", extra=SAMPLED)
+    return {**session.status(), "chunk_size": UPLOAD_CHUNK_SIZE, "max_chunk_size": MAX_CHUNK_SIZE}
+
+
+@app.put("/api/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request):
+    session = get_upload_session(upload_id)
+    try:
+        offset = int(request.headers["upload-offset"])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Upload-Offset header is required")
+    length = request.headers.get("content-length")
+    try:
+        checksum = parse_checksum(request.headers.get("upload-checksum"))
+        written = await write_chunk(
+            session,
+            offset,
+            int(length) if length is not None else None,
+            request.stream(),
+            checksum,
+            MAX_CHUNK_SIZE,
+        )
+    except ChunkConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ClientDisconnect:
+        # The partial chunk was not recorded; the client resends it
+        raise HTTPException(status_code=400, detail="Client disconnected mid-chunk")
+    except OSError:
+        if upload_sessions.get(upload_id) is not session:
+            # Cancelled, completed or expired while this chunk was being written
+            raise HTTPException(status_code=404, detail="Upload not found")
+        raise
+    return {**session.status(), "written": written}
+
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    return get_upload_session(upload_id).status()
+
+
+@app.delete("/api/uploads/{upload_id}", status_code=204)
+async def cancel_upload(upload_id: str):
+    session = get_upload_session(upload_id)
+    if session.writing:
+        raise HTTPException(status_code=409, detail="Chunks are still being written")
+    upload_sessions.pop(upload_id, None)
+    scratch.remove(session.path)
+
+
+@app.post("/api/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, body: CompleteUploadRequest):
+    session = get_upload_session(upload_id)
+    output_format = body.output_format.lower()
+    remux = body.remux.lower()
+    check_conversion_request(
+        session.extension, output_format, body.width, body.height, body.quality, remux
+    )
+    if not session.complete:
+        raise HTTPException(
+            status_code=409, detail={"message": "Upload is incomplete", **session.status()}
+        )
+    if session.writing:
+        # A duplicate chunk still in flight would write into the file being converted
+        raise HTTPException(status_code=409, detail="Chunks are still being written")
+
+    upload_sessions.pop(upload_id, None)
+    task_id = str(uuid.uuid4())
+    upload_path = session.path.with_name(f"{task_id}_original.{session.extension}")
+    scratch.rename(session.path, upload_path)
+    logger.info(f"Upload {upload_id} complete -> {output_format}", extra=SAMPLED)
+    return start_conversion(
+        task_id,
+        upload_path,
+        scratch.tier_of(upload_path),
+        output_format,
+        body.width,
+        body.height,
+        body.quality,
+        remux,
+    )
+
+
 async def process_conversion(
-    task_id: str, input_path: Path, output_path: Path, output_format: str
+    task_id: str,
+    input_path: Path,
+    output_path: Path,
+    output_format: str,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    quality: Optional[int] = None,
+    remux: str = "auto",
 ) -> None:
     """
-    Run the FFmpeg conversion process asynchronously with concurrency and timeout controls.
+    Convert the uploaded file: still images in the image engine when it can
+    read them, everything else (and anything it gives up on) with FFmpeg.
     """
     try:
-        # Find codec parameters for the desired output format.
-        codec_params = None
-        for formats in ALLOWED_FORMATS.values():
-            if output_format in formats:
-                codec_params = formats[output_format]
-                break
-        if not codec_params:
-            raise ValueError(f"No codec parameters for format: {output_format}")
-
-        ffmpeg_cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i",
-            str(input_path),
-            *codec_params,
-            str(output_path),
-        ]
-        logger.info(f"Starting FFmpeg with command: {' '.join(ffmpeg_cmd)}")
-
-        # Limit the number of concurrent conversions
-        async with conversion_semaphore:
-            proc = await asyncio.create_subprocess_exec(
-                *ffmpeg_cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
+        input_format = input_path.suffix[1:].lower()
+        if image_engine.supports(input_format, output_format):
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    proc.communicate(), timeout=CONVERSION_TIMEOUT
+                await convert_image(input_path, output_path, output_format, width, height, quality)
+            except UnsupportedImage as e:
+                image_fallbacks.inc()
+                logger.info(f"Image engine passed task {task_id} to FFmpeg: {e}", extra=SAMPLED)
+                await convert_with_ffmpeg(
+                    input_path, output_path, output_format, width, height, quality
                 )
-            except asyncio.TimeoutError:
-                proc.kill()
-                raise RuntimeError("Conversion timed out")
-
-            if proc.returncode != 0:
-                error_message = stderr.decode().strip()
-                raise RuntimeError(f"FFmpeg error: {error_message}")
+        else:
+            await convert_with_ffmpeg(
+                input_path, output_path, output_format, width, height, quality, remux
+            )
 
-        conversion_tasks[task_id]["status"] = "completed"
-        logger.info(f"Conversion task {task_id} completed successfully.")
+        # Moves the output to disk if it outgrew the memory tier's budget
+        output_path = await scratch.settle(output_path)
+        conversion_tasks.update(task_id, status="completed", output_path=output_path)
+        logger.info(f"Conversion task {task_id} completed successfully.", extra=SAMPLED)
     except Exception as e:
         logger.exception(f"Conversion failed for task {task_id}: {e}")
-        conversion_tasks[task_id].update({"status": "failed", "error": str(e)})
+        conversion_tasks.update(task_id, status="failed", error=str(e))
+        scratch.remove(output_path)
     finally:
         try:
-            input_path.unlink(missing_ok=True)
+            scratch.remove(input_path)
         except Exception as e:
             logger.error(f"Failed to remove temporary file {input_path}: {e}")
 
 
+async def convert_image(
+    input_path: Path,
+    output_path: Path,
+    output_format: str,
+    width: Optional[int],
+    height: Optional[int],
+    quality: Optional[int],
+) -> None:
+    """Convert a still image in the image engine's worker processes."""
+    started_at = time.perf_counter()
+    status = "failed"
+    try:
+        await image_engine.convert(input_path, output_path, output_format, width, height, quality)
+        status = "completed"
+    except UnsupportedImage:
+        status = "fallback"
+        raise
+    except asyncio.TimeoutError:
+        status = "timeout"
+        raise RuntimeError("Conversion timed out")
+    finally:
+        conversion_duration.observe(
+            time.perf_counter() - started_at, engine="image", format=output_format, status=status
+        )
+
+
+class FFmpegTimeout(RuntimeError):
+    """An FFmpeg run exceeded CONVERSION_TIMEOUT."""
+
+
+async def run_ffmpeg(args: list[str]) -> float:
+    """
+    Run FFmpeg with args once a conversion slot is free, with the
+    per-run timeout. Returns the seconds it ran (excluding the wait).
+    """
+    ffmpeg_cmd = [FFMPEG_PATH, *args]
+    logger.info(f"Starting FFmpeg with command: {' '.join(ffmpeg_cmd)}", extra=SAMPLED)
+
+    # Limit the number of concurrent conversions
+    queued_at = time.perf_counter()
+    conversions_queued.inc()
+    try:
+        await conversion_semaphore.acquire()
+    finally:
+        conversions_queued.dec()
+    started_at = time.perf_counter()
+    conversion_wait.observe(started_at - queued_at)
+    conversions_running.inc()
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *ffmpeg_cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=CONVERSION_TIMEOUT)
+        except asyncio.TimeoutError:
+            proc.kill()
+            raise FFmpegTimeout("Conversion timed out")
+        except asyncio.CancelledError:
+            proc.kill()
+            raise
+
+        if proc.returncode != 0:
+            error_message = stderr.decode().strip()
+            raise RuntimeError(f"FFmpeg error: {error_message}")
+    finally:
+        conversion_semaphore.release()
+        conversions_running.dec()
+    return time.perf_counter() - started_at
+
+
+async def remux_file(input_path: Path, output_path: Path, copy_args: list[str], remux: str) -> bool:
+    """
+    Convert by copying streams. Returns False if FFmpeg refuses and the
+    caller should re-encode instead (in "auto" mode only).
+    """
+    try:
+        await run_ffmpeg(["-y", "-i", str(input_path), *copy_args, str(output_path)])
+        return True
+    except FFmpegTimeout:
+        raise
+    except RuntimeError as e:
+        if remux == "always":
+            raise
+        # The muxer refused a stream the codec table allows
+        logger.warning(f"Remux of {input_path.name} failed, re-encoding: {e}")
+        return False
+
+
+async def convert_with_ffmpeg(
+    input_path: Path,
+    output_path: Path,
+    output_format: str,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    quality: Optional[int] = None,
+    remux: str = "auto",
+) -> None:
+    """
+    Convert with FFmpeg: by copying streams when the target container can hold
+    them (see REMUX_MODES), in parallel segments for long videos when
+    SEGMENTED_ENCODING is on, otherwise as a single encode.
+    """
+    # Find codec parameters for the desired output format.
+    codec_params = None
+    for formats in ALLOWED_FORMATS.values():
+        if output_format in formats:
+            codec_params = formats[output_format]
+            break
+    if not codec_params:
+        raise ValueError(f"No codec parameters for format: {output_format}")
+
+    started_at = time.perf_counter()
+    engine = "ffmpeg"
+    status = "failed"
+    try:
+        is_media = output_format not in ALLOWED_FORMATS["image"]
+        try_remux = is_media and remux != "never" and (REMUX_ENABLED or remux == "always")
+        try_segments = SEGMENTED_ENCODING and output_format in ALLOWED_FORMATS["video"]
+        media = copy_args = None
+        if try_remux or try_segments:
+            try:
+                media = await probe(FFPROBE_PATH, input_path)
+            except ProbeError as e:
+                logger.warning(f"Could not probe {input_path.name}, encoding in one run: {e}")
+        if media and try_remux:
+            copy_args = remux_args(media, output_format, codec_params, force=remux == "always")
+
+        if copy_args:
+            engine = "remux"
+            if await remux_file(input_path, output_path, copy_args, remux):
+                status = "completed"
+                return
+            engine = "ffmpeg"
+
+        if (
+            media
+            and try_segments
+            and media.has_video
+            and (media.duration or 0) >= SEGMENT_MIN_DURATION
+        ):
+            engine = "segmented"
+            work_dir = SEGMENT_DIR / output_path.stem
+            try:
+                segments = await encode_segmented(
+                    run_ffmpeg,
+                    input_path,
+                    output_path,
+                    codec_params,
+                    work_dir,
+                    SEGMENT_DURATION,
+                    SEGMENT_PARALLELISM,
+                    media.has_audio,
+                )
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            logger.info(
+                f"Encoded {input_path.name} ({media.duration:.0f}s) in {segments} segments",
+                extra=SAMPLED,
+            )
+        else:
+            await run_ffmpeg(
+                [
+                    "-y",
+                    "-i",
+                    str(input_path),
+                    *codec_params,
+                    *image_options_args(output_format, width, height, quality),
+                    str(output_path),
+                ]
+            )
+        status = "completed"
+    except FFmpegTimeout:
+        status = "timeout"
+        raise
+    finally:
+        conversion_duration.observe(
+            time.perf_counter() - started_at, engine=engine, format=output_format, status=status
+        )
+
+
 @app.get("/api/conversion-status/{task_id}")
 async def get_conversion_status(task_id: str):
     task = conversion_tasks.get(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    return {
-        "status": task["status"],
-        "error": task["error"],
-        "download_url": f"/download/{task['output_path'].name}"
-        if task["status"] == "completed"
-        else None,
-    }
+    return task.to_dict()
+
+
+@app.post("/api/conversion-status")
+async def get_conversion_statuses(body: BatchStatusRequest):
+    """Status of many tasks at once; unknown or forgotten ids map to null."""
+    statuses = {}
+    for task_id in body.task_ids:
+        task = conversion_tasks.get(task_id)
+        statuses[task_id] = task.to_dict() if task else None
+    return {"tasks": statuses}
+
+
+@app.get("/health")
+async def health_check():
+    """
+    Report FFmpeg availability and queue depth; 503 if nothing can convert,
+    "degraded" when FFmpeg is missing or the queue is long. The FFmpeg check result is cached and
+    re-run in the background, so this endpoint never spawns a process inline.
+    """
+    stale = time.time() - ffmpeg_status["checked_at"] > FFMPEG_CHECK_INTERVAL
+    task = ffmpeg_status["task"]
+    if stale and (task is None or task.done()):
+        ffmpeg_status["task"] = asyncio.create_task(refresh_ffmpeg_status())
+
+    queued = int(conversions_queued.get())
+    running = int(conversions_running.get())
+    if not ffmpeg_status["available"]:
+        # Still images can be converted without FFmpeg
+        status = "degraded" if image_engine.available else "down"
+    elif queued >= MAX_CONCURRENT_CONVERSIONS * HEALTH_QUEUE_DEGRADED:
+        status = "degraded"
+    else:
+        status = "ok"
+    return JSONResponse(
+        {
+            "status": status,
+            "ffmpeg": ffmpeg_status["available"],
+            "queued": queued,
+            "running": running,
+            "slots": MAX_CONCURRENT_CONVERSIONS,
+            "image_workers": image_engine.workers if image_engine.available else 0,
+        },
+        status_code=503 if status == "down" else 200,
+    )
 
 
 @app.get("/download/{filename}")
 async def download_file(filename: str):
-    file_path = CONVERTED_DIR / filename
-    if not file_path.exists():
+    file_path = scratch.find("converted", filename)
+    if file_path is None:
         raise HTTPException(status_code=404, detail="File not found")
     return FileResponse(file_path, media_type="application/octet-stream", filename=filename)
 
@@ -334,7 +887,7 @@ async def download_file(filename: str):
 @app.get("/privacy")
 async def privacy(request: Request):
     try:
-        logger.info("Rendering privacy page")
+        logger.info("Rendering privacy page", extra=SAMPLED)
         return templates.TemplateResponse(
             "privacy.html", {"request": request, "page_title": "Privacy Policy - DunamisMax"}
         )
@@ -351,31 +904,60 @@ async def cleanup_old_files():
     while True:
         now = time.time()
         cutoff = now - (UPLOAD_RETENTION_HOURS * 3600)
-        for directory in [UPLOAD_DIR, CONVERTED_DIR]:
-            for file in directory.iterdir():
-                if file.is_file() and file.stat().st_mtime < cutoff:
-                    try:
-                        file.unlink()
-                        logger.info(f"Cleaned up old file: {file}")
-                    except Exception as e:
-                        logger.error(f"Error cleaning up file {file}: {e}")
+        conversion_tasks.expire()
+        # Resumable uploads nobody has touched within the retention period
+        for upload_id, session in list(upload_sessions.items()):
+            if session.updated < cutoff and not session.writing:
+                upload_sessions.pop(upload_id, None)
+                scratch.remove(session.path)
+                logger.info(f"Expired upload {upload_id}", extra=SAMPLED)
+        for file in list(scratch.files()):
+            try:
+                if file.stat().st_mtime < cutoff:
+                    scratch.remove(file)
+                    logger.info(f"Cleaned up old file: {file}", extra=SAMPLED)
+            except Exception as e:
+                logger.error(f"Error cleaning up file {file}: {e}")
+        # Segment work directories are removed after each job; these are left
+        # over from jobs interrupted by a restart
+        for work_dir in SEGMENT_DIR.iterdir():
+            if work_dir.is_dir() and work_dir.stat().st_mtime < cutoff:
+                shutil.rmtree(work_dir, ignore_errors=True)
         await asyncio.sleep(3600)  # Run cleanup every hour
 
 
 @app.on_event("startup")
 async def startup_event():
-    if not await verify_ffmpeg():
+    # Directories are created here rather than at import, so importing the
+    # app (tests, benchmarks, the gateway) touches no files
+    scratch.prepare()
+    SEGMENT_DIR.mkdir(parents=True, exist_ok=True)
+    if not await refresh_ffmpeg_status():
         logger.critical("FFmpeg not found or not working")
     else:
         logger.info("FFmpeg verified successfully.")
+    # Spawning the image workers takes a while; serve (with FFmpeg for images)
+    # in the meantime instead of holding up start-up
+    image_engine_start["task"] = asyncio.create_task(image_engine.start())
     logger.info("File Converter service started")
     # Start the background cleanup task
     asyncio.create_task(cleanup_old_files())
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    task = image_engine_start["task"]
+    if task is not None and not task.done():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    await image_engine.stop()
+
+
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
-        "main:app",
+        "app.main:app",
         host=HOST,
         port=PORT,
         reload=DEBUG,
@@ -0,0 +1,254 @@
+"""
+FFmpeg helpers for the file converter: probing inputs with ffprobe, choosing
+stream copy over re-encoding, and segmented (parallel) video encoding.
+
+When the streams of an upload can already live in the target container
+(H.264/AAC from .mkv or .mov into .mp4), remux_args() returns options that
+copy them instead of re-encoding, so the job runs at disk speed. If only the
+audio does not fit, the video is still copied and the audio re-encoded.
+
+A single x264 encode of a long video keeps one FFmpeg process busy for the
+whole file. Segmented encoding instead:
+  1. cuts the video stream at keyframes into SEGMENT_DURATION pieces (stream
+     copy, so it runs at disk speed),
+  2. encodes every piece, and the audio track, as separate FFmpeg runs that
+     share the converter's conversion slots,
+  3. joins the encoded pieces with the concat demuxer and muxes the audio
+     back in, again without re-encoding.
+Each run has its own timeout, so long videos are no longer bound by a single
+CONVERSION_TIMEOUT.
+"""
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+# Runs FFmpeg with the given arguments (everything after the binary name)
+RunFFmpeg = Callable[[list[str]], Awaitable[float]]
+
+PROBE_OUTPUT_LIMIT = 1024 * 1024
+
+# Output format -> (video codecs, audio codecs) the container takes as-is;
+# None for video means an audio-only format
+COPY_CODECS = {
+    "mp4": ({"h264", "hevc", "mpeg4", "av1"}, {"aac", "mp3", "ac3", "eac3", "alac"}),
+    "mov": (
+        {"h264", "hevc", "mpeg4", "prores", "mjpeg"},
+        {"aac", "mp3", "ac3", "alac", "pcm_s16le"},
+    ),
+    "mkv": (
+        {"h264", "hevc", "mpeg4", "vp8", "vp9", "av1", "mpeg1video", "mpeg2video", "theora"},
+        {"aac", "mp3", "mp2", "opus", "vorbis", "flac", "ac3", "eac3", "dts", "alac", "pcm_s16le"},
+    ),
+    "webm": ({"vp8", "vp9", "av1"}, {"opus", "vorbis"}),
+    "avi": ({"mpeg4", "msmpeg4v3", "mjpeg"}, {"mp3", "mp2", "ac3", "pcm_s16le"}),
+    "mpeg": ({"mpeg1video", "mpeg2video"}, {"mp2", "mp3", "ac3"}),
+    "ts": ({"h264", "hevc", "mpeg2video", "mpeg1video"}, {"aac", "mp3", "mp2", "ac3", "eac3"}),
+    "3gp": ({"h263", "h264", "mpeg4"}, {"aac", "amr_nb", "amr_wb"}),
+    "mp3": (None, {"mp3"}),
+    "aac": (None, {"aac"}),
+    "m4a": (None, {"aac", "alac"}),
+    "ogg": (None, {"vorbis", "opus", "flac"}),
+    "flac": (None, {"flac"}),
+    "wav": (None, {"pcm_s16le", "pcm_s24le", "pcm_s32le", "pcm_f32le", "pcm_u8"}),
+    "wma": (None, {"wmav2"}),
+}
+
+
+class ProbeError(Exception):
+    """Raised when ffprobe cannot read a file."""
+
+
+class MediaInfo:
+    """What ffprobe reports about a file: its duration and streams."""
+
+    __slots__ = ("duration", "streams")
+
+    def __init__(self, duration: Optional[float], streams: list[dict]) -> None:
+        self.duration = duration
+        self.streams = streams
+
+    def codecs(self, codec_type: str) -> list[str]:
+        return [
+            stream.get("codec_name", "")
+            for stream in self.streams
+            if stream.get("codec_type") == codec_type
+        ]
+
+    def primary(self, codec_type: str) -> Optional[dict]:
+        """The first stream of a type, skipping cover art stored as video."""
+        for stream in self.streams:
+            if stream.get("codec_type") != codec_type:
+                continue
+            if stream.get("disposition", {}).get("attached_pic"):
+                continue
+            return stream
+        return None
+
+    @property
+    def has_video(self) -> bool:
+        return bool(self.codecs("video"))
+
+    @property
+    def has_audio(self) -> bool:
+        return bool(self.codecs("audio"))
+
+
+async def probe(ffprobe_path: str, path: Path, timeout: float = 30.0) -> MediaInfo:
+    """Run ffprobe on path."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            ffprobe_path,
+            "-v",
+            "error",
+            "-show_entries",
+            "format=duration:stream=index,codec_type,codec_name,disposition",
+            "-of",
+            "json",
+            str(path),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except OSError as e:
+        raise ProbeError(f"Cannot run ffprobe: {e}")
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        raise ProbeError("ffprobe timed out")
+    if proc.returncode != 0:
+        raise ProbeError(stderr.decode(errors="replace").strip() or "ffprobe failed")
+    try:
+        data = json.loads(stdout[:PROBE_OUTPUT_LIMIT])
+    except json.JSONDecodeError:
+        raise ProbeError("ffprobe returned invalid JSON")
+    try:
+        duration = float(data.get("format", {}).get("duration"))
+    except (TypeError, ValueError):
+        duration = None
+    return MediaInfo(duration, data.get("streams", []))
+
+
+def split_codec_params(params: list[str]) -> tuple[list[str], list[str]]:
+    """Split codec parameters into (video options, audio options)."""
+    video, audio = [], []
+    for flag, value in zip(params[::2], params[1::2]):
+        is_audio = flag.startswith(("-a", "-c:a", "-b:a", "-q:a")) or flag == "-strict"
+        (audio if is_audio else video).extend((flag, value))
+    return video, audio
+
+
+def remux_args(
+    media: MediaInfo, output_format: str, codec_params: list[str], force: bool = False
+) -> Optional[list[str]]:
+    """
+    Options that convert by copying streams, or None if the video would have
+    to be re-encoded. Maps the main video and audio streams only (subtitles
+    and data streams often have no place in the target container). With
+    force, streams are copied even when the container is not known to take
+    them, and FFmpeg has the final say.
+    """
+    if output_format not in COPY_CODECS:
+        return None
+    video_codecs, audio_codecs = COPY_CODECS[output_format]
+    video, audio = media.primary("video"), media.primary("audio")
+    _, audio_params = split_codec_params(codec_params)
+
+    args = []
+    if video_codecs is not None:
+        if video is None or not (force or video.get("codec_name") in video_codecs):
+            return None
+        args += ["-map", f"0:{video['index']}", "-c:v", "copy"]
+    elif audio is None:
+        return None
+    if audio is not None:
+        args += ["-map", f"0:{audio['index']}"]
+        if force or audio.get("codec_name") in audio_codecs:
+            args += ["-c:a", "copy"]
+        elif video_codecs is None:
+            return None  # audio-only output whose codec differs: a normal encode
+        else:
+            args += audio_params
+    return args
+
+
+# -------------------------------------------------------------------------
+# Segmented Encoding
+# -------------------------------------------------------------------------
+async def encode_segmented(
+    run: RunFFmpeg,
+    input_path: Path,
+    output_path: Path,
+    codec_params: list[str],
+    work_dir: Path,
+    segment_duration: float,
+    parallelism: int,
+    has_audio: bool,
+) -> int:
+    """
+    Encode input_path to output_path in parallel segments, using work_dir
+    (which the caller removes afterwards) for intermediate files. At most
+    `parallelism` runs of this job wait for or hold a conversion slot at once,
+    so other jobs still get their turn. Returns the number of segments.
+    """
+    video_args, audio_args = split_codec_params(codec_params)
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    # Matroska holds any codec, so intermediate files never limit the output format
+    await run(
+        [
+            "-y",
+            "-i",
+            str(input_path),
+            "-map",
+            "0:v:0",
+            "-c",
+            "copy",
+            "-f",
+            "segment",
+            "-segment_time",
+            f"{segment_duration:g}",
+            "-reset_timestamps",
+            "1",
+            str(work_dir / "source_%05d.mkv"),
+        ]
+    )
+    sources = sorted(work_dir.glob("source_*.mkv"))
+    if not sources:
+        raise RuntimeError("Segmenting produced no output")
+
+    limit = asyncio.Semaphore(max(1, parallelism))
+
+    async def limited(args: list[str]) -> None:
+        async with limit:
+            await run(args)
+
+    encoded = [source.with_name(source.name.replace("source_", "encoded_")) for source in sources]
+    jobs = [
+        limited(["-y", "-i", str(source), "-an", *video_args, str(target)])
+        for source, target in zip(sources, encoded)
+    ]
+    audio_path = work_dir / "audio.mka"
+    if has_audio:
+        audio = ["-y", "-i", str(input_path), "-vn", "-map", "0:a:0", *audio_args, str(audio_path)]
+        jobs.append(limited(audio))
+    tasks = [asyncio.create_task(job) for job in jobs]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # One failed segment fails the job: stop the others rather than
+        # letting them hold slots for output nobody will use
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    concat_list = work_dir / "segments.txt"
+    concat_list.write_text("".join(f"file '{path.name}'\n" for path in encoded))
+    inputs = ["-f", "concat", "-safe", "0", "-i", str(concat_list)]
+    maps = ["-map", "0:v:0"]
+    if has_audio:
+        inputs += ["-i", str(audio_path)]
+        maps += ["-map", "1:a:0"]
+    await run(["-y", *inputs, *maps, "-c", "copy", str(output_path)])
+    return len(sources)
@@ -0,0 +1,179 @@
+"""
+Tiered scratch storage for the file converter.
+
+Small jobs keep their upload and their converted file in a RAM-backed
+directory (tmpfs, e.g. /dev/shm), so they never touch the disk. Large jobs,
+and small ones once the memory budget is used up, go to the disk directories
+as before. Each tier has the same uploads/ and converted/ layout, and files
+are found by name in whichever tier holds them.
+
+The budget is tracked by this process: a job reserves room for its input and
+an output of the same size when it is placed (at once, so concurrent uploads
+cannot all claim the same room), and the real output size is settled once
+the conversion finishes. An output that outgrows the budget is moved to disk
+(a copy, since tmpfs and disk are different filesystems, made in a thread).
+"""
+
+import asyncio
+import os
+import shutil
+from pathlib import Path
+from typing import Iterator, Optional
+
+KINDS = ("uploads", "converted")
+
+
+class Tier:
+    """One storage location with uploads/ and converted/ directories."""
+
+    __slots__ = ("name", "root", "uploads", "converted")
+
+    def __init__(self, name: str, root: Path, uploads: Path, converted: Path) -> None:
+        self.name = name
+        self.root = root
+        self.uploads = uploads
+        self.converted = converted
+
+    def directory(self, kind: str) -> Path:
+        return self.uploads if kind == "uploads" else self.converted
+
+    def holds(self, path: Path) -> bool:
+        return path.parent in (self.uploads, self.converted)
+
+    def create(self) -> None:
+        for kind in KINDS:
+            self.directory(kind).mkdir(parents=True, exist_ok=True)
+
+
+class ScratchStorage:
+    """Chooses a tier per job and keeps the memory tier within its budget."""
+
+    def __init__(
+        self,
+        disk: Tier,
+        memory: Optional[Tier],
+        memory_budget: int,
+        small_file_limit: int,
+    ) -> None:
+        self.disk = disk
+        self.memory = memory if memory is not None and memory_budget > 0 else None
+        self.memory_budget = memory_budget
+        self.small_file_limit = small_file_limit
+        # Memory-tier files (existing or expected) and the bytes counted for each
+        self.sizes: dict[Path, int] = {}
+        # Room held for the output of each memory-tier input, by input path
+        self.reserved: dict[Path, int] = {}
+        self.memory_used = 0
+
+    def prepare(self) -> None:
+        """Create the tier directories (called at start-up, not import)."""
+        self.disk.create()
+        if self.memory is not None:
+            self.memory.create()
+            # tmpfs outlives the process; count what a previous run left behind
+            for path in self.files():
+                if self.memory.holds(path):
+                    self.track(path, path.stat().st_size)
+
+    @property
+    def tiers(self) -> list[Tier]:
+        return [tier for tier in (self.memory, self.disk) if tier is not None]
+
+    def tier_of(self, path: Path) -> Tier:
+        return self.memory if self.memory is not None and self.memory.holds(path) else self.disk
+
+    def place(self, name: str, size: int) -> Path:
+        """
+        Where to store a job's input of size bytes, called name: in the memory
+        tier if it has room for the input and an output of the same size, which
+        are then reserved until the input is removed or its output claims them.
+        """
+        tier = self.disk
+        if (
+            self.memory is not None
+            and size <= self.small_file_limit
+            and self.memory_used + 2 * size <= self.memory_budget
+        ):
+            tier = self.memory
+        path = tier.uploads / name
+        self.track(path, size)
+        if tier is self.memory:
+            self.reserved[path] = size
+            self.memory_used += size
+        return path
+
+    def claim_output(self, input_path: Path, output_path: Path) -> None:
+        """Count the room reserved with input_path for its output, output_path."""
+        size = self.reserved.pop(input_path, 0)
+        self.memory_used -= size
+        self.track(output_path, size)
+
+    def track(self, path: Path, size: int) -> None:
+        """Count size bytes for path if it is (or will be) in the memory tier."""
+        if self.memory is None or not self.memory.holds(path):
+            return
+        self.memory_used += size - self.sizes.get(path, 0)
+        self.sizes[path] = size
+
+    def release(self, path: Path) -> None:
+        """Stop counting path, and any output room still reserved with it."""
+        self.memory_used -= self.sizes.pop(path, 0) + self.reserved.pop(path, 0)
+
+    def remove(self, path: Path) -> None:
+        path.unlink(missing_ok=True)
+        self.release(path)
+
+    def rename(self, source: Path, target: Path) -> None:
+        """Rename within a tier, carrying over the bytes counted for source."""
+        source.rename(target)
+        size = self.sizes.get(source, 0)
+        reserved = self.reserved.get(source, 0)
+        self.release(source)
+        self.track(target, size)
+        if reserved:
+            self.reserved[target] = reserved
+            self.memory_used += reserved
+
+    async def settle(self, path: Path) -> Path:
+        """
+        Record the real size of a finished file. If the memory tier is now
+        over budget, move the file to disk. Returns where the file ended up.
+        """
+        if self.memory is None or not self.memory.holds(path):
+            return path
+        self.track(path, path.stat().st_size)
+        if self.memory_used <= self.memory_budget:
+            return path
+        target = self.disk.directory(path.parent.name) / path.name
+        # A copy between filesystems: kept off the event loop
+        await asyncio.to_thread(shutil.move, path, target)
+        self.release(path)
+        return target
+
+    def find(self, kind: str, name: str) -> Optional[Path]:
+        """The file called name in any tier, or None."""
+        if Path(name).name != name or name.startswith("."):
+            return None
+        for tier in self.tiers:
+            path = tier.directory(kind) / name
+            if path.is_file():
+                return path
+        return None
+
+    def directories(self) -> Iterator[Path]:
+        for tier in self.tiers:
+            for kind in KINDS:
+                yield tier.directory(kind)
+
+    def files(self) -> Iterator[Path]:
+        for directory in self.directories():
+            for entry in os.scandir(directory):
+                if entry.is_file():
+                    yield Path(entry.path)
+
+    def stats(self) -> dict:
+        return {
+            "memory_tier": str(self.memory.root) if self.memory else None,
+            "memory_used": self.memory_used,
+            "memory_budget": self.memory_budget if self.memory else 0,
+        }
@@ -0,0 +1,112 @@
+"""
+Bounded in-memory registry of conversion tasks.
+
+Tasks are kept in least-recently-used order and forgotten once they are
+older than the file retention period (their output has been cleaned up by
+then) or when the registry is full. Tasks still processing are never
+evicted, so a running conversion always has somewhere to report its result.
+"""
+
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+MAX_BATCH_SIZE = 200
+
+
+class ConversionTask:
+    """State of one conversion."""
+
+    __slots__ = ("id", "status", "output_path", "error", "updated")
+
+    def __init__(self, task_id: str, output_path: Path) -> None:
+        self.id = task_id
+        self.status = "processing"
+        self.output_path = output_path
+        self.error: Optional[str] = None
+        self.updated = time.monotonic()
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "error": self.error,
+            "download_url": f"/download/{self.output_path.name}"
+            if self.status == "completed"
+            else None,
+        }
+
+
+class BatchStatusRequest(BaseModel):
+    """Task ids to report on in one request."""
+
+    task_ids: list[str] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class TaskRegistry:
+    """Conversion tasks by id, bounded by age (ttl seconds) and count (max_tasks)."""
+
+    def __init__(self, max_tasks: int, ttl: float) -> None:
+        self.max_tasks = max_tasks
+        self.ttl = ttl
+        self.tasks: OrderedDict[str, ConversionTask] = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def add(self, task_id: str, output_path: Path) -> ConversionTask:
+        task = ConversionTask(task_id, output_path)
+        self.tasks[task_id] = task
+        self.evict()
+        return task
+
+    def get(self, task_id: str) -> Optional[ConversionTask]:
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        if task.status != "processing" and time.monotonic() - task.updated > self.ttl:
+            self._forget(task_id)
+            return None
+        self.tasks.move_to_end(task_id)
+        return task
+
+    def update(self, task_id: str, **fields) -> None:
+        """Set fields on a task (if it is still known) and mark it recently used."""
+        task = self.tasks.get(task_id)
+        if task is None:
+            return
+        for name, value in fields.items():
+            setattr(task, name, value)
+        task.updated = time.monotonic()
+        self.tasks.move_to_end(task_id)
+
+    def evict(self) -> None:
+        """Drop expired tasks, then least recently used ones past max_tasks."""
+        cutoff = time.monotonic() - self.ttl
+        excess = len(self.tasks) - self.max_tasks
+        for task_id, task in list(self.tasks.items()):
+            if task.status == "processing":
+                continue
+            if task.updated < cutoff:
+                self._forget(task_id)
+                excess -= 1
+            elif excess > 0:
+                self._forget(task_id)
+                excess -= 1
+            else:
+                # Oldest first: once nothing is expired or over the limit, stop
+                break
+
+    def expire(self) -> None:
+        """Drop every expired task (evict() only looks at the least recently used end)."""
+        cutoff = time.monotonic() - self.ttl
+        for task_id, task in list(self.tasks.items()):
+            if task.status != "processing" and task.updated < cutoff:
+                self._forget(task_id)
+
+    def _forget(self, task_id: str) -> None:
+        del self.tasks[task_id]
+        self.evicted += 1
@@ -0,0 +1,246 @@
+"""
+Resumable chunked uploads for the file converter.
+
+    POST /api/uploads                      create a session for a file of known size
+    PUT  /api/uploads/{id}                 write one chunk (Upload-Offset header, raw body)
+    GET  /api/uploads/{id}                 bytes received so far and the ranges still missing
+    POST /api/uploads/{id}/complete        start the conversion once every byte has arrived
+
+The target file is preallocated at its final size, and each chunk is written
+at its own offset with positional writes. Chunks may therefore arrive in any
+order, in parallel, and more than once. A chunk only counts once it has been
+written in full and its optional checksum (`Upload-Checksum: sha256 <hex>`)
+matches, so after a dropped connection the client asks which ranges are
+missing and sends just those again. A range stops counting as received as
+soon as a chunk starts overwriting it, so a resent chunk that fails leaves
+the range missing rather than marked with its bad bytes; a chunk that
+overlaps one still being written is refused.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from pydantic import BaseModel, Field
+
+# Bytes buffered before each positional write
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class UploadError(ValueError):
+    """Raised when a chunk does not fit its session or fails verification."""
+
+
+class ChunkConflict(UploadError):
+    """Raised when a chunk overlaps another chunk that is still being written."""
+
+
+class CreateUploadRequest(BaseModel):
+    """Start a resumable upload."""
+
+    filename: str = Field(min_length=1, max_length=255)
+    size: int = Field(gt=0)
+
+
+class CompleteUploadRequest(BaseModel):
+    """Turn a finished upload into a conversion (same options as /api/convert)."""
+
+    output_format: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    quality: Optional[int] = None
+    remux: str = "auto"
+
+
+class RangeSet:
+    """Sorted, merged list of received [start, end) byte ranges."""
+
+    __slots__ = ("ranges",)
+
+    def __init__(self) -> None:
+        self.ranges: list[tuple[int, int]] = []
+
+    def add(self, start: int, end: int) -> None:
+        merged = []
+        for lo, hi in self.ranges:
+            if hi < start or lo > end:
+                merged.append((lo, hi))
+            else:
+                start, end = min(lo, start), max(hi, end)
+        merged.append((start, end))
+        merged.sort()
+        self.ranges = merged
+
+    def remove(self, start: int, end: int) -> None:
+        kept = []
+        for lo, hi in self.ranges:
+            if hi <= start or lo >= end:
+                kept.append((lo, hi))
+                continue
+            if lo < start:
+                kept.append((lo, start))
+            if hi > end:
+                kept.append((end, hi))
+        self.ranges = kept
+
+    @property
+    def total(self) -> int:
+        return sum(hi - lo for lo, hi in self.ranges)
+
+    @property
+    def contiguous(self) -> int:
+        """Bytes received without a gap from the start of the file."""
+        if self.ranges and self.ranges[0][0] == 0:
+            return self.ranges[0][1]
+        return 0
+
+    def missing(self, size: int) -> list[tuple[int, int]]:
+        gaps, position = [], 0
+        for lo, hi in self.ranges:
+            if lo > position:
+                gaps.append((position, lo))
+            position = hi
+        if position < size:
+            gaps.append((position, size))
+        return gaps
+
+
+class UploadSession:
+    """One resumable upload and the ranges received so far."""
+
+    __slots__ = (
+        "id",
+        "filename",
+        "extension",
+        "size",
+        "path",
+        "received",
+        "created",
+        "updated",
+        "writing",
+    )
+
+    def __init__(self, upload_id: str, filename: str, extension: str, size: int, path: Path) -> None:
+        self.id = upload_id
+        self.filename = filename
+        self.extension = extension
+        self.size = size
+        self.path = path
+        self.received = RangeSet()
+        self.created = self.updated = time.time()
+        # [start, end) written so far by each chunk in flight; the file must
+        # not be moved or removed under them
+        self.writing: list[list[int]] = []
+
+    @property
+    def complete(self) -> bool:
+        return self.received.total == self.size
+
+    def preallocate(self) -> None:
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            if hasattr(os, "posix_fallocate"):
+                # Reserve the blocks now: a full disk fails here, not at 9 GB
+                os.posix_fallocate(fd, 0, self.size)
+            else:
+                os.ftruncate(fd, self.size)
+        finally:
+            os.close(fd)
+
+    def status(self) -> dict:
+        return {
+            "upload_id": self.id,
+            "filename": self.filename,
+            "size": self.size,
+            "received": self.received.total,
+            "offset": self.received.contiguous,
+            "missing": [list(gap) for gap in self.received.missing(self.size)],
+            "complete": self.complete,
+        }
+
+
+def parse_checksum(header: Optional[str]) -> Optional[str]:
+    """Read "sha256 <hex>" from an Upload-Checksum header."""
+    if not header:
+        return None
+    algorithm, _, digest = header.strip().partition(" ")
+    if algorithm.lower() != "sha256" or len(digest.strip()) != 64:
+        raise UploadError("Upload-Checksum must be 'sha256 <64 hex digits>'")
+    return digest.strip().lower()
+
+
+def _claim(session: UploadSession, span: list[int], start: int, end: int) -> None:
+    """Extend a chunk's span to [start, end) before writing there."""
+    for other in session.writing:
+        if other is not span and other[0] < end and start < other[1]:
+            raise ChunkConflict(f"Bytes {start}-{end} overlap a chunk still being written")
+    span[1] = end
+    # Counted again only once this chunk has passed its checks
+    session.received.remove(start, end)
+
+
+def _pwrite_all(path: Path, data: bytes, offset: int) -> None:
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view, offset = view[written:], offset + written
+    finally:
+        os.close(fd)
+
+
+async def write_chunk(
+    session: UploadSession,
+    offset: int,
+    length: Optional[int],
+    body: AsyncIterator[bytes],
+    checksum: Optional[str],
+    max_chunk: int,
+) -> int:
+    """
+    Write one chunk at offset, streaming the body to disk in buffered
+    positional writes, and record it as received. Returns its length.
+    """
+    if offset < 0 or offset >= session.size:
+        raise UploadError(f"Offset {offset} is outside the file (size {session.size})")
+    limit = min(max_chunk, session.size - offset)
+    if length is not None and length > limit:
+        raise UploadError(f"Chunk of {length} bytes at offset {offset} exceeds the limit of {limit}")
+
+    digest = hashlib.sha256()
+    position = offset
+    buffer = bytearray()
+    span = [offset, offset]
+    session.writing.append(span)
+    try:
+        async for data in body:
+            if position + len(buffer) + len(data) - offset > limit:
+                raise UploadError(f"Chunk at offset {offset} exceeds the limit of {limit} bytes")
+            digest.update(data)
+            buffer += data
+            if len(buffer) >= WRITE_BUFFER_SIZE:
+                _claim(session, span, position, position + len(buffer))
+                await asyncio.to_thread(_pwrite_all, session.path, bytes(buffer), position)
+                position += len(buffer)
+                buffer.clear()
+        if buffer:
+            _claim(session, span, position, position + len(buffer))
+            await asyncio.to_thread(_pwrite_all, session.path, bytes(buffer), position)
+            position += len(buffer)
+    finally:
+        # By identity: another chunk's span may hold the same numbers
+        session.writing = [other for other in session.writing if other is not span]
+
+    written = position - offset
+    if length is not None and written != length:
+        raise UploadError(f"Chunk ended after {written} of {length} bytes")
+    if checksum is not None and digest.hexdigest() != checksum:
+        raise UploadError(f"Checksum mismatch for chunk at offset {offset}")
+    if written:
+        session.received.add(offset, position)
+    session.updated = time.time()
+    return written
@@ -0,0 +1,14 @@
+"""
+Make this service importable as `app`, as it is when uvicorn runs from the
+service directory. Every service is a package named `app`, so one imported
+for another service's tests is forgotten first.
+"""
+
+import sys
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+
+for name in [name for name in sys.modules if name == "app" or name.startswith("app.")]:
+    del sys.modules[name]
+sys.path.insert(0, str(SERVICE_DIR))
@@ -0,0 +1,60 @@
+from app.media import MediaInfo, remux_args, split_codec_params
+
+MP4_PARAMS = ["-vcodec", "libx264", "-acodec", "aac"]
+
+
+def media(*streams):
+    return MediaInfo(10.0, [{"index": index, **stream} for index, stream in enumerate(streams)])
+
+
+def test_split_codec_params():
+    video, audio = split_codec_params(
+        ["-c:v", "libx264", "-crf", "23", "-c:a", "aac", "-b:a", "128k", "-strict", "-2"]
+    )
+    assert video == ["-c:v", "libx264", "-crf", "23"]
+    assert audio == ["-c:a", "aac", "-b:a", "128k", "-strict", "-2"]
+
+
+def test_copies_streams_the_container_takes():
+    info = media(
+        {"codec_type": "video", "codec_name": "h264"}, {"codec_type": "audio", "codec_name": "aac"}
+    )
+    assert remux_args(info, "mp4", MP4_PARAMS) == [
+        "-map", "0:0", "-c:v", "copy", "-map", "0:1", "-c:a", "copy"
+    ]
+
+
+def test_reencodes_only_the_audio_that_does_not_fit():
+    info = media(
+        {"codec_type": "video", "codec_name": "h264"},
+        {"codec_type": "audio", "codec_name": "opus"},
+    )
+    assert remux_args(info, "mp4", MP4_PARAMS) == [
+        "-map", "0:0", "-c:v", "copy", "-map", "0:1", "-acodec", "aac"
+    ]
+
+
+def test_video_that_does_not_fit_is_encoded():
+    info = media({"codec_type": "video", "codec_name": "vp9"})
+    assert remux_args(info, "mp4", MP4_PARAMS) is None
+    assert remux_args(info, "mp4", MP4_PARAMS, force=True) == ["-map", "0:0", "-c:v", "copy"]
+
+
+def test_cover_art_is_not_the_video():
+    info = media(
+        {"codec_type": "video", "codec_name": "mjpeg", "disposition": {"attached_pic": 1}},
+        {"codec_type": "audio", "codec_name": "aac"},
+    )
+    assert remux_args(info, "mp4", MP4_PARAMS) is None
+    assert remux_args(info, "m4a", ["-acodec", "aac"]) == ["-map", "0:1", "-c:a", "copy"]
+
+
+def test_audio_only_outputs():
+    mp3 = media({"codec_type": "audio", "codec_name": "mp3"})
+    assert remux_args(mp3, "mp3", ["-acodec", "libmp3lame"]) == ["-map", "0:0", "-c:a", "copy"]
+    assert remux_args(mp3, "wav", ["-acodec", "pcm_s16le"]) is None
+    assert remux_args(media(), "mp3", ["-acodec", "libmp3lame"]) is None
+
+
+def test_unknown_container():
+    assert remux_args(media({"codec_type": "audio", "codec_name": "aac"}), "gif", []) is None
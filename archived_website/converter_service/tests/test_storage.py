@@ -0,0 +1,80 @@
+import asyncio
+
+from app.storage import ScratchStorage, Tier
+
+
+def tier(root, name):
+    return Tier(name, root / name, root / name / "uploads", root / name / "converted")
+
+
+def storage(tmp_path, budget=100, small=50):
+    scratch = ScratchStorage(tier(tmp_path, "disk"), tier(tmp_path, "memory"), budget, small)
+    scratch.prepare()
+    return scratch
+
+
+def test_placing_reserves_the_input_and_the_output(tmp_path):
+    scratch = storage(tmp_path)
+    path = scratch.place("a.mp3", 30)
+    assert scratch.tier_of(path) is scratch.memory
+    assert scratch.memory_used == 60
+
+
+def test_concurrent_placements_cannot_overcommit(tmp_path):
+    scratch = storage(tmp_path)
+    # Nothing written yet: each placement still counts against the budget
+    placed = [scratch.tier_of(scratch.place(f"{i}.mp3", 30)) for i in range(3)]
+    assert placed == [scratch.memory, scratch.disk, scratch.disk]
+    assert scratch.memory_used == 60
+
+
+def test_large_and_disk_files_are_not_counted(tmp_path):
+    scratch = storage(tmp_path)
+    assert scratch.tier_of(scratch.place("big.mp4", 60)) is scratch.disk
+    assert scratch.memory_used == 0
+
+
+def test_removing_the_input_releases_its_output_room(tmp_path):
+    scratch = storage(tmp_path)
+    path = scratch.place("a.mp3", 30)
+    scratch.remove(path)
+    assert scratch.memory_used == 0
+
+
+def test_rename_carries_the_reservation(tmp_path):
+    scratch = storage(tmp_path)
+    part = scratch.place("upload.part", 30)
+    part.write_bytes(b"x" * 30)
+    original = part.with_name("task_original.mp3")
+    scratch.rename(part, original)
+    output = scratch.memory.converted / "task.wav"
+    scratch.claim_output(original, output)
+    assert scratch.sizes == {original: 30, output: 30}
+    scratch.remove(original)
+    assert scratch.memory_used == 30
+    scratch.remove(output)
+    assert scratch.memory_used == 0
+
+
+def test_settle_moves_an_output_over_budget_to_disk(tmp_path):
+    scratch = storage(tmp_path)
+    source = scratch.place("a.mp3", 30)
+    output = scratch.memory.converted / "a.wav"
+    scratch.claim_output(source, output)
+    output.write_bytes(b"x" * 80)
+
+    settled = asyncio.run(scratch.settle(output))
+    assert settled == scratch.disk.converted / "a.wav"
+    assert settled.read_bytes() == b"x" * 80
+    assert not output.exists()
+    assert scratch.memory_used == 30
+
+
+def test_settle_keeps_an_output_within_budget(tmp_path):
+    scratch = storage(tmp_path)
+    source = scratch.place("a.mp3", 30)
+    output = scratch.memory.converted / "a.wav"
+    scratch.claim_output(source, output)
+    output.write_bytes(b"x" * 10)
+    assert asyncio.run(scratch.settle(output)) == output
+    assert scratch.memory_used == 40
@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from app import uploads
+from app.uploads import (
+    ChunkConflict,
+    RangeSet,
+    UploadError,
+    UploadSession,
+    parse_checksum,
+    write_chunk,
+)
+
+
+def ranges(*spans):
+    received = RangeSet()
+    for start, end in spans:
+        received.add(start, end)
+    return received
+
+
+def test_ranges_merge_when_overlapping_or_adjacent():
+    assert ranges((0, 10), (5, 15)).ranges == [(0, 15)]
+    assert ranges((0, 10), (10, 20)).ranges == [(0, 20)]
+    assert ranges((20, 30), (0, 10), (8, 22)).ranges == [(0, 30)]
+
+
+def test_ranges_keep_gaps():
+    received = ranges((10, 20), (0, 5))
+    assert received.ranges == [(0, 5), (10, 20)]
+    assert received.total == 15
+    assert received.contiguous == 5
+
+
+def test_repeated_range_counts_once():
+    assert ranges((0, 10), (0, 10), (2, 8)).total == 10
+
+
+def test_missing():
+    assert RangeSet().missing(10) == [(0, 10)]
+    assert ranges((2, 4), (6, 8)).missing(10) == [(0, 2), (4, 6), (8, 10)]
+    assert ranges((0, 10)).missing(10) == []
+
+
+def test_contiguous_needs_the_start():
+    assert ranges((1, 10)).contiguous == 0
+
+
+def test_parse_checksum():
+    digest = "ab" * 32
+    assert parse_checksum(None) is None
+    assert parse_checksum(f"SHA256 {digest.upper()}") == digest
+    with pytest.raises(UploadError):
+        parse_checksum("md5 " + digest)
+    with pytest.raises(UploadError):
+        parse_checksum("sha256 abc")
+
+
+def test_remove():
+    received = ranges((0, 10), (20, 30))
+    received.remove(5, 25)
+    assert received.ranges == [(0, 5), (25, 30)]
+    received.remove(0, 100)
+    assert received.ranges == []
+
+
+def session(tmp_path, size=10):
+    upload = UploadSession("u1", "clip.mp3", "mp3", size, tmp_path / "u1.part")
+    upload.preallocate()
+    return upload
+
+
+async def body(*parts, fail=False):
+    for part in parts:
+        yield part
+    if fail:
+        raise ConnectionError("client went away")
+
+
+def write(upload, offset, *parts, checksum=None, fail=False):
+    length = None if fail else sum(map(len, parts))
+    return asyncio.run(write_chunk(upload, offset, length, body(*parts, fail=fail), checksum, 100))
+
+
+def test_chunks_are_written_at_their_offset(tmp_path):
+    upload = session(tmp_path)
+    assert write(upload, 5, b"56789") == 5
+    assert write(upload, 0, b"01", b"234") == 5
+    assert upload.complete
+    assert upload.path.read_bytes() == b"0123456789"
+    assert upload.writing == []
+
+
+def test_failed_resend_leaves_the_range_missing(tmp_path):
+    upload = session(tmp_path)
+    write(upload, 0, b"0123456789")
+    bad = "sha256 " + hashlib.sha256(b"good data!").hexdigest()
+    with pytest.raises(UploadError):
+        write(upload, 0, b"corrupted!", checksum=bad)
+    assert not upload.complete
+    assert upload.received.missing(10) == [(0, 10)]
+
+
+def test_disconnected_resend_leaves_the_written_part_missing(tmp_path, monkeypatch):
+    upload = session(tmp_path)
+    write(upload, 0, b"0123456789")
+    # Small buffer: the first part is on disk before the client goes away
+    monkeypatch.setattr(uploads, "WRITE_BUFFER_SIZE", 2)
+    with pytest.raises(ConnectionError):
+        write(upload, 2, b"xx", b"y", fail=True)
+    assert upload.received.missing(10) == [(2, 4)]
+
+
+def test_resend_that_fails_before_writing_changes_nothing(tmp_path):
+    upload = session(tmp_path)
+    write(upload, 0, b"0123456789")
+    with pytest.raises(ConnectionError):
+        write(upload, 2, b"xx", fail=True)
+    assert upload.complete
+
+
+def test_overlapping_chunks_in_flight_conflict(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "WRITE_BUFFER_SIZE", 2)
+    upload = session(tmp_path)
+
+    async def run():
+        gate = asyncio.Event()
+
+        async def slow():
+            yield b"0123"
+            await gate.wait()
+            yield b"4"
+
+        first = asyncio.create_task(write_chunk(upload, 0, 5, slow(), None, 100))
+        while upload.writing == [] or upload.writing[0][1] < 4:
+            await asyncio.sleep(0.001)
+        with pytest.raises(ChunkConflict):
+            await write_chunk(upload, 2, 2, body(b"xx"), None, 100)
+        assert await write_chunk(upload, 5, 5, body(b"56789"), None, 100) == 5
+        gate.set()
+        return await first
+
+    assert asyncio.run(run()) == 5
+    assert upload.complete
+    assert upload.path.read_bytes() == b"0123456789"
@@ -1,44 +1,68 @@
-import logging
 import os
+import sys
 from pathlib import Path
+from urllib.parse import urlsplit
 
-import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import JSONResponse, Response
+
+# shared/ lives next to the service directories
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from shared.assets import AssetFiles, cached_templates, register_asset_helpers  # noqa: E402
+from shared.logs import RequestIdMiddleware, configure_logging  # noqa: E402
+from shared.metrics import instrument  # noqa: E402
+from shared.profiling import add_profiling  # noqa: E402
+
+from .pages import PageStore  # noqa: E402
+from .status import HealthAggregator, parse_targets  # noqa: E402
 
 # Load environment variables early
 load_dotenv()
 
+# Canonical site URL; pages for it are rendered at startup
+SITE_URL = os.getenv("SITE_URL", "https://dunamismax.com")
+# Browsers and the CDN may reuse a page this long before revalidating its ETag
+PAGE_MAX_AGE = int(os.getenv("PAGE_MAX_AGE", "300"))
+PAGE_CACHE_CONTROL = f"public, max-age={PAGE_MAX_AGE}"
+# Health endpoints of the sibling services, probed for the status badges
+STATUS_TARGETS = os.getenv(
+    "STATUS_TARGETS",
+    "messenger=http://127.0.0.1:8100/health,"
+    "ai_agents=http://127.0.0.1:8200/health,"
+    "converter_service=http://127.0.0.1:8300/health,"
+    "notes=http://127.0.0.1:8500/health",
+)
+STATUS_TIMEOUT = float(os.getenv("STATUS_TIMEOUT", "2"))
+STATUS_TTL = float(os.getenv("STATUS_TTL", "5"))
+
 # Define base directory
 BASE_DIR = Path(__file__).parent
 
-# Ensure the logs directory exists BEFORE configuring logging
+# Configure logging: console plus a rotating JSON file, written by a background thread
 LOG_DIR = BASE_DIR / "logs"
-LOG_DIR.mkdir(exist_ok=True)
-
-# Configure logging: logs will stream to both console and file
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler(LOG_DIR / "dunamismax.log", mode="a"),
-    ],
-)
-logger = logging.getLogger("DunamisMax")
+logger = configure_logging("dunamismax", "DunamisMax", LOG_DIR / "dunamismax.log")
 
 # Create FastAPI application instance
 app = FastAPI(title=os.getenv("APP_NAME", "DunamisMax"))
+app.add_middleware(RequestIdMiddleware)
 
 # Mount static files and configure templates
-app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
-templates = Jinja2Templates(directory=BASE_DIR / "templates")
+app.mount("/static", AssetFiles(directory=BASE_DIR / "static"), name="static")
+templates = cached_templates(BASE_DIR / "templates")
+register_asset_helpers(templates, BASE_DIR / "static")
+metrics = instrument(app, "dunamismax")
+watchdog = add_profiling(app, logger)
+pages = PageStore(templates)
+service_status = HealthAggregator(parse_targets(STATUS_TARGETS), STATUS_TIMEOUT, STATUS_TTL)
 
 # Define available services (could also be loaded from a configuration file)
 SERVICES = [
     {
+        "id": "messenger",
         "name": "Messenger",
         "description": "Real-time chat application with WebSocket technology for instant messaging and communication",
         "url": "https://messenger.dunamismax.com",
@@ -46,6 +70,7 @@ SERVICES = [
         "features": ["Real-time", "WebSocket", "Instant"],
     },
     {
+        "id": "ai_agents",
         "name": "AI Agents",
         "description": "Interactive AI assistants powered by advanced language models for specialized tasks and conversations",
         "url": "https://agents.dunamismax.com",
@@ -53,6 +78,7 @@ SERVICES = [
         "features": ["AI", "GPT-4", "Assistance"],
     },
     {
+        "id": "converter_service",
         "name": "File Converter",
         "description": "Professional media conversion tool supporting multiple formats with high-quality output",
         "url": "https://files.dunamismax.com",
@@ -60,6 +86,7 @@ SERVICES = [
         "features": ["FFmpeg", "Audio", "Video"],
     },
     {
+        "id": "notes",
         "name": "Notes",
         "description": "Password-protected note-taking application with a Nord design",
         "url": "https://notes.dunamismax.com",
@@ -69,58 +96,101 @@ SERVICES = [
 ]
 
 
-@app.get("/", response_model=None)
-async def root(request: Request):
-    """Render the main page with available services."""
+# Template and context of every prerendered page, by path
+PAGES = {
+    "/": (
+        "index.html",
+        {
+            "services": SERVICES,
+            "page_title": "DunamisMax - Modern Web Applications",
+            "meta_description": "Suite of professional web applications including real-time messaging, AI agents, file conversion, and notes service",
+        },
+    ),
+    "/privacy": (
+        "privacy.html",
+        {
+            "page_title": "Privacy Policy - DunamisMax",
+        },
+    ),
+}
+
+
+def serve_page(request: Request, path: str) -> Response:
+    """Serve a prerendered page from memory, rendering it on first use for this site."""
+    template, context = PAGES[path]
     try:
-        logger.info("Rendering main page")
-        return templates.TemplateResponse(
-            "index.html",
-            {
-                "request": request,
-                "services": SERVICES,
-                "page_title": "DunamisMax - Modern Web Applications",
-                "meta_description": "Suite of professional web applications including real-time messaging, AI agents, file conversion, and notes service",
-            },
-        )
+        page = pages.get(request, template, context)
     except Exception as e:
-        logger.error(f"Error rendering main page: {e}", exc_info=True)
+        logger.error(f"Error rendering {template}: {e}", exc_info=True)
         raise
+    return page.response(request, PAGE_CACHE_CONTROL)
+
+
+def site_request(path: str) -> Request:
+    """A synthetic request for SITE_URL, used to render pages before any traffic arrives."""
+    url = urlsplit(SITE_URL)
+    scheme = url.scheme or "https"
+    port = url.port or (443 if scheme == "https" else 80)
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "scheme": scheme,
+            "server": (url.hostname, port),
+            "path": path,
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", url.netloc.encode("latin-1"))],
+            "app": app,
+            "router": app.router,
+        }
+    )
+
+
+@app.get("/", response_model=None)
+async def root(request: Request):
+    """Serve the main page with available services."""
+    return serve_page(request, "/")
 
 
 @app.get("/privacy", response_model=None)
 async def privacy(request: Request):
-    """Render the privacy policy page."""
-    try:
-        logger.info("Rendering privacy page")
-        return templates.TemplateResponse(
-            "privacy.html",
-            {
-                "request": request,
-                "page_title": "Privacy Policy - DunamisMax",
-            },
-        )
-    except Exception as e:
-        logger.error(f"Error rendering privacy page: {e}", exc_info=True)
-        raise
+    """Serve the privacy policy page."""
+    return serve_page(request, "/privacy")
 
 
 @app.get("/health", response_model=dict)
 async def health_check():
-    """A simple endpoint for health checking."""
+    """
+    Liveness of this service only; sibling services are reported by /api/status
+    so an outage elsewhere never gets the landing page restarted.
+    """
     return {"status": "ok"}
 
 
+@app.get("/api/status", response_model=None)
+async def status_api():
+    """Aggregated health of every service, cached for STATUS_TTL seconds."""
+    return JSONResponse(
+        await service_status.status(),
+        headers={"Cache-Control": f"public, max-age={int(STATUS_TTL)}"},
+    )
+
+
 @app.on_event("startup")
 async def startup_event():
-    """Startup tasks: log the service startup."""
+    """Startup tasks: prerender the site's pages."""
     logger.info("DunamisMax service starting up")
+    for path, (template, context) in PAGES.items():
+        pages.get(site_request(path), template, context)
     logger.info("DunamisMax service started successfully")
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
-        "main:app",  # Adjust the import string if your module structure changes
+        "app.main:app",  # Adjust the import string if your module structure changes
         host=os.getenv("HOST", "0.0.0.0"),
         port=int(os.getenv("PORT", 8000)),
         reload=os.getenv("DEBUG", "false").lower() == "true",
@@ -0,0 +1,107 @@
+"""
+Prerendered pages for the DunamisMax landing site.
+
+The landing and privacy pages only change on deploy, so each is rendered once
+per base URL (links in the templates are absolute), compressed once, and then
+served from memory with an ETag. Repeat visitors get 304 Not Modified; everyone
+else gets the precompressed bytes their browser accepts.
+"""
+
+import gzip
+import hashlib
+import logging
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from fastapi.templating import Jinja2Templates
+
+from shared.assets import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is always available
+    brotli = None
+
+logger = logging.getLogger("DunamisMax.pages")
+
+HTML_MEDIA_TYPE = "text/html; charset=utf-8"
+
+
+class RenderedPage:
+    """Rendered HTML plus its compressed variants and validator."""
+
+    __slots__ = ("body", "digest", "variants")
+
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+        self.digest = hashlib.sha1(body).hexdigest()
+        variants = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants["br"] = brotli.compress(body, quality=11, mode=brotli.MODE_TEXT)
+        # Preferred encoding first
+        self.variants = {
+            encoding: data
+            for encoding, data in sorted(variants.items(), key=lambda item: len(item[1]))
+            if len(data) < len(body)
+        }
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        # Each representation needs its own strong validator
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+    def is_not_modified(self, request: Request) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip().removeprefix("W/").strip('"')
+            if tag == "*" or tag.split("-", 1)[0] == self.digest:
+                return True
+        return False
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        accepted = accepted_encodings(request.scope)
+        encoding = next((name for name in self.variants if name in accepted), None)
+        headers = {
+            "ETag": self.etag(encoding),
+            "Vary": "Accept-Encoding",
+            "Cache-Control": cache_control,
+        }
+        if self.is_not_modified(request):
+            return Response(status_code=304, headers=headers)
+        if encoding is None:
+            return Response(self.body, media_type=HTML_MEDIA_TYPE, headers=headers)
+        headers["Content-Encoding"] = encoding
+        return Response(self.variants[encoding], media_type=HTML_MEDIA_TYPE, headers=headers)
+
+
+class PageStore:
+    """
+    Rendered pages keyed by (template, base URL). The number of base URLs is
+    capped so arbitrary Host headers cannot grow the store; past the cap pages
+    are rendered per request instead.
+    """
+
+    def __init__(self, templates: Jinja2Templates, max_sites: int = 8) -> None:
+        self.templates = templates
+        self.max_sites = max_sites
+        self.pages: dict[tuple[str, str], RenderedPage] = {}
+        self.sites: set[str] = set()
+
+    def render(self, request: Request, template: str, context: dict) -> RenderedPage:
+        html = self.templates.get_template(template).render({"request": request, **context})
+        return RenderedPage(html.encode("utf-8"))
+
+    def get(self, request: Request, template: str, context: dict) -> RenderedPage:
+        site = str(request.base_url)
+        key = (template, site)
+        page = self.pages.get(key)
+        if page is not None:
+            return page
+        page = self.render(request, template, context)
+        if site in self.sites or len(self.sites) < self.max_sites:
+            self.sites.add(site)
+            self.pages[key] = page
+            logger.info(f"Rendered {template} for {site} ({len(page.body):,} bytes)")
+        return page
@@ -0,0 +1,184 @@
+"""
+Live status of the sibling DunamisMax services.
+
+Each service exposes a cheap /health endpoint (in-memory counters only). The
+aggregator probes all of them concurrently with a per-probe deadline and keeps
+the combined result for a short TTL; stale results are served while a single
+background refresh runs, so the landing page can poll every few seconds no
+matter how many visitors it has.
+
+Probes use a minimal HTTP/1.1 client on asyncio streams, so the landing site
+needs no HTTP client dependency. Hosts ending in ".localhost" always resolve
+to loopback (RFC 6761), which lets the probes reach services behind the
+single-process gateway by Host header (http://notes.localhost:8000/health).
+"""
+
+import asyncio
+import json
+import logging
+import ssl
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger("DunamisMax.status")
+
+MAX_BODY_BYTES = 64 * 1024
+
+
+class ProbeError(Exception):
+    """Raised when a health endpoint cannot be reached or returns garbage."""
+
+
+def parse_targets(value: str) -> dict[str, str]:
+    """Parse "name=url,name=url" into an ordered mapping."""
+    targets = {}
+    for pair in filter(None, (item.strip() for item in value.split(","))):
+        name, _, url = pair.partition("=")
+        if not url:
+            raise ValueError(f"Status target {pair!r} is not of the form name=url")
+        targets[name.strip()] = url.strip()
+    return targets
+
+
+def _dechunk(body: bytes) -> bytes:
+    """Join the chunks of a chunked body; ProbeError if it is malformed or cut short."""
+    chunks = []
+    while True:
+        size_line, found, rest = body.partition(b"\r\n")
+        try:
+            size = int(size_line.split(b";", 1)[0].strip(), 16)
+        except ValueError:
+            size = -1
+        if not found or size < 0:
+            raise ProbeError(f"Malformed chunk size {size_line[:32]!r}")
+        if size == 0:
+            return b"".join(chunks)
+        if len(rest) < size + 2 or rest[size : size + 2] != b"\r\n":
+            raise ProbeError("Chunked body is truncated")
+        chunks.append(rest[:size])
+        body = rest[size + 2 :]
+
+
+async def fetch_json(url: str) -> tuple[int, dict]:
+    """GET url and return (status code, JSON body). Callers apply the deadline."""
+    parts = urlsplit(url)
+    host = parts.hostname or "localhost"
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    address = "127.0.0.1" if host == "localhost" or host.endswith(".localhost") else host
+    path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+    reader, writer = await asyncio.open_connection(
+        address,
+        port,
+        ssl=ssl.create_default_context() if secure else None,
+        server_hostname=host if secure else None,
+    )
+    try:
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+            "Accept: application/json\r\nConnection: close\r\n\r\n".encode("latin-1")
+        )
+        await writer.drain()
+        raw = b""
+        while len(raw) < MAX_BODY_BYTES:
+            more = await reader.read(MAX_BODY_BYTES - len(raw))
+            if not more:
+                break
+            raw += more
+    finally:
+        writer.close()
+
+    head, _, body = raw.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        status_code = int(lines[0].split()[1])
+    except (IndexError, ValueError):
+        raise ProbeError(f"Malformed response from {url}")
+    headers = {
+        name.strip().lower(): value.strip()
+        for name, _, value in (line.partition(":") for line in lines[1:])
+    }
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = _dechunk(body)
+    try:
+        payload = json.loads(body) if body else {}
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise ProbeError(f"Non-JSON response from {url} (HTTP {status_code})")
+    return status_code, payload if isinstance(payload, dict) else {}
+
+
+class HealthAggregator:
+    """Probes every target concurrently and caches the combined result for ttl seconds."""
+
+    def __init__(self, targets: dict[str, str], timeout: float = 2.0, ttl: float = 5.0) -> None:
+        self.targets = targets
+        self.timeout = timeout
+        self.ttl = ttl
+        self.snapshot: Optional[dict] = None
+        self.refreshed_at = 0.0
+        self._refresh: Optional[asyncio.Task] = None
+
+    async def probe(self, name: str, url: str) -> dict:
+        started = time.perf_counter()
+        try:
+            status_code, payload = await asyncio.wait_for(fetch_json(url), self.timeout)
+            if status_code >= 500:
+                state = "down"
+            elif status_code != 200:
+                state = "degraded"
+            else:
+                state = "up" if payload.get("status", "ok") == "ok" else "degraded"
+            error = None
+        except asyncio.TimeoutError:
+            state, payload, error = "down", {}, f"No response within {self.timeout:g}s"
+        except (OSError, ProbeError) as e:
+            state, payload, error = "down", {}, str(e) or type(e).__name__
+        details = {key: value for key, value in payload.items() if key != "status"}
+        return {
+            "status": state,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "error": error,
+            "details": details,
+        }
+
+    async def refresh(self) -> dict:
+        results = await asyncio.gather(
+            *(self.probe(name, url) for name, url in self.targets.items())
+        )
+        previous = self.snapshot["services"] if self.snapshot is not None else {}
+        for name, result in zip(self.targets, results):
+            # Errors and /health bodies name hosts, ports and internals: log only
+            if result["status"] != previous.get(name, {}).get("status", "up"):
+                reason = result["error"] or result["details"]
+                logger.warning(f"{name} is {result['status']}: {reason}")
+        # Public (and cached by the CDN): state and latency only
+        services = {
+            name: {"status": result["status"], "latency_ms": result["latency_ms"]}
+            for name, result in zip(self.targets, results)
+        }
+        states = {result["status"] for result in results}
+        overall = "ok" if states <= {"up"} else ("down" if states == {"down"} else "degraded")
+        self.snapshot = {
+            "status": overall,
+            "checked_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "services": services,
+        }
+        self.refreshed_at = time.monotonic()
+        return self.snapshot
+
+    async def status(self) -> dict:
+        """
+        The cached status. Once older than ttl, one background refresh starts
+        and callers keep getting the previous snapshot until it finishes; only
+        the very first call waits for the probes.
+        """
+        if self.snapshot is not None and time.monotonic() - self.refreshed_at < self.ttl:
+            return self.snapshot
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self.refresh())
+        if self.snapshot is not None:
+            return self.snapshot
+        # shield: a client disconnecting must not cancel the refresh others wait on
+        return await asyncio.shield(self._refresh)
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from app.status import HealthAggregator, ProbeError, _dechunk, parse_targets
+
+
+def test_parse_targets():
+    assert parse_targets("notes=http://a/health, ,chat=http://b/health") == {
+        "notes": "http://a/health",
+        "chat": "http://b/health",
+    }
+    with pytest.raises(ValueError):
+        parse_targets("notes")
+
+
+def test_dechunk():
+    assert _dechunk(b"4\r\n{\"a\"\r\n3;ext=1\r\n:1}\r\n0\r\n\r\n") == b'{"a":1}'
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"zz\r\n{}\r\n0\r\n\r\n",  # size is not hex
+        b"-2\r\n{}\r\n0\r\n\r\n",  # negative size
+        b"10\r\n{}\r\n0\r\n\r\n",  # shorter than announced
+        b"2\r\n{}",  # cut off before the last chunk
+        b"",
+    ],
+)
+def test_dechunk_rejects_garbage(body):
+    with pytest.raises(ProbeError):
+        _dechunk(body)
+
+
+def serve(response: bytes):
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(response)
+        await writer.drain()
+        writer.close()
+
+    return asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def test_garbage_chunked_health_is_down_not_an_error():
+    async def run():
+        server = await serve(
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nnot-hex\r\n{}\r\n0\r\n\r\n"
+        )
+        async with server:
+            port = server.sockets[0].getsockname()[1]
+            aggregator = HealthAggregator({"notes": f"http://127.0.0.1:{port}/health"})
+            first = await aggregator.status()
+            # The refresh task survives: the next refresh runs and updates the snapshot
+            aggregator.refreshed_at = 0
+            await aggregator.status()
+            await aggregator._refresh
+            return first, aggregator.snapshot
+
+    first, later = asyncio.run(run())
+    assert first["services"]["notes"]["status"] == "down"
+    assert later["status"] == "down"
+    assert later["checked_at"]
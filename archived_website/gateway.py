@@ -0,0 +1,237 @@
+"""
+Single-process gateway for the DunamisMax services.
+
+Loads the dunamismax, messenger, ai_agents, converter_service and notes apps
+into one Python process and routes each request by its Host header, so a small
+VPS runs one interpreter (one copy of FastAPI, Jinja, pydantic and the shared
+code) instead of five. The services are unchanged and can still be run on
+their own ports (see port_structure.md).
+
+Run from the archived_website directory:
+    uvicorn gateway:app --host 0.0.0.0 --port 8000
+    uvicorn gateway:app --host 0.0.0.0 --port 8000 --workers 2
+
+Each worker is a full copy of every service. Services that keep state in
+memory (messenger rooms, converter task status, notes page cache) only see
+the requests that land on the same worker, exactly as when those services run
+with several workers on their own.
+
+Environment:
+    GATEWAY_SERVICES  comma-separated services to load (default: all five)
+    GATEWAY_HOSTS     extra host=service pairs, e.g. "chat.example.com=messenger"
+    GATEWAY_DEFAULT   service for unknown hosts (default: dunamismax)
+"""
+
+import asyncio
+import importlib
+import importlib.util
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+ROOT_DIR = Path(__file__).resolve().parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+logger = logging.getLogger("DunamisMaxGateway")
+
+SERVICES = ["dunamismax", "messenger", "ai_agents", "converter_service", "notes"]
+
+# Production hostnames; the first label alone also matches, so
+# messenger.localhost:8000 reaches the messenger during development
+DEFAULT_HOSTS = {
+    "dunamismax.com": "dunamismax",
+    "www.dunamismax.com": "dunamismax",
+    "messenger.dunamismax.com": "messenger",
+    "agents.dunamismax.com": "ai_agents",
+    "files.dunamismax.com": "converter_service",
+    "notes.dunamismax.com": "notes",
+}
+
+
+# -------------------------------------------------------------------------
+# Loading
+# -------------------------------------------------------------------------
+def load_service(service: str):
+    """
+    Import <service>/app/main.py as the package `<service>_app`. Every service
+    package is called `app`, so each needs its own name in sys.modules.
+    """
+    package_dir = ROOT_DIR / service / "app"
+    package_name = f"{service}_app"
+    if package_name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            package_name,
+            package_dir / "__init__.py",
+            submodule_search_locations=[str(package_dir)],
+        )
+        package = importlib.util.module_from_spec(spec)
+        sys.modules[package_name] = package
+        spec.loader.exec_module(package)
+    return importlib.import_module(f"{package_name}.main")
+
+
+def load_services(services: list[str]) -> dict[str, ASGIApp]:
+    """
+    Import each service with only its own .env applied, so settings read at
+    import time (rate limits, app names, ports) do not leak between services.
+    Afterwards the variables are merged for code that reads them at runtime;
+    where two services disagree, the first one loaded wins.
+    """
+    base_env = dict(os.environ)
+    merged: dict[str, tuple[str, str]] = {}
+    apps = {}
+    for service in services:
+        try:
+            module = load_service(service)
+        finally:
+            loaded = {k: v for k, v in os.environ.items() if base_env.get(k) != v}
+            os.environ.clear()
+            os.environ.update(base_env)
+        apps[service] = module.app
+        for key, value in loaded.items():
+            if key not in merged:
+                merged[key] = (service, value)
+            elif merged[key][1] != value:
+                logger.warning(
+                    f"{key} differs between {merged[key][0]} and {service}; "
+                    f"runtime lookups see the value from {merged[key][0]}"
+                )
+    os.environ.update({key: value for key, (_, value) in merged.items()})
+    return apps
+
+
+# -------------------------------------------------------------------------
+# Gateway
+# -------------------------------------------------------------------------
+class Gateway:
+    """ASGI app that forwards HTTP/WebSocket traffic by host and fans out lifespan events."""
+
+    def __init__(
+        self,
+        apps: dict[str, ASGIApp],
+        hosts: dict[str, str],
+        default: str,
+    ) -> None:
+        if default not in apps:
+            raise ValueError(f"Default service {default!r} is not loaded")
+        self.apps = apps
+        self.default = default
+        self.hosts = {host: service for host, service in hosts.items() if service in apps}
+        self.labels = {host.split(".", 1)[0]: service for host, service in self.hosts.items()}
+
+    def route(self, scope: Scope) -> ASGIApp:
+        host = ""
+        for key, value in scope.get("headers", ()):
+            if key == b"host":
+                host = value.decode("latin-1").lower()
+                break
+        host = host.partition(":")[0]
+        service = self.hosts.get(host) or self.labels.get(host.split(".", 1)[0])
+        return self.apps[service or self.default]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self.lifespan(scope, receive, send)
+            return
+        await self.route(scope)(scope, receive, send)
+
+    async def lifespan(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Run every service's own startup and shutdown hooks (mounted apps never
+        see lifespan events otherwise). Services start in order and stop in
+        reverse; if one fails to start, those already started are shut down.
+        """
+        started: list[_ServiceLifespan] = []
+        message = await receive()
+        assert message["type"] == "lifespan.startup"
+        for service, service_app in self.apps.items():
+            runner = _ServiceLifespan(service, service_app, scope)
+            error = await runner.startup()
+            if error is not None:
+                for running in reversed(started):
+                    await running.shutdown()
+                await send({"type": "lifespan.startup.failed", "message": f"{service}: {error}"})
+                return
+            started.append(runner)
+        logger.info(f"Gateway serving {', '.join(self.apps)} (default: {self.default})")
+        await send({"type": "lifespan.startup.complete"})
+
+        message = await receive()
+        assert message["type"] == "lifespan.shutdown"
+        errors = []
+        for runner in reversed(started):
+            error = await runner.shutdown()
+            if error is not None:
+                errors.append(f"{runner.service}: {error}")
+        if errors:
+            await send({"type": "lifespan.shutdown.failed", "message": "; ".join(errors)})
+        else:
+            await send({"type": "lifespan.shutdown.complete"})
+
+
+class _ServiceLifespan:
+    """Drives one service's ASGI lifespan protocol from inside the gateway's."""
+
+    def __init__(self, service: str, service_app: ASGIApp, scope: Scope) -> None:
+        self.service = service
+        self.app = service_app
+        # Shared state: the server copies it into every request scope
+        self.scope = {**scope, "state": scope.setdefault("state", {})}
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        try:
+            await self.app(self.scope, self.inbox.get, self.outbox.put)
+        except BaseException as e:
+            await self.outbox.put({"type": "error", "message": repr(e)})
+            raise
+
+    async def _exchange(self, event: str) -> Optional[str]:
+        await self.inbox.put({"type": f"lifespan.{event}"})
+        reply = await self.outbox.get()
+        if reply["type"] == f"lifespan.{event}.complete":
+            return None
+        return reply.get("message") or reply["type"]
+
+    async def startup(self) -> Optional[str]:
+        self.task = asyncio.create_task(self._run())
+        return await self._exchange("startup")
+
+    async def shutdown(self) -> Optional[str]:
+        error = await self._exchange("shutdown")
+        try:
+            await self.task
+        except Exception:
+            pass
+        return error
+
+
+def parse_hosts(value: str) -> dict[str, str]:
+    hosts = {}
+    for pair in filter(None, (item.strip() for item in value.split(","))):
+        host, _, service = pair.partition("=")
+        hosts[host.strip().lower()] = service.strip()
+    return hosts
+
+
+def create_gateway() -> Gateway:
+    services = [
+        service.strip()
+        for service in os.getenv("GATEWAY_SERVICES", ",".join(SERVICES)).split(",")
+        if service.strip()
+    ]
+    unknown = set(services) - set(SERVICES)
+    if unknown:
+        raise ValueError(f"Unknown service(s) in GATEWAY_SERVICES: {', '.join(sorted(unknown))}")
+    hosts = {**DEFAULT_HOSTS, **parse_hosts(os.getenv("GATEWAY_HOSTS", ""))}
+    return Gateway(load_services(services), hosts, os.getenv("GATEWAY_DEFAULT", "dunamismax"))
+
+
+app = create_gateway()
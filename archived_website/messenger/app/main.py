@@ -1,22 +1,107 @@
+import asyncio
+import json
 import os
+import sys
+import time
+from collections import defaultdict, deque
 from datetime import datetime
 from pathlib import Path
 
-import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+
+# shared/ lives next to the service directories
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from shared.assets import AssetFiles, cached_templates, register_asset_helpers  # noqa: E402
+from shared.logs import RequestIdMiddleware, configure_logging  # noqa: E402
+from shared.metrics import instrument  # noqa: E402
+from shared.profiling import add_profiling  # noqa: E402
+
+from .presence import PresenceTracker  # noqa: E402
 
 # Load environment variables early
 load_dotenv()
 
 app = FastAPI(title="DunamisMax Messenger")
+app.add_middleware(RequestIdMiddleware)
 
 # Define base directory, mount static files, and set up templates
 BASE_DIR = Path(__file__).parent
-app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
-templates = Jinja2Templates(directory=BASE_DIR / "templates")
+logger = configure_logging("messenger", "DunamisMaxMessenger", BASE_DIR / "logs" / "messenger.log")
+app.mount("/static", AssetFiles(directory=BASE_DIR / "static"), name="static")
+templates = cached_templates(BASE_DIR / "templates")
+register_asset_helpers(templates, BASE_DIR / "static")
+metrics = instrument(app, "messenger")
+watchdog = add_profiling(app, logger)
+
+# ---------------------------
+# Connection Limits & Heartbeats
+# ---------------------------
+MAX_WEBSOCKET_CONNECTIONS = int(os.getenv("MAX_WEBSOCKET_CONNECTIONS", "1000"))
+RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+# Seconds between server pings; a peer that has not sent anything (a pong or
+# a message) within HEARTBEAT_TIMEOUT seconds is considered dead.
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", "20"))
+HEARTBEAT_TIMEOUT = float(os.getenv("HEARTBEAT_TIMEOUT", "60"))
+# Seconds without a chat message before a live but idle peer is evicted (0 disables).
+IDLE_TIMEOUT = float(os.getenv("IDLE_TIMEOUT", "1800"))
+# Seconds a single outbound frame may take before the peer is treated as slow.
+SEND_TIMEOUT = float(os.getenv("SEND_TIMEOUT", "5"))
+# Seconds between batched presence frames, and how long a typing indicator lasts.
+PRESENCE_FLUSH_INTERVAL = float(os.getenv("PRESENCE_FLUSH_INTERVAL", "1"))
+TYPING_TTL = float(os.getenv("TYPING_TTL", "5"))
+# /health reports "degraded" above this share of MAX_WEBSOCKET_CONNECTIONS
+HEALTH_DEGRADED_RATIO = float(os.getenv("HEALTH_DEGRADED_RATIO", "0.9"))
+
+# Control frames the client may send as JSON instead of plain chat text.
+CONTROL_FRAME_TYPES = {"pong", "typing"}
+
+
+def parse_client_frame(data: str) -> dict:
+    """
+    Interpret an inbound text frame.
+    JSON objects with a known control type are returned as-is; anything else
+    is treated as a plain chat message for compatibility with older clients.
+    """
+    if data.startswith("{"):
+        try:
+            frame = json.loads(data)
+        except json.JSONDecodeError:
+            frame = None
+        if isinstance(frame, dict) and frame.get("type") in CONTROL_FRAME_TYPES:
+            return frame
+    return {"type": "message", "text": data}
+
+
+# ---------------------------
+# Rate Limiter
+# ---------------------------
+class RateLimiter:
+    """
+    A simple sliding-window rate limiter that restricts messages per minute per user.
+    """
+
+    def __init__(self, rate_limit_per_minute: int) -> None:
+        self.rate_limit = rate_limit_per_minute
+        self.requests: dict[str, deque[float]] = defaultdict(deque)
+
+    def is_rate_limited(self, client_id: str) -> bool:
+        now = time.monotonic()
+        window = self.requests[client_id]
+        # Drop timestamps older than one minute
+        while window and window[0] <= now - 60:
+            window.popleft()
+        if len(window) >= self.rate_limit:
+            return True
+        window.append(now)
+        return False
+
+    def reset(self, client_id: str) -> None:
+        """Forget the history of a client that has disconnected."""
+        self.requests.pop(client_id, None)
 
 
 # ---------------------------
@@ -26,52 +111,197 @@ class ConnectionManager:
     def __init__(self) -> None:
         self.active_connections: dict[str, WebSocket] = {}
         self.usernames: set[str] = set()
+        # Monotonic timestamps of the last frame of any kind and the last chat message.
+        self.last_seen: dict[str, float] = {}
+        self.last_message: dict[str, float] = {}
+        self.rate_limiter = RateLimiter(RATE_LIMIT_PER_MINUTE)
+        self.presence = PresenceTracker(TYPING_TTL)
+        self.heartbeat_task: asyncio.Task | None = None
+        self.presence_task: asyncio.Task | None = None
 
     async def connect(self, websocket: WebSocket, username: str) -> bool:
         """
-        Accept the WebSocket connection if the username is not already in use.
-        Returns True on success; otherwise, False.
+        Accept the WebSocket connection if the username is free and the server has capacity.
+        The new client receives a roster snapshot right away; everyone else learns about
+        the join from the next batched presence frame.
+        Returns True on success; otherwise, closes the socket with a reason and returns False.
         """
         if username in self.usernames:
+            await self._reject(websocket, code=1008, reason="Username already taken")
+            return False
+        if len(self.active_connections) >= MAX_WEBSOCKET_CONNECTIONS:
+            await self._reject(websocket, code=1013, reason="Maximum connections reached")
             return False
         await websocket.accept()
+        now = time.monotonic()
         self.active_connections[username] = websocket
         self.usernames.add(username)
-        await self.broadcast_message(
+        self.last_seen[username] = now
+        self.last_message[username] = now
+        self.presence.mark_joined(username)
+        await self.send_personal_message(
+            username,
             {
-                "type": "system",
-                "text": f"{username} joined the chat",
+                "type": "roster",
+                "users": sorted(self.usernames),
                 "timestamp": datetime.now().isoformat(),
-            }
+            },
         )
         return True
 
-    async def disconnect(self, username: str) -> None:
+    async def _reject(self, websocket: WebSocket, code: int, reason: str) -> None:
         """
-        Remove the disconnected username from the active list and broadcast a leave message.
+        Accept and immediately close a socket so the client receives the close code.
         """
-        if username in self.usernames:
-            self.usernames.remove(username)
-            self.active_connections.pop(username, None)
-            await self.broadcast_message(
-                {
-                    "type": "system",
-                    "text": f"{username} left the chat",
-                    "timestamp": datetime.now().isoformat(),
-                }
-            )
+        await websocket.accept()
+        await websocket.close(code=code, reason=reason)
+
+    async def disconnect(self, username: str, websocket: WebSocket | None = None) -> None:
+        """
+        Remove the disconnected username from the active list and queue a leave event.
+        When a websocket is given, nothing happens unless it is still the one registered
+        for the username, so a stale handler cannot evict a newer session.
+        """
+        if username not in self.usernames:
+            return
+        if websocket is not None and self.active_connections.get(username) is not websocket:
+            return
+        self.usernames.remove(username)
+        self.active_connections.pop(username, None)
+        self.last_seen.pop(username, None)
+        self.last_message.pop(username, None)
+        self.rate_limiter.reset(username)
+        self.presence.mark_left(username)
+
+    async def evict(self, username: str, code: int, reason: str) -> None:
+        """
+        Close a peer's socket (best effort) and release its username.
+        """
+        websocket = self.active_connections.get(username)
+        if websocket is None:
+            return
+        await self.disconnect(username, websocket)
+        try:
+            await asyncio.wait_for(websocket.close(code=code, reason=reason), SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    def touch(self, username: str, is_message: bool = False) -> None:
+        """
+        Record inbound activity for a user.
+        """
+        if username not in self.usernames:
+            return
+        now = time.monotonic()
+        self.last_seen[username] = now
+        if is_message:
+            self.last_message[username] = now
+
+    async def send_personal_message(self, username: str, message: dict) -> bool:
+        """
+        Send a message to a single user. Returns False if the peer failed or was too slow.
+        """
+        websocket = self.active_connections.get(username)
+        if websocket is None:
+            return False
+        try:
+            await asyncio.wait_for(websocket.send_json(message), SEND_TIMEOUT)
+            return True
+        except Exception:
+            return False
 
     async def broadcast_message(self, message: dict) -> None:
         """
         Broadcast the given message to all connected clients.
+        Peers whose send fails or times out are evicted instead of stalling everyone else.
+        """
+        recipients = list(self.active_connections)
+        results = await asyncio.gather(
+            *(self.send_personal_message(username, message) for username in recipients)
+        )
+        for username, delivered in zip(recipients, results):
+            if not delivered:
+                await self.evict(username, code=1011, reason="Send failed")
+
+    async def check_heartbeats(self) -> None:
+        """
+        Evict dead and idle peers, then ping everyone who is left.
+        """
+        now = time.monotonic()
+        for username in list(self.active_connections):
+            if now - self.last_seen.get(username, now) > HEARTBEAT_TIMEOUT:
+                await self.evict(username, code=1001, reason="Heartbeat timeout")
+            elif IDLE_TIMEOUT and now - self.last_message.get(username, now) > IDLE_TIMEOUT:
+                await self.evict(username, code=1000, reason="Idle timeout")
+        ping = {"type": "ping", "timestamp": datetime.now().isoformat()}
+        recipients = list(self.active_connections)
+        results = await asyncio.gather(
+            *(self.send_personal_message(username, ping) for username in recipients)
+        )
+        for username, delivered in zip(recipients, results):
+            if not delivered:
+                await self.evict(username, code=1011, reason="Send failed")
+
+    async def flush_presence(self) -> None:
+        """
+        Broadcast the presence changes accumulated since the last flush, if any.
+        """
+        frame = self.presence.collect()
+        if frame:
+            await self.broadcast_message(frame)
+
+    async def run_presence(self) -> None:
         """
-        for connection in self.active_connections.values():
-            await connection.send_json(message)
+        Background loop that flushes presence every PRESENCE_FLUSH_INTERVAL seconds.
+        """
+        while True:
+            await asyncio.sleep(PRESENCE_FLUSH_INTERVAL)
+            try:
+                await self.flush_presence()
+            except Exception as e:
+                logger.exception(f"Presence error: {e}")
+
+    async def run_heartbeats(self) -> None:
+        """
+        Background loop that runs heartbeat checks every HEARTBEAT_INTERVAL seconds.
+        """
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                await self.check_heartbeats()
+            except Exception as e:
+                logger.exception(f"Heartbeat error: {e}")
 
 
 # Create a single instance of the connection manager.
 manager = ConnectionManager()
 
+metrics.gauge(
+    "messenger_websocket_connections",
+    "Open chat WebSocket connections",
+    lambda: len(manager.active_connections),
+)
+metrics.gauge(
+    "messenger_websocket_connections_max",
+    "Configured WebSocket connection limit",
+    lambda: MAX_WEBSOCKET_CONNECTIONS,
+)
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Start the background heartbeat and presence loops."""
+    manager.heartbeat_task = asyncio.create_task(manager.run_heartbeats())
+    manager.presence_task = asyncio.create_task(manager.run_presence())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the background heartbeat and presence loops."""
+    for task in (manager.heartbeat_task, manager.presence_task):
+        if task:
+            task.cancel()
+
 
 # ---------------------------
 # HTTP Endpoints
@@ -84,6 +314,21 @@ async def root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+@app.get("/health")
+async def health_check():
+    """
+    Report WebSocket capacity; "degraded" once connections pass
+    HEALTH_DEGRADED_RATIO of the limit.
+    """
+    connections = len(manager.active_connections)
+    status = "degraded" if connections >= MAX_WEBSOCKET_CONNECTIONS * HEALTH_DEGRADED_RATIO else "ok"
+    return {
+        "status": status,
+        "connections": connections,
+        "capacity": MAX_WEBSOCKET_CONNECTIONS,
+    }
+
+
 @app.get("/privacy")
 async def privacy(request: Request):
     """
@@ -101,29 +346,53 @@ async def privacy(request: Request):
 async def websocket_endpoint(websocket: WebSocket, username: str):
     """
     WebSocket endpoint for real-time chat.
-    If the username is already taken, the connection is rejected.
-    Otherwise, all messages from the client are broadcast to everyone.
+    If the username is already taken or the server is full, the connection is rejected.
+    Otherwise, all messages from the client are broadcast to everyone, subject to
+    per-user rate limits. Pong frames only refresh the heartbeat; typing frames
+    start a debounced typing indicator.
     """
     success = await manager.connect(websocket, username)
     if not success:
-        await websocket.close(code=1008, reason="Username already taken")
         return
 
     try:
         while True:
             data = await websocket.receive_text()
+            frame = parse_client_frame(data)
+            if frame["type"] == "pong":
+                manager.touch(username)
+                continue
+            if frame["type"] == "typing":
+                manager.touch(username)
+                manager.presence.mark_typing(username)
+                continue
+
+            manager.touch(username, is_message=True)
+            if manager.rate_limiter.is_rate_limited(username):
+                await manager.send_personal_message(
+                    username,
+                    {
+                        "type": "error",
+                        "text": "Rate limit exceeded. Please wait a moment before sending more messages.",
+                        "timestamp": datetime.now().isoformat(),
+                    },
+                )
+                continue
+
+            manager.presence.clear_typing(username)
             message = {
                 "type": "message",
                 "username": username,
-                "text": data,
+                "text": frame["text"],
                 "timestamp": datetime.now().isoformat(),
             }
-            await manager.broadcast_message(message)
+            with watchdog.watch("WS /ws/chat broadcast"):
+                await manager.broadcast_message(message)
     except WebSocketDisconnect:
-        await manager.disconnect(username)
+        await manager.disconnect(username, websocket)
     except Exception as e:
-        print(f"WebSocket error: {e}")
-        await manager.disconnect(username)
+        logger.exception(f"WebSocket error: {e}")
+        await manager.disconnect(username, websocket)
         try:
             await websocket.close(code=1011, reason="Internal server error")
         except Exception:
@@ -134,8 +403,10 @@ async def websocket_endpoint(websocket: WebSocket, username: str):
 # Run the Application
 # ---------------------------
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
-        "main:app",
+        "app.main:app",
         host=os.getenv("HOST", "0.0.0.0"),
         port=int(os.getenv("PORT", 8100)),
         reload=os.getenv("DEBUG", "false").lower() == "true",
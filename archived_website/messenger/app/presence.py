@@ -0,0 +1,73 @@
+"""
+Presence tracking for the messenger.
+
+Join, leave and typing changes are recorded as they happen but only published
+as a single diff frame per flush interval, so a reconnect storm costs one frame
+per client per interval instead of one frame per client per event.
+"""
+
+import time
+from datetime import datetime
+
+
+class PresenceTracker:
+    """
+    Accumulates presence changes between flushes and produces batched diff frames.
+    """
+
+    def __init__(self, typing_ttl: float) -> None:
+        self.typing_ttl = typing_ttl
+        self.pending_joined: set[str] = set()
+        self.pending_left: set[str] = set()
+        # username -> monotonic time at which the typing indicator expires
+        self.typing: dict[str, float] = {}
+        self.announced_typing: set[str] = set()
+
+    def mark_joined(self, username: str) -> None:
+        """Record a join; a leave and rejoin inside one interval cancel out."""
+        if username in self.pending_left:
+            self.pending_left.discard(username)
+        else:
+            self.pending_joined.add(username)
+
+    def mark_left(self, username: str) -> None:
+        """Record a leave; a join and leave inside one interval cancel out."""
+        if username in self.pending_joined:
+            self.pending_joined.discard(username)
+        else:
+            self.pending_left.add(username)
+        self.typing.pop(username, None)
+
+    def mark_typing(self, username: str) -> None:
+        """Start or extend a user's typing indicator."""
+        self.typing[username] = time.monotonic() + self.typing_ttl
+
+    def clear_typing(self, username: str) -> None:
+        """Stop a user's typing indicator (e.g. once their message is sent)."""
+        self.typing.pop(username, None)
+
+    def collect(self) -> dict | None:
+        """
+        Return the presence diff accumulated since the last call, or None if
+        nothing visible changed.
+        """
+        now = time.monotonic()
+        for username, expires_at in list(self.typing.items()):
+            if expires_at <= now:
+                del self.typing[username]
+        typing = set(self.typing)
+
+        if not self.pending_joined and not self.pending_left and typing == self.announced_typing:
+            return None
+
+        frame = {
+            "type": "presence",
+            "joined": sorted(self.pending_joined),
+            "left": sorted(self.pending_left),
+            "typing": sorted(typing),
+            "timestamp": datetime.now().isoformat(),
+        }
+        self.pending_joined.clear()
+        self.pending_left.clear()
+        self.announced_typing = typing
+        return frame
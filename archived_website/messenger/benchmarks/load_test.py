@@ -0,0 +1,559 @@
+"""
+Load and soak benchmark for the DunamisMax Messenger WebSocket chat.
+
+Opens many WebSocket clients against /ws/chat/{username}, drives a fixed
+message rate through a subset of them and measures how long each broadcast
+takes to reach every other client.
+
+Reported metrics:
+  - Fan-out latency percentiles (send -> receive, per delivered frame)
+  - Delivery ratio and clients that were dropped or too slow
+  - Server RSS (sampled during the run)
+  - Event-loop lag (server loop in in-process mode, client loop otherwise)
+
+Server modes:
+  - inprocess  : run the app with uvicorn inside this process (default)
+  - subprocess : spawn `uvicorn app.main:app` from the messenger directory
+  - --url      : benchmark an already running server
+
+Results are written as JSON so runs can be compared across changes:
+
+    python benchmarks/load_test.py --clients 2000 --senders 20 --rate 20 --duration 60
+    python benchmarks/load_test.py --mode subprocess --clients 5000 --rate 5
+    python benchmarks/load_test.py --compare results/before.json results/after.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import websockets
+
+MESSENGER_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Server settings used when the benchmark starts the app itself, so that the
+# limits meant for real users do not throttle the synthetic load.
+SERVER_ENV = {
+    "MAX_WEBSOCKET_CONNECTIONS": "1000000",
+    "RATE_LIMIT_PER_MINUTE": "1000000",
+    "IDLE_TIMEOUT": "0",
+}
+
+MESSAGE_PREFIX = "bench "
+
+
+# ---------------------------
+# Helpers
+# ---------------------------
+def percentile(values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(pct / 100 * len(values))) - 1))
+    return values[index]
+
+
+def summarize(values: list[float]) -> dict:
+    """Return count, mean and the usual percentiles for a list of samples."""
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) if ordered else None,
+        "p50": percentile(ordered, 50),
+        "p90": percentile(ordered, 90),
+        "p99": percentile(ordered, 99),
+        "p999": percentile(ordered, 99.9),
+        "max": ordered[-1] if ordered else None,
+    }
+
+
+def read_rss_bytes(pid: int) -> int | None:
+    """Read the resident set size of a process from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def raise_fd_limit() -> None:
+    """Thousands of sockets need more than the usual 1024 file descriptors."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=MESSENGER_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def wait_for_port(host: str, port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Server did not start on {host}:{port} within {timeout}s")
+            await asyncio.sleep(0.1)
+
+
+# ---------------------------
+# Event-loop Lag & RSS Sampling
+# ---------------------------
+class LoopLagMonitor:
+    """Measures how late a periodic sleep wakes up on the current event loop."""
+
+    def __init__(self, interval: float = 0.1) -> None:
+        self.interval = interval
+        self.samples_ms: list[float] = []
+        self.task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - started - self.interval
+            self.samples_ms.append(max(0.0, lag) * 1000)
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+
+
+class RssSampler:
+    """Samples the RSS of a process once per interval."""
+
+    def __init__(self, pid: int, interval: float = 1.0) -> None:
+        self.pid = pid
+        self.interval = interval
+        self.samples: list[int] = []
+        self.task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        while True:
+            rss = read_rss_bytes(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+
+    def report(self) -> dict:
+        if not self.samples:
+            return {"start_mb": None, "peak_mb": None, "end_mb": None}
+        mb = 1024 * 1024
+        return {
+            "start_mb": round(self.samples[0] / mb, 1),
+            "peak_mb": round(max(self.samples) / mb, 1),
+            "end_mb": round(self.samples[-1] / mb, 1),
+        }
+
+
+# ---------------------------
+# Servers Under Test
+# ---------------------------
+class InProcessServer:
+    """Runs the messenger app with uvicorn on this process's event loop."""
+
+    def __init__(self, port: int) -> None:
+        self.port = port
+        self.pid = os.getpid()
+        self.server = None
+        self.task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        import uvicorn
+
+        os.environ.update(SERVER_ENV)
+        sys.path.insert(0, str(MESSENGER_DIR))
+        from app.main import app
+
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.task = asyncio.create_task(self.server.serve())
+        await wait_for_port("127.0.0.1", self.port, timeout=30)
+
+    async def stop(self) -> None:
+        self.server.should_exit = True
+        await self.task
+
+
+class SubprocessServer:
+    """Spawns `uvicorn app.main:app` from the messenger directory."""
+
+    def __init__(self, port: int) -> None:
+        self.port = port
+        self.process: subprocess.Popen | None = None
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    async def start(self) -> None:
+        env = {**os.environ, **SERVER_ENV}
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "app.main:app",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(self.port),
+                "--log-level",
+                "warning",
+            ],
+            cwd=MESSENGER_DIR,
+            env=env,
+        )
+        await wait_for_port("127.0.0.1", self.port, timeout=30)
+
+    async def stop(self) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+# ---------------------------
+# Benchmark Clients
+# ---------------------------
+class BenchClient:
+    """A single chat participant that records fan-out latency for bench frames."""
+
+    def __init__(self, username: str) -> None:
+        self.username = username
+        self.ws = None
+        self.reader: asyncio.Task | None = None
+        self.latencies_ms: list[float] = []
+        self.received = 0
+        self.rate_limited = 0
+        self.connect_error: str | None = None
+        self.closed_early = False
+        self.close_code: int | None = None
+
+    async def connect(self, base_url: str, timeout: float) -> None:
+        try:
+            self.ws = await websockets.connect(
+                f"{base_url}/ws/chat/{self.username}",
+                open_timeout=timeout,
+                ping_interval=None,
+                max_size=None,
+            )
+        except Exception as e:
+            self.connect_error = f"{type(e).__name__}: {e}"
+            return
+        self.reader = asyncio.create_task(self._read())
+
+    async def _read(self) -> None:
+        try:
+            async for raw in self.ws:
+                received_at = time.perf_counter_ns()
+                frame = json.loads(raw)
+                kind = frame.get("type")
+                if kind == "ping":
+                    await self.ws.send(json.dumps({"type": "pong"}))
+                elif kind == "error":
+                    self.rate_limited += 1
+                elif kind == "message" and frame.get("text", "").startswith(MESSAGE_PREFIX):
+                    sent_at = int(frame["text"].rsplit(" ", 1)[1])
+                    self.latencies_ms.append((received_at - sent_at) / 1e6)
+                    self.received += 1
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.close_code = self.ws.close_code
+
+    @property
+    def is_open(self) -> bool:
+        return self.ws is not None and self.reader is not None and not self.reader.done()
+
+    async def send(self, seq: int) -> None:
+        await self.ws.send(f"{MESSAGE_PREFIX}{self.username} {seq} {time.perf_counter_ns()}")
+
+    async def close(self) -> None:
+        if self.ws is not None:
+            await self.ws.close()
+        if self.reader is not None:
+            await asyncio.gather(self.reader, return_exceptions=True)
+
+
+async def connect_all(clients: list[BenchClient], base_url: str, args) -> float:
+    """Connect every client with bounded concurrency; returns the ramp time in seconds."""
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+
+    async def connect_one(client: BenchClient) -> None:
+        async with semaphore:
+            await client.connect(base_url, args.connect_timeout)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connect_one(client) for client in clients))
+    return time.perf_counter() - started
+
+
+async def drive_messages(clients: list[BenchClient], args) -> tuple[int, int]:
+    """
+    Send bench frames at a fixed aggregate rate, round-robin across senders.
+    Returns (frames sent, frames expected to be delivered).
+    """
+    senders = [client for client in clients[: args.senders] if client.is_open]
+    if not senders or args.rate <= 0:
+        return 0, 0
+    interval = 1 / args.rate
+    deadline = time.perf_counter() + args.duration
+    next_at = time.perf_counter()
+    sent = expected = seq = 0
+    while next_at < deadline:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        sender = senders[seq % len(senders)]
+        seq += 1
+        next_at += interval
+        if not sender.is_open:
+            continue
+        # Every open client (the sender included) should receive the broadcast.
+        expected += sum(1 for client in clients if client.is_open)
+        try:
+            await sender.send(seq)
+            sent += 1
+        except websockets.ConnectionClosed:
+            continue
+    return sent, expected
+
+
+# ---------------------------
+# Benchmark Run
+# ---------------------------
+async def run_benchmark(args) -> dict:
+    raise_fd_limit()
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+        server_pid = args.server_pid
+    else:
+        port = args.port or free_port()
+        server = InProcessServer(port) if args.mode == "inprocess" else SubprocessServer(port)
+        await server.start()
+        base_url = f"ws://127.0.0.1:{port}"
+        server_pid = server.pid
+
+    loop_lag = LoopLagMonitor()
+    loop_lag.start()
+    rss = RssSampler(server_pid) if server_pid else None
+    if rss:
+        rss.start()
+
+    clients = [BenchClient(f"{args.username_prefix}{i}") for i in range(args.clients)]
+    try:
+        ramp_seconds = await connect_all(clients, base_url, args)
+        connected = [client for client in clients if client.connect_error is None]
+        await asyncio.sleep(args.warmup)
+
+        started = time.perf_counter()
+        sent, expected = await drive_messages(connected, args)
+        await asyncio.sleep(args.drain)
+        elapsed = time.perf_counter() - started
+
+        for client in connected:
+            client.closed_early = not client.is_open
+        await asyncio.gather(*(client.close() for client in connected))
+    finally:
+        loop_lag.stop()
+        if rss:
+            rss.stop()
+        if server:
+            await server.stop()
+
+    latencies = [value for client in connected for value in client.latencies_ms]
+    delivered = sum(client.received for client in connected)
+    slow_clients = []
+    for client in connected:
+        client_p99 = percentile(sorted(client.latencies_ms), 99)
+        if client_p99 is not None and client_p99 > args.slow_threshold_ms:
+            slow_clients.append(client.username)
+    dropped = [client for client in connected if client.closed_early]
+    close_codes: dict[str, int] = {}
+    for client in dropped:
+        key = str(client.close_code)
+        close_codes[key] = close_codes.get(key, 0) + 1
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": "external" if args.url else args.mode,
+            "loop_lag_source": "server+clients" if args.mode == "inprocess" and not args.url else "clients",
+        },
+        "params": {
+            "clients": args.clients,
+            "senders": args.senders,
+            "rate": args.rate,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "drain": args.drain,
+            "slow_threshold_ms": args.slow_threshold_ms,
+        },
+        "connections": {
+            "requested": args.clients,
+            "connected": len(connected),
+            "failed": args.clients - len(connected),
+            "ramp_seconds": round(ramp_seconds, 3),
+            "connect_errors": sorted({c.connect_error for c in clients if c.connect_error})[:10],
+        },
+        "messages": {
+            "sent": sent,
+            "expected_deliveries": expected,
+            "delivered": delivered,
+            "delivery_ratio": round(delivered / expected, 6) if expected else None,
+            "deliveries_per_second": round(delivered / elapsed, 1) if elapsed else None,
+            "rate_limited": sum(client.rate_limited for client in connected),
+        },
+        "fanout_latency_ms": summarize(latencies),
+        "event_loop_lag_ms": summarize(loop_lag.samples_ms),
+        "server_rss": rss.report() if rss else None,
+        "clients": {
+            "dropped": len(dropped),
+            "dropped_close_codes": close_codes,
+            "slow": len(slow_clients),
+            "slow_sample": slow_clients[:10],
+        },
+    }
+
+
+# ---------------------------
+# Comparison
+# ---------------------------
+COMPARE_METRICS = [
+    ("fanout_latency_ms", "p50"),
+    ("fanout_latency_ms", "p99"),
+    ("fanout_latency_ms", "max"),
+    ("messages", "delivery_ratio"),
+    ("messages", "deliveries_per_second"),
+    ("event_loop_lag_ms", "p99"),
+    ("server_rss", "peak_mb"),
+    ("clients", "dropped"),
+    ("clients", "slow"),
+]
+
+
+def format_metric(value) -> str:
+    if value is None:
+        return "-"
+    return f"{value:.3f}" if isinstance(value, float) else str(value)
+
+
+def compare_results(baseline_path: Path, candidate_path: Path) -> None:
+    baseline = json.loads(baseline_path.read_text())
+    candidate = json.loads(candidate_path.read_text())
+    print(f"{'metric':40} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for section, key in COMPARE_METRICS:
+        old = (baseline.get(section) or {}).get(key)
+        new = (candidate.get(section) or {}).get(key)
+        change = ""
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)) and old:
+            change = f"{(new - old) / old * 100:+.1f}%"
+        label = f"{section}.{key}"
+        print(f"{label:40} {format_metric(old):>12} {format_metric(new):>12} {change:>9}")
+
+
+# ---------------------------
+# Command Line
+# ---------------------------
+def parse_args(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Messenger WebSocket load/soak benchmark")
+    parser.add_argument("--mode", choices=["inprocess", "subprocess"], default="inprocess")
+    parser.add_argument("--url", help="Benchmark a running server, e.g. ws://localhost:8100")
+    parser.add_argument("--server-pid", type=int, help="PID of an external server, for RSS sampling")
+    parser.add_argument("--port", type=int, help="Port for a server started by the benchmark")
+    parser.add_argument("--clients", type=int, default=1000, help="Number of WebSocket clients")
+    parser.add_argument("--senders", type=int, default=10, help="Clients that send messages")
+    parser.add_argument("--rate", type=float, default=10, help="Aggregate messages per second")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to drive messages")
+    parser.add_argument("--warmup", type=float, default=2, help="Seconds to wait after connecting")
+    parser.add_argument("--drain", type=float, default=2, help="Seconds to wait for late frames")
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--connect-timeout", type=float, default=30)
+    parser.add_argument("--slow-threshold-ms", type=float, default=1000)
+    parser.add_argument("--username-prefix", default="bench_")
+    parser.add_argument("--output", type=Path, help="Where to write the JSON result")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        type=Path,
+        metavar=("BASELINE", "CANDIDATE"),
+        help="Compare two saved results instead of running",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    if args.compare:
+        compare_results(*args.compare)
+        return
+
+    result = asyncio.run(run_benchmark(args))
+    output = args.output or RESULTS_DIR / f"messenger-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+
+    latency = result["fanout_latency_ms"]
+    print(
+        f"{result['connections']['connected']}/{args.clients} clients connected, "
+        f"{result['messages']['delivered']}/{result['messages']['expected_deliveries']} frames delivered"
+    )
+    if latency["count"]:
+        print(
+            f"fan-out latency ms: p50={latency['p50']:.2f} p99={latency['p99']:.2f} "
+            f"max={latency['max']:.2f}"
+        )
+    print(f"dropped={result['clients']['dropped']} slow={result['clients']['slow']}")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
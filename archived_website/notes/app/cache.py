@@ -0,0 +1,151 @@
+"""
+Rendered-page cache for DunamisMax Notes.
+
+Pages are cached as rendered bytes and tagged with the data version they were
+built from. Every write bumps the list version (and the version of the note it
+touched), so stale entries are never served. Notes are written rarely and read
+often, so repeat views skip both the database and Jinja.
+
+The cache lives in the worker process. When running several workers, set
+NOTES_CACHE_TTL so a write in one worker is picked up by the others within
+that many seconds.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Hashable, Optional, Union
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response
+
+
+class CachedPage:
+    """A rendered page plus the validators needed for conditional requests."""
+
+    __slots__ = ("body", "etag", "last_modified", "headers", "version", "stored_at")
+
+    def __init__(
+        self,
+        body: bytes,
+        last_modified: Optional[datetime],
+        headers: dict[str, str],
+        version: int,
+    ) -> None:
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.last_modified = last_modified
+        self.headers = headers
+        self.version = version
+        self.stored_at = time.monotonic()
+
+
+class PageCache:
+    """
+    LRU cache of rendered pages with version-based invalidation.
+
+    Keys are tuples whose first element is the page kind. Keys of the form
+    ("note", note_id, ...) depend on that note only; every other key depends
+    on the whole list of notes.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 0.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[Hashable, CachedPage]" = OrderedDict()
+        self.list_version = 0
+        self.note_versions: dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def version_for(self, key: tuple) -> int:
+        """Current data version for a key; capture it before reading the database."""
+        if key[0] == "note":
+            return self.note_versions.get(key[1], 0)
+        return self.list_version
+
+    def invalidate(self, note_id: Optional[int] = None) -> None:
+        """Record a write: every list page is stale, and so is the given note."""
+        self.list_version += 1
+        if note_id is not None:
+            self.note_versions[note_id] = self.note_versions.get(note_id, 0) + 1
+
+    def get(self, key: tuple) -> Optional[CachedPage]:
+        page = self.entries.get(key)
+        if page is None:
+            self.misses += 1
+            return None
+        expired = self.ttl and time.monotonic() - page.stored_at > self.ttl
+        if page.version != self.version_for(key) or expired:
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return page
+
+    def put(
+        self,
+        key: tuple,
+        version: int,
+        body: bytes,
+        last_modified: Optional[datetime] = None,
+        headers: Optional[dict[str, str]] = None,
+    ) -> CachedPage:
+        """
+        Store a rendered page built from data at the given version. If a write
+        happened while the page was being built, it is returned but not cached.
+        """
+        page = CachedPage(body, last_modified, headers or {}, version)
+        if version == self.version_for(key):
+            self.entries[key] = page
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return page
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "list_version": self.list_version,
+        }
+
+
+def to_http_datetime(value: Union[datetime, str, None]) -> Optional[datetime]:
+    """Normalise a database timestamp to an aware UTC datetime at second precision."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def is_not_modified(request: Request, page: CachedPage) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against a cached page."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or page.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and page.last_modified:
+        try:
+            return page.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def page_response(request: Request, page: CachedPage) -> Response:
+    """Serve a cached page, or 304 Not Modified if the client's copy is current."""
+    headers = {"ETag": page.etag, "Cache-Control": "private, no-cache", **page.headers}
+    if page.last_modified:
+        headers["Last-Modified"] = format_datetime(page.last_modified, usegmt=True)
+    if is_not_modified(request, page):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(content=page.body, headers=headers)
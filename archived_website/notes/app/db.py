@@ -0,0 +1,460 @@
+"""
+Database access layer for DunamisMax Notes.
+
+A single connection pool is created at startup and shared by every request.
+Queries run on a dedicated thread pool sized to the connection pool, so a slow
+statement never blocks the event loop and a worker thread never has to wait
+for a free connection.
+
+Backends:
+  - postgres : psycopg2 ThreadedConnectionPool (production)
+  - sqlite   : sqlite3 stand-in for local development and testing
+"""
+
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, AsyncIterator, Callable, Optional, Sequence
+
+logger = logging.getLogger("NotesApp.db")
+
+
+class DatabaseError(Exception):
+    """Raised when the pool cannot provide a working connection."""
+
+
+class _TimedSQLiteConnection(sqlite3.Connection):
+    """SQLite connection that aborts statements running past a deadline."""
+
+    deadline: float = 0.0
+
+    def arm(self, timeout: float) -> None:
+        self.deadline = time.monotonic() + timeout if timeout else 0.0
+
+
+class _SQLitePool:
+    """
+    Minimal pool for the SQLite stand-in, exposing the same getconn/putconn/closeall
+    interface as psycopg2's pools.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, path: str, timeout: float) -> None:
+        self.path = path
+        self.timeout = timeout
+        self.maxconn = maxconn
+        self.idle: queue.LifoQueue = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+        self.closed = False
+        for _ in range(minconn):
+            self.idle.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            factory=_TimedSQLiteConnection,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        # Interrupt statements that outlive their deadline (checked every 1000 VM steps)
+        conn.set_progress_handler(
+            lambda: 1 if conn.deadline and time.monotonic() > conn.deadline else 0, 1000
+        )
+        with self.lock:
+            self.opened += 1
+        return conn
+
+    def getconn(self) -> sqlite3.Connection:
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            can_open = self.opened < self.maxconn
+        if can_open:
+            return self._connect()
+        return self.idle.get()
+
+    def putconn(self, conn: sqlite3.Connection, close: bool = False) -> None:
+        if close or self.closed:
+            conn.close()
+            with self.lock:
+                self.opened -= 1
+            return
+        self.idle.put(conn)
+
+    def closeall(self) -> None:
+        self.closed = True
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class Database:
+    """
+    Pooled, non-blocking access to the notes database.
+
+    All public query methods are coroutines; the blocking driver calls run on a
+    private ThreadPoolExecutor with one thread per pooled connection.
+    """
+
+    def __init__(
+        self,
+        backend: str = "postgres",
+        *,
+        dsn: Optional[dict] = None,
+        sqlite_path: str = "notes.sqlite3",
+        min_size: int = 1,
+        max_size: int = 10,
+        statement_timeout: float = 5.0,
+        connect_timeout: int = 5,
+        health_check_interval: float = 30.0,
+    ) -> None:
+        if backend not in ("postgres", "sqlite"):
+            raise ValueError(f"Unsupported database backend: {backend}")
+        self.backend = backend
+        self.dsn = dsn or {}
+        self.sqlite_path = sqlite_path
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_timeout = statement_timeout
+        self.connect_timeout = connect_timeout
+        self.health_check_interval = health_check_interval
+        self.pool = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        # id(conn) -> monotonic time the connection was last returned to the pool
+        self.last_used: dict[int, float] = {}
+        self.in_use = 0
+        self.waiting = 0
+        self.discarded = 0
+        self.stats_lock = threading.Lock()
+
+    @property
+    def is_sqlite(self) -> bool:
+        return self.backend == "sqlite"
+
+    # ---------------------------------------------------------------------
+    # Lifecycle
+    # ---------------------------------------------------------------------
+    async def open(self) -> None:
+        """Create the connection pool and its worker threads."""
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_size, thread_name_prefix="notes-db"
+        )
+        loop = asyncio.get_running_loop()
+        self.pool = await loop.run_in_executor(self.executor, self._create_pool)
+        logger.info(
+            f"Database pool ready ({self.backend}, min={self.min_size}, max={self.max_size})"
+        )
+
+    def _create_pool(self):
+        if self.is_sqlite:
+            return _SQLitePool(
+                self.min_size, self.max_size, self.sqlite_path, self.connect_timeout
+            )
+        import psycopg2.pool
+
+        options = f"-c statement_timeout={int(self.statement_timeout * 1000)}"
+        return psycopg2.pool.ThreadedConnectionPool(
+            self.min_size,
+            self.max_size,
+            connect_timeout=self.connect_timeout,
+            options=options,
+            **self.dsn,
+        )
+
+    async def close(self) -> None:
+        """Close every pooled connection and stop the worker threads."""
+        if self.pool is not None:
+            self.pool.closeall()
+            self.pool = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    # ---------------------------------------------------------------------
+    # Connection Checkout (worker threads only)
+    # ---------------------------------------------------------------------
+    def _is_closed(self, conn) -> bool:
+        if self.is_sqlite:
+            return False
+        return bool(conn.closed)
+
+    def _ping(self, conn) -> bool:
+        """Run a trivial query to confirm a connection that sat idle still works."""
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            finally:
+                cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _acquire(self):
+        if self.pool is None:
+            raise DatabaseError("Database pool is not open")
+        for _ in range(self.max_size + 1):
+            conn = self.pool.getconn()
+            idle_for = time.monotonic() - self.last_used.get(id(conn), time.monotonic())
+            stale = idle_for > self.health_check_interval and not self._ping(conn)
+            if self._is_closed(conn) or stale:
+                self._discard(conn)
+                continue
+            return conn
+        raise DatabaseError("Could not obtain a healthy database connection")
+
+    def _discard(self, conn) -> None:
+        self.last_used.pop(id(conn), None)
+        self.discarded += 1
+        try:
+            self.pool.putconn(conn, close=True)
+        except Exception:
+            pass
+
+    def _release(self, conn, broken: bool) -> None:
+        if broken or self._is_closed(conn):
+            self._discard(conn)
+            return
+        self.last_used[id(conn)] = time.monotonic()
+        self.pool.putconn(conn)
+
+    def _call(self, fn: Callable, timeout: Optional[float], *args) -> Any:
+        """Check out a connection, run fn(conn, *args) in a transaction and return it."""
+        with self.stats_lock:
+            self.waiting -= 1
+            self.in_use += 1
+        broken = False
+        conn = None
+        try:
+            conn = self._acquire()
+            if self.is_sqlite:
+                conn.arm(self.statement_timeout if timeout is None else timeout)
+            elif timeout is not None:
+                cur = conn.cursor()
+                try:
+                    cur.execute("SET LOCAL statement_timeout = %s", (int(timeout * 1000),))
+                finally:
+                    cur.close()
+            result = fn(conn, *args)
+            conn.commit()
+            return result
+        except Exception as e:
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+                broken = broken or self._is_connection_error(e)
+            raise
+        finally:
+            if conn is not None:
+                if self.is_sqlite:
+                    conn.arm(0)
+                self._release(conn, broken)
+            with self.stats_lock:
+                self.in_use -= 1
+
+    def _is_connection_error(self, error: Exception) -> bool:
+        if self.is_sqlite:
+            return False
+        import psycopg2
+
+        return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+    # ---------------------------------------------------------------------
+    # Query Helpers
+    # ---------------------------------------------------------------------
+    def _sql(self, sql: str) -> str:
+        """Translate psycopg2-style placeholders for the SQLite stand-in."""
+        return sql.replace("%s", "?") if self.is_sqlite else sql
+
+    def cursor(self, conn):
+        """Return a cursor whose rows can be converted with dict()."""
+        if self.is_sqlite:
+            return conn.cursor()
+        import psycopg2.extras
+
+        return conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """
+        Run fn(conn, *args) on a pooled connection in a worker thread.
+        The call is one transaction: committed on success, rolled back on error.
+        timeout overrides the statement timeout for this call (0 disables it).
+        """
+        if self.executor is None:
+            raise DatabaseError("Database pool is not open")
+        with self.stats_lock:
+            self.waiting += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._call, fn, timeout, *args)
+
+    async def stream(
+        self, sql: str, params: Sequence = (), batch_size: int = 500
+    ) -> AsyncIterator[dict]:
+        """
+        Yield rows one at a time without loading the whole result into memory.
+
+        PostgreSQL uses a server-side (named) cursor; SQLite cursors are already
+        lazy. Batches are handed to the event loop through a small bounded queue,
+        so a slow consumer pauses the database read instead of buffering it.
+        The worker holds one pooled connection for the life of the stream.
+        """
+        loop = asyncio.get_running_loop()
+        batches: asyncio.Queue = asyncio.Queue(maxsize=2)
+        stopped = threading.Event()
+        done = object()
+
+        def put(item) -> None:
+            future = asyncio.run_coroutine_threadsafe(batches.put(item), loop)
+            while not stopped.is_set():
+                try:
+                    future.result(timeout=0.5)
+                    return
+                except FutureTimeoutError:
+                    continue
+            future.cancel()
+
+        def produce(conn) -> None:
+            if self.is_sqlite:
+                cur = conn.cursor()
+            else:
+                import psycopg2.extras
+
+                cur = conn.cursor(
+                    name=f"stream_{uuid.uuid4().hex}",
+                    cursor_factory=psycopg2.extras.RealDictCursor,
+                )
+                cur.itersize = batch_size
+            try:
+                cur.execute(self._sql(sql), params)
+                while not stopped.is_set():
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    put([dict(row) for row in rows])
+            finally:
+                cur.close()
+
+        async def run_producer() -> None:
+            try:
+                # Each FETCH is its own statement on PostgreSQL; on SQLite the
+                # whole stream is one statement, so it gets no deadline.
+                await self.run(produce, timeout=0 if self.is_sqlite else None)
+            except Exception as e:
+                await batches.put(e)
+            else:
+                await batches.put(done)
+
+        producer = asyncio.create_task(run_producer())
+        try:
+            while True:
+                item = await batches.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                for row in item:
+                    yield row
+        finally:
+            stopped.set()
+            while not batches.empty():
+                batches.get_nowait()
+            if not producer.done():
+                await asyncio.gather(producer, return_exceptions=True)
+
+    async def fetch_all(self, sql: str, params: Sequence = ()) -> list[dict]:
+        def query(conn):
+            cur = self.cursor(conn)
+            try:
+                cur.execute(self._sql(sql), params)
+                return [dict(row) for row in cur.fetchall()]
+            finally:
+                cur.close()
+
+        return await self.run(query)
+
+    async def fetch_one(self, sql: str, params: Sequence = ()) -> Optional[dict]:
+        def query(conn):
+            cur = self.cursor(conn)
+            try:
+                cur.execute(self._sql(sql), params)
+                row = cur.fetchone()
+                return dict(row) if row is not None else None
+            finally:
+                cur.close()
+
+        return await self.run(query)
+
+    async def execute(self, sql: str, params: Sequence = ()) -> int:
+        """Execute a statement and return the number of affected rows."""
+
+        def query(conn):
+            cur = conn.cursor()
+            try:
+                cur.execute(self._sql(sql), params)
+                return cur.rowcount
+            finally:
+                cur.close()
+
+        return await self.run(query)
+
+    async def execute_script(self, script: str) -> None:
+        """Execute several semicolon-separated statements (schema setup)."""
+
+        def query(conn):
+            if self.is_sqlite:
+                conn.executescript(script)
+                return
+            cur = conn.cursor()
+            try:
+                cur.execute(script)
+            finally:
+                cur.close()
+
+        await self.run(query)
+
+    # ---------------------------------------------------------------------
+    # Health & Stats
+    # ---------------------------------------------------------------------
+    def stats(self) -> dict:
+        """Snapshot of pool usage."""
+        return {
+            "backend": self.backend,
+            "max_size": self.max_size,
+            "in_use": self.in_use,
+            "waiting": max(0, self.waiting),
+            "discarded": self.discarded,
+        }
+
+    async def health_check(self) -> dict:
+        """Round-trip a trivial query through the pool and report its latency."""
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.fetch_one("SELECT 1 AS ok"), self.statement_timeout)
+            ok = True
+            error = None
+        except Exception as e:
+            ok = False
+            error = str(e) or type(e).__name__
+        return {
+            "ok": ok,
+            "error": error,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            **self.stats(),
+        }
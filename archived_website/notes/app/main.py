@@ -4,35 +4,51 @@ notes.dunamismax.com - A password-protected note-taking FastAPI app.
 Features:
   - Single admin password (set via environment variable) for access
   - PostgreSQL database for storing, editing, and deleting notes
+    (pooled, queried off the event loop; SQLite stand-in for local use)
   - Jinja2 templates with a clean, Nord-inspired design
   - Session-based authentication using cookie middleware
 """
 
-import logging
+import base64
+import binascii
 import os
+import sys
 from pathlib import Path
+from typing import Optional
 
-import psycopg2
-import psycopg2.extras
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, Form, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from markupsafe import Markup, escape
+from fastapi import Depends, FastAPI, File, Form, Query, Request, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
 from starlette.middleware.sessions import SessionMiddleware
 
+# shared/ lives next to the service directories
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from shared.assets import AssetFiles, cached_templates, register_asset_helpers  # noqa: E402
+from shared.logs import RequestIdMiddleware, configure_logging  # noqa: E402
+from shared.metrics import instrument  # noqa: E402
+from shared.profiling import add_profiling  # noqa: E402
+
+from .cache import PageCache, page_response, to_http_datetime  # noqa: E402
+from .db import Database  # noqa: E402
+from .patches import AutosaveRequest, PatchError, apply_patches  # noqa: E402
+from .transfer import (  # noqa: E402
+    FORMATS,
+    InvalidImportError,
+    detect_format,
+    export_notes,
+    import_notes,
+)
+
 # -------------------------------------------------------------------------
 # Logging & Environment Setup
 # -------------------------------------------------------------------------
-logging.basicConfig(
-    level=os.getenv("LOG_LEVEL", "INFO"),
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("notes.log", mode="a"),
-    ],
-)
-logger = logging.getLogger("NotesApp")
+# Console plus a rotating JSON file, written by a background thread
+BASE_DIR = Path(__file__).parent
+logger = configure_logging("notes", "NotesApp", BASE_DIR / "logs" / "notes.log")
 
 # Load environment variables (assuming .env is in the parent directory)
 ENV_PATH = Path(__file__).parent.parent / ".env"
@@ -44,6 +60,20 @@ DB_NAME = os.getenv("NOTES_DB_NAME", "notes_db")
 DB_USER = os.getenv("NOTES_DB_USER", "notes_user")
 DB_PASS = os.getenv("NOTES_DB_PASS", "notes_password")
 DB_PORT = os.getenv("NOTES_DB_PORT", "5432")
+# "postgres" in production; "sqlite" uses a local file as a stand-in
+DB_BACKEND = os.getenv("NOTES_DB_BACKEND", "postgres").lower()
+SQLITE_PATH = os.getenv("NOTES_SQLITE_PATH", "notes.sqlite3")
+DB_POOL_MIN = int(os.getenv("NOTES_DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("NOTES_DB_POOL_MAX", "10"))
+DB_STATEMENT_TIMEOUT = float(os.getenv("NOTES_DB_STATEMENT_TIMEOUT", "5"))
+DB_CONNECT_TIMEOUT = int(os.getenv("NOTES_DB_CONNECT_TIMEOUT", "5"))
+# Notes per page on the index and characters of content shown in list previews
+PAGE_SIZE = int(os.getenv("NOTES_PAGE_SIZE", "20"))
+PREVIEW_LENGTH = int(os.getenv("NOTES_PREVIEW_LENGTH", "300"))
+SEARCH_LIMIT = int(os.getenv("NOTES_SEARCH_LIMIT", "50"))
+# Rendered-page cache size and optional expiry (seconds, 0 = only on writes)
+CACHE_MAX_ENTRIES = int(os.getenv("NOTES_CACHE_MAX_ENTRIES", "256"))
+CACHE_TTL = float(os.getenv("NOTES_CACHE_TTL", "0"))
 SECRET_KEY = os.getenv("NOTES_SECRET_KEY", "REPLACE_WITH_SECURE_RANDOM_KEY")
 
 # -------------------------------------------------------------------------
@@ -55,49 +85,246 @@ app = FastAPI(
     version="1.0.0",
 )
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
+app.add_middleware(RequestIdMiddleware)
 
-BASE_DIR = Path(__file__).parent
-templates = Jinja2Templates(directory=BASE_DIR / "templates")
-app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
+templates = cached_templates(BASE_DIR / "templates")
+register_asset_helpers(templates, BASE_DIR / "static")
+app.mount("/static", AssetFiles(directory=BASE_DIR / "static"), name="static")
+metrics = instrument(app, "notes")
+watchdog = add_profiling(app, logger)
 
 
 # -------------------------------------------------------------------------
 # Database Helpers
 # -------------------------------------------------------------------------
-def get_db_connection():
-    """Return a new psycopg2 connection to PostgreSQL."""
-    return psycopg2.connect(
-        host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASS, port=DB_PORT
-    )
+db = Database(
+    DB_BACKEND,
+    dsn={
+        "host": DB_HOST,
+        "dbname": DB_NAME,
+        "user": DB_USER,
+        "password": DB_PASS,
+        "port": DB_PORT,
+    },
+    sqlite_path=SQLITE_PATH,
+    min_size=DB_POOL_MIN,
+    max_size=DB_POOL_MAX,
+    statement_timeout=DB_STATEMENT_TIMEOUT,
+    connect_timeout=DB_CONNECT_TIMEOUT,
+)
+
+page_cache = PageCache(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+
+metrics.gauge("notes_db_pool_in_use", "Database connections checked out", lambda: db.in_use)
+metrics.gauge("notes_db_pool_waiting", "Queries waiting for a connection", lambda: max(0, db.waiting))
+metrics.gauge("notes_db_pool_max", "Database pool size limit", lambda: db.max_size)
+metrics.counter(
+    "notes_db_pool_discarded_total", "Broken connections dropped from the pool", lambda: db.discarded
+)
+metrics.gauge("notes_page_cache_entries", "Rendered pages held in memory", lambda: len(page_cache.entries))
+metrics.counter("notes_page_cache_hits_total", "Page cache hits", lambda: page_cache.hits)
+metrics.counter("notes_page_cache_misses_total", "Page cache misses", lambda: page_cache.misses)
+
+POSTGRES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id SERIAL PRIMARY KEY,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS notes_created_at_id_idx ON notes (created_at DESC, id DESC);
+-- Incremented on every save, for optimistic concurrency control
+ALTER TABLE notes ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+-- Full-text search: weighted title/content vector maintained by PostgreSQL itself
+ALTER TABLE notes ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ) STORED;
+CREATE INDEX IF NOT EXISTS notes_search_vector_idx ON notes USING GIN (search_vector);
+"""
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS notes_created_at_id_idx ON notes (created_at DESC, id DESC);
+-- Full-text search: FTS5 index over the notes table, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+    title, content, content='notes', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+    INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+    INSERT INTO notes_fts(notes_fts, rowid, title, content)
+    VALUES ('delete', old.id, old.title, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF title, content ON notes BEGIN
+    INSERT INTO notes_fts(notes_fts, rowid, title, content)
+    VALUES ('delete', old.id, old.title, old.content);
+    INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+END;
+"""
 
 
-def init_db():
-    """Initialize the notes table if it does not exist."""
+async def init_db():
+    """Initialize the notes table and its indexes if they do not exist."""
     logger.info("Initializing notes table if not exists...")
-    create_table_sql = """
-    CREATE TABLE IF NOT EXISTS notes (
-        id SERIAL PRIMARY KEY,
-        title TEXT NOT NULL,
-        content TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT NOW(),
-        updated_at TIMESTAMP DEFAULT NOW()
-    );
-    """
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(create_table_sql)
-        conn.commit()
+    if db.is_sqlite:
+        fts_exists = await db.fetch_one(
+            "SELECT 1 AS found FROM sqlite_master WHERE name = 'notes_fts'"
+        )
+        await db.execute_script(SQLITE_SCHEMA)
+        columns = await db.fetch_all("PRAGMA table_info(notes)")
+        if "version" not in {column["name"] for column in columns}:
+            await db.execute("ALTER TABLE notes ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        if not fts_exists:
+            # Index notes that were written before the search table existed
+            await db.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+    else:
+        await db.execute_script(POSTGRES_SCHEMA)
     logger.info("Database initialized successfully.")
 
 
+# -------------------------------------------------------------------------
+# Pagination Helpers
+# -------------------------------------------------------------------------
+def encode_cursor(note: dict) -> str:
+    """Encode the (created_at, id) position of a note as an opaque cursor."""
+    raw = f"{note['created_at']}|{note['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[tuple[str, int]]:
+    """Decode a cursor produced by encode_cursor; returns None if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, note_id = base64.urlsafe_b64decode(padded).decode().rsplit("|", 1)
+        return created_at, int(note_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+async def fetch_notes_page(cursor: Optional[str] = None) -> tuple[list[dict], Optional[str]]:
+    """
+    Fetch one page of notes, newest first, using keyset pagination on (created_at, id).
+    Only the columns the list view needs are read, with content cut down to a preview.
+    Returns the notes and the cursor for the next page (None on the last page).
+    """
+    position = decode_cursor(cursor) if cursor else None
+    where = "WHERE (created_at, id) < (%s, %s)" if position else ""
+    notes = await db.fetch_all(
+        f"""
+        SELECT id, title, created_at,
+               SUBSTR(content, 1, %s) AS preview,
+               LENGTH(content) > %s AS truncated
+        FROM notes
+        {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+        """,
+        (PREVIEW_LENGTH, PREVIEW_LENGTH, *(position or ()), PAGE_SIZE + 1),
+    )
+    if len(notes) <= PAGE_SIZE:
+        return notes, None
+    notes = notes[:PAGE_SIZE]
+    return notes, encode_cursor(notes[-1])
+
+
+# -------------------------------------------------------------------------
+# Search Helpers
+# -------------------------------------------------------------------------
+# Control characters mark snippet highlights so the note text can be escaped
+# before the markers are swapped for <mark> tags.
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_STOP = "\x03"
+
+
+def render_snippet(snippet: Optional[str]) -> Markup:
+    """Escape a search snippet and turn its highlight markers into <mark> tags."""
+    escaped = str(escape(snippet or ""))
+    return Markup(
+        escaped.replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_STOP, "</mark>")
+    )
+
+
+def fts5_query(query: str) -> str:
+    """Quote each search term so user input cannot break FTS5 query syntax."""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+async def search_notes(query: str, limit: int = SEARCH_LIMIT) -> list[dict]:
+    """
+    Return notes matching a full-text query, best matches first, each with a
+    highlighted snippet. Uses tsvector/GIN on PostgreSQL and FTS5 on SQLite.
+    """
+    query = query.strip()
+    if not query:
+        return []
+    if db.is_sqlite:
+        results = await db.fetch_all(
+            """
+            SELECT n.id, n.title, n.created_at,
+                   snippet(notes_fts, -1, %s, %s, '…', 24) AS snippet,
+                   bm25(notes_fts, 10.0, 1.0) AS rank
+            FROM notes_fts
+            JOIN notes n ON n.id = notes_fts.rowid
+            WHERE notes_fts MATCH %s
+            ORDER BY rank
+            LIMIT %s
+            """,
+            (HIGHLIGHT_START, HIGHLIGHT_STOP, fts5_query(query), limit),
+        )
+    else:
+        # Rank and limit first so ts_headline only runs on the rows returned
+        results = await db.fetch_all(
+            """
+            SELECT id, title, created_at, rank,
+                   ts_headline('english', content, query, %s) AS snippet
+            FROM (
+                SELECT id, title, created_at, content, query,
+                       ts_rank_cd(search_vector, query) AS rank
+                FROM notes, websearch_to_tsquery('english', %s) AS query
+                WHERE search_vector @@ query
+                ORDER BY rank DESC, created_at DESC
+                LIMIT %s
+            ) AS ranked
+            ORDER BY rank DESC, created_at DESC
+            """,
+            (
+                f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, "
+                "MaxWords=35, MinWords=15, MaxFragments=2, FragmentDelimiter=…",
+                query,
+                limit,
+            ),
+        )
+    for result in results:
+        result["snippet"] = render_snippet(result["snippet"])
+    return results
+
+
 @app.on_event("startup")
 async def startup_event():
     """Run on server startup."""
     logger.info("Starting up NotesApp...")
-    init_db()
+    await db.open()
+    await init_db()
     logger.info("Startup complete.")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release pooled database connections."""
+    await db.close()
+
+
 # -------------------------------------------------------------------------
 # Authentication Dependency
 # -------------------------------------------------------------------------
@@ -139,20 +366,156 @@ async def logout(request: Request):
     return RedirectResponse(url="/login", status_code=302)
 
 
+# -------------------------------------------------------------------------
+# Routes: Health
+# -------------------------------------------------------------------------
+@app.get("/health")
+async def health_check():
+    """Report database pool health; returns 503 if the database is unreachable."""
+    database = await db.health_check()
+    status = "ok" if database["ok"] else "degraded"
+    return JSONResponse(
+        {"status": status, "database": database},
+        status_code=200 if database["ok"] else 503,
+    )
+
+
 # -------------------------------------------------------------------------
 # Routes: Notes CRUD
 # -------------------------------------------------------------------------
 @app.get("/", response_class=HTMLResponse)
-async def list_notes(request: Request, auth: bool = Depends(requires_login)):
-    """Display all notes and a form to create a new note."""
+async def list_notes(
+    request: Request,
+    cursor: Optional[str] = Query(None),
+    auth: bool = Depends(requires_login),
+):
+    """
+    Display the first page of notes (or the page at cursor) and a form to create a new note.
+    Served from the page cache until the next write; validated by ETag only, since
+    deletions do not show up in any note's updated_at.
+    """
+    if isinstance(auth, RedirectResponse):
+        return auth
+
+    key = ("list", cursor or "")
+    page = page_cache.get(key)
+    if page is None:
+        version = page_cache.version_for(key)
+        notes, next_cursor = await fetch_notes_page(cursor)
+        rendered = templates.TemplateResponse(
+            "index.html", {"request": request, "notes": notes, "next_cursor": next_cursor}
+        )
+        page = page_cache.put(key, version, rendered.body)
+    return page_response(request, page)
+
+
+@app.get("/notes/page", response_class=HTMLResponse)
+async def notes_page(
+    request: Request,
+    cursor: Optional[str] = Query(None),
+    auth: bool = Depends(requires_login),
+):
+    """
+    Render the next page of note cards as an HTML fragment for lazy loading.
+    The cursor for the following page is returned in the X-Next-Cursor header.
+    """
+    if isinstance(auth, RedirectResponse):
+        return auth
+
+    key = ("list-fragment", cursor or "")
+    page = page_cache.get(key)
+    if page is None:
+        version = page_cache.version_for(key)
+        notes, next_cursor = await fetch_notes_page(cursor)
+        rendered = templates.TemplateResponse(
+            "_note_cards.html", {"request": request, "notes": notes}
+        )
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        page = page_cache.put(key, version, rendered.body, headers=headers)
+    return page_response(request, page)
+
+
+@app.get("/search", response_class=HTMLResponse)
+async def search_page(
+    request: Request,
+    q: str = Query(""),
+    auth: bool = Depends(requires_login),
+):
+    """Render ranked full-text search results for q."""
+    if isinstance(auth, RedirectResponse):
+        return auth
+
+    results = await search_notes(q)
+    return templates.TemplateResponse(
+        "search.html", {"request": request, "query": q, "results": results}
+    )
+
+
+@app.get("/api/search")
+async def search_api(request: Request, q: str = Query("")):
+    """Return ranked full-text search results as JSON."""
+    if not request.session.get("logged_in"):
+        return JSONResponse({"detail": "Not authenticated"}, status_code=401)
+
+    results = await search_notes(q)
+    return {
+        "query": q,
+        "results": [
+            {
+                "id": result["id"],
+                "title": result["title"],
+                "snippet": str(result["snippet"]),
+                "rank": result["rank"],
+                "created_at": str(result["created_at"]),
+            }
+            for result in results
+        ],
+    }
+
+
+@app.get("/notes/export")
+async def export_notes_route(
+    format: str = Query("ndjson"),
+    auth: bool = Depends(requires_login),
+):
+    """Stream every note as NDJSON or as a zip of Markdown files."""
     if isinstance(auth, RedirectResponse):
         return auth
+    if format not in FORMATS:
+        return JSONResponse({"detail": f"Unsupported export format: {format}"}, status_code=400)
+
+    media_type, filename = FORMATS[format]
+    logger.info(f"Exporting notes as {format}")
+    return StreamingResponse(
+        export_notes(db, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 
-    with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            cur.execute("SELECT * FROM notes ORDER BY created_at DESC;")
-            notes = cur.fetchall()
-    return templates.TemplateResponse("index.html", {"request": request, "notes": notes})
+@app.post("/notes/import")
+async def import_notes_route(
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None),
+    auth: bool = Depends(requires_login),
+):
+    """Import notes from an NDJSON file or Markdown zip in a single transaction."""
+    if isinstance(auth, RedirectResponse):
+        return auth
+    fmt = format or detect_format(file.filename or "")
+    if fmt not in FORMATS:
+        return JSONResponse({"detail": f"Unsupported import format: {fmt}"}, status_code=400)
+
+    try:
+        count = await import_notes(db, file.file, fmt)
+    except (InvalidImportError, UnicodeDecodeError) as e:
+        logger.warning(f"Rejected note import: {e}")
+        return JSONResponse({"detail": f"Invalid import file: {e}"}, status_code=400)
+    finally:
+        await file.close()
+    page_cache.invalidate()
+    logger.info(f"Imported {count} notes from {file.filename}")
+    return {"imported": count}
 
 
 @app.post("/notes/create")
@@ -166,31 +529,39 @@ async def create_note(
     if isinstance(auth, RedirectResponse):
         return auth
 
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO notes (title, content, updated_at) VALUES (%s, %s, NOW())",
-                (title, content),
-            )
-        conn.commit()
+    await db.execute(
+        "INSERT INTO notes (title, content, updated_at) VALUES (%s, %s, CURRENT_TIMESTAMP)",
+        (title, content),
+    )
+    page_cache.invalidate()
     logger.info(f"Created note: {title}")
     return RedirectResponse(url="/", status_code=302)
 
 
 @app.get("/notes/{note_id}/edit", response_class=HTMLResponse)
 async def edit_note_form(request: Request, note_id: int, auth: bool = Depends(requires_login)):
-    """Display the note editing form."""
+    """Display the note editing form, cached until the note changes."""
     if isinstance(auth, RedirectResponse):
         return auth
 
-    with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            cur.execute("SELECT * FROM notes WHERE id = %s;", (note_id,))
-            note = cur.fetchone()
-    if not note:
-        logger.warning(f"Note ID {note_id} not found.")
-        return RedirectResponse(url="/", status_code=302)
-    return templates.TemplateResponse("edit_note.html", {"request": request, "note": note})
+    key = ("note", note_id)
+    page = page_cache.get(key)
+    if page is None:
+        version = page_cache.version_for(key)
+        note = await db.fetch_one(
+            "SELECT id, title, content, created_at, updated_at, version FROM notes WHERE id = %s",
+            (note_id,),
+        )
+        if not note:
+            logger.warning(f"Note ID {note_id} not found.")
+            return RedirectResponse(url="/", status_code=302)
+        rendered = templates.TemplateResponse(
+            "edit_note.html", {"request": request, "note": note}
+        )
+        page = page_cache.put(
+            key, version, rendered.body, last_modified=to_http_datetime(note["updated_at"])
+        )
+    return page_response(request, page)
 
 
 @app.post("/notes/{note_id}/edit")
@@ -199,33 +570,91 @@ async def update_note(
     note_id: int,
     title: str = Form(...),
     content: str = Form(...),
+    version: Optional[int] = Form(None),
     auth: bool = Depends(requires_login),
 ):
-    """Update a note in the database."""
+    """
+    Update a note in the database.
+    If the form carries a version that is no longer current (another tab or an
+    autosave got there first), the form is shown again instead of overwriting.
+    """
     if isinstance(auth, RedirectResponse):
         return auth
 
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "UPDATE notes SET title = %s, content = %s, updated_at = NOW() WHERE id = %s",
-                (title, content, note_id),
+    if version is None:
+        await db.execute(
+            "UPDATE notes SET title = %s, content = %s, version = version + 1, "
+            "updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+            (title, content, note_id),
+        )
+    else:
+        updated = await db.execute(
+            "UPDATE notes SET title = %s, content = %s, version = version + 1, "
+            "updated_at = CURRENT_TIMESTAMP WHERE id = %s AND version = %s",
+            (title, content, note_id, version),
+        )
+        if not updated:
+            current = await db.fetch_one("SELECT version FROM notes WHERE id = %s", (note_id,))
+            if current is None:
+                return RedirectResponse(url="/", status_code=302)
+            logger.warning(f"Edit conflict on note ID {note_id} (version {version})")
+            # Keep the user's text, but against the latest version, so saving again is explicit
+            note = {"id": note_id, "title": title, "content": content, "version": current["version"]}
+            return templates.TemplateResponse(
+                "edit_note.html",
+                {"request": request, "note": note, "conflict": True},
+                status_code=409,
             )
-        conn.commit()
+    page_cache.invalidate(note_id)
     logger.info(f"Updated note ID {note_id}")
     return RedirectResponse(url="/", status_code=302)
 
 
+@app.patch("/api/notes/{note_id}")
+async def autosave_note(request: Request, note_id: int, body: AutosaveRequest):
+    """
+    Apply text patches made against body.version and save the result.
+    Responds 409 with the current note if the version is stale, so the client
+    can reload instead of silently overwriting another editor's changes.
+    """
+    if not request.session.get("logged_in"):
+        return JSONResponse({"detail": "Not authenticated"}, status_code=401)
+
+    note = await db.fetch_one(
+        "SELECT title, content, version FROM notes WHERE id = %s", (note_id,)
+    )
+    if note is None:
+        return JSONResponse({"detail": "Note not found"}, status_code=404)
+    if note["version"] != body.version:
+        return JSONResponse({"detail": "Version conflict", **note}, status_code=409)
+    try:
+        title, content = apply_patches(note["title"], note["content"], body.patches)
+    except PatchError as e:
+        return JSONResponse({"detail": str(e)}, status_code=400)
+
+    # The version check is repeated in the UPDATE so a concurrent save cannot slip in
+    updated = await db.execute(
+        "UPDATE notes SET title = %s, content = %s, version = version + 1, "
+        "updated_at = CURRENT_TIMESTAMP WHERE id = %s AND version = %s",
+        (title, content, note_id, body.version),
+    )
+    if not updated:
+        current = await db.fetch_one(
+            "SELECT title, content, version FROM notes WHERE id = %s", (note_id,)
+        )
+        return JSONResponse({"detail": "Version conflict", **(current or {})}, status_code=409)
+    page_cache.invalidate(note_id)
+    return {"version": body.version + 1}
+
+
 @app.post("/notes/{note_id}/delete")
 async def delete_note(request: Request, note_id: int, auth: bool = Depends(requires_login)):
     """Delete a note by its ID."""
     if isinstance(auth, RedirectResponse):
         return auth
 
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM notes WHERE id = %s", (note_id,))
-        conn.commit()
+    await db.execute("DELETE FROM notes WHERE id = %s", (note_id,))
+    page_cache.invalidate(note_id)
     logger.info(f"Deleted note ID {note_id}")
     return RedirectResponse(url="/", status_code=302)
 
@@ -238,7 +667,7 @@ if __name__ == "__main__":
 
     logger.info("Running DunamisMax NotesApp with Uvicorn...")
     uvicorn.run(
-        "main:app",
+        "app.main:app",
         host="0.0.0.0",
         port=int(os.getenv("NOTES_PORT", 8500)),
         reload=os.getenv("DEBUG", "false").lower() == "true",
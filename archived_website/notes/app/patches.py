@@ -0,0 +1,56 @@
+"""
+Text patches for note autosave.
+
+The editor sends small splice operations instead of the whole note. Positions
+and lengths are counted in UTF-16 code units, the unit JavaScript strings use,
+so offsets computed in the browser line up exactly on the server.
+"""
+
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+
+class PatchError(ValueError):
+    """Raised when a patch does not fit the text it is applied to."""
+
+
+class TextPatch(BaseModel):
+    """Replace `delete` code units at `pos` in `field` with `insert`."""
+
+    field: Literal["title", "content"]
+    pos: int = Field(ge=0)
+    delete: int = Field(0, ge=0)
+    insert: str = ""
+
+
+class AutosaveRequest(BaseModel):
+    """A batch of patches made against a known note version."""
+
+    version: int
+    patches: list[TextPatch]
+
+
+def apply_patch(text: str, patch: TextPatch) -> str:
+    units = text.encode("utf-16-le", "surrogatepass")
+    start = patch.pos * 2
+    end = start + patch.delete * 2
+    if end > len(units):
+        raise PatchError(
+            f"Patch for {patch.field} at {patch.pos}+{patch.delete} is past the end of the text"
+        )
+    patched = units[:start] + patch.insert.encode("utf-16-le", "surrogatepass") + units[end:]
+    try:
+        return patched.decode("utf-16-le")
+    except UnicodeDecodeError:
+        raise PatchError(f"Patch for {patch.field} at {patch.pos} splits a character")
+
+
+def apply_patches(title: str, content: str, patches: list[TextPatch]) -> tuple[str, str]:
+    """Apply patches in order and return the new (title, content)."""
+    fields = {"title": title, "content": content}
+    for patch in patches:
+        fields[patch.field] = apply_patch(fields[patch.field], patch)
+    if not fields["title"].strip():
+        raise PatchError("Title cannot be empty")
+    return fields["title"], fields["content"]
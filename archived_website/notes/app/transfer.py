@@ -0,0 +1,318 @@
+"""
+Bulk export and import of notes.
+
+Export streams rows from a server-side cursor, so memory use does not grow
+with the number of notes:
+  - ndjson   : one JSON object per line
+  - markdown : a zip archive with one Markdown file (plus front matter) per note
+
+Import reads the same formats and writes every note in a single transaction,
+using COPY on PostgreSQL and batched executemany on SQLite. Imported notes get
+new ids; their timestamps are preserved.
+
+Command line usage (from the notes directory, same environment as the app):
+    python -m app.transfer export --format ndjson --output notes.ndjson
+    python -m app.transfer export --format markdown --output notes.zip
+    python -m app.transfer import notes.ndjson
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import re
+import sys
+import zipfile
+from datetime import datetime, timezone
+from typing import IO, AsyncIterator, Iterable, Iterator, Optional
+
+from .db import Database
+
+EXPORT_SQL = "SELECT id, title, content, created_at, updated_at FROM notes ORDER BY id"
+BATCH_SIZE = 1000
+# Largest Markdown file accepted from an imported archive (after decompression)
+MAX_MEMBER_SIZE = 16 * 1024 * 1024
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "notes.ndjson"),
+    "markdown": ("application/zip", "notes.zip"),
+}
+
+FRONT_MATTER = re.compile(r"\A---\n(.*?)\n---\n\n?", re.S)
+
+
+class InvalidImportError(ValueError):
+    """Raised when an import file is malformed; carries the offending location."""
+
+
+# -------------------------------------------------------------------------
+# Record Helpers
+# -------------------------------------------------------------------------
+def format_timestamp(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return str(value)
+
+
+def parse_timestamp(value, location: str) -> datetime:
+    """Parse an ISO timestamp into a naive UTC datetime (the format stored in the table)."""
+    if value in (None, ""):
+        return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        raise InvalidImportError(f"{location}: invalid timestamp {value!r}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def to_record(row: dict) -> dict:
+    return {
+        "id": row["id"],
+        "title": row["title"],
+        "content": row["content"],
+        "created_at": format_timestamp(row["created_at"]),
+        "updated_at": format_timestamp(row["updated_at"]),
+    }
+
+
+def from_record(record: dict, location: str) -> tuple:
+    """Validate an imported record and return (title, content, created_at, updated_at)."""
+    if not isinstance(record, dict):
+        raise InvalidImportError(f"{location}: expected a JSON object")
+    title = record.get("title")
+    content = record.get("content")
+    if not isinstance(title, str) or not title:
+        raise InvalidImportError(f"{location}: missing title")
+    if not isinstance(content, str):
+        raise InvalidImportError(f"{location}: missing content")
+    created_at = parse_timestamp(record.get("created_at"), location)
+    updated_at = parse_timestamp(record.get("updated_at") or record.get("created_at"), location)
+    return title, content, created_at, updated_at
+
+
+def slugify(title: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", title).strip("-").lower()
+    return slug[:60] or "note"
+
+
+# -------------------------------------------------------------------------
+# Export
+# -------------------------------------------------------------------------
+async def export_ndjson(db: Database) -> AsyncIterator[bytes]:
+    """Yield the notes table as NDJSON, a few hundred rows per chunk."""
+    lines: list[str] = []
+    async for row in db.stream(EXPORT_SQL, batch_size=BATCH_SIZE):
+        lines.append(json.dumps(to_record(row), ensure_ascii=False))
+        if len(lines) >= 200:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+class _ChunkWriter:
+    """Write-only file object that collects zip output until it is drained."""
+
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def to_markdown(record: dict) -> str:
+    # JSON strings are valid YAML scalars, so titles with any characters survive
+    front_matter = "\n".join(
+        f"{key}: {json.dumps(record[key], ensure_ascii=False)}"
+        for key in ("title", "created_at", "updated_at")
+    )
+    return f"---\n{front_matter}\n---\n\n{record['content']}"
+
+
+async def export_markdown_zip(db: Database) -> AsyncIterator[bytes]:
+    """Yield a zip archive of Markdown files, streamed as it is written."""
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        async for row in db.stream(EXPORT_SQL, batch_size=BATCH_SIZE):
+            record = to_record(row)
+            name = f"{record['id']:06d}-{slugify(record['title'])}.md"
+            archive.writestr(name, to_markdown(record))
+            data = writer.drain()
+            if data:
+                yield data
+    yield writer.drain()
+
+
+def export_notes(db: Database, fmt: str) -> AsyncIterator[bytes]:
+    if fmt == "markdown":
+        return export_markdown_zip(db)
+    return export_ndjson(db)
+
+
+# -------------------------------------------------------------------------
+# Import
+# -------------------------------------------------------------------------
+def parse_ndjson(file: IO[bytes]) -> Iterator[tuple]:
+    for number, line in enumerate(file, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise InvalidImportError(f"line {number}: {e}")
+        yield from_record(record, f"line {number}")
+
+
+def parse_markdown_zip(file: IO[bytes]) -> Iterator[tuple]:
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile as e:
+        raise InvalidImportError(f"archive: {e}")
+    with archive:
+        for info in sorted(archive.infolist(), key=lambda info: info.filename):
+            name = info.filename
+            if not name.endswith(".md"):
+                continue
+            # file_size comes from the archive, but reads stop there, so it bounds memory
+            if info.file_size > MAX_MEMBER_SIZE:
+                raise InvalidImportError(
+                    f"{name}: {info.file_size} bytes exceeds the {MAX_MEMBER_SIZE} byte limit"
+                )
+            try:
+                text = archive.read(info).decode("utf-8")
+            except (zipfile.BadZipFile, UnicodeDecodeError, NotImplementedError) as e:
+                raise InvalidImportError(f"{name}: {e}")
+            match = FRONT_MATTER.match(text)
+            record = {"content": text[match.end():] if match else text}
+            if match:
+                for line in match.group(1).splitlines():
+                    key, _, value = line.partition(":")
+                    try:
+                        record[key.strip()] = json.loads(value.strip())
+                    except json.JSONDecodeError:
+                        record[key.strip()] = value.strip()
+            record.setdefault("title", name.rsplit("/", 1)[-1][:-3])
+            yield from_record(record, name)
+
+
+def detect_format(filename: str) -> str:
+    return "markdown" if filename.lower().endswith(".zip") else "ndjson"
+
+
+def _batches(records: Iterable[tuple], size: int) -> Iterator[list[tuple]]:
+    batch: list[tuple] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def import_notes(db: Database, file: IO[bytes], fmt: str) -> int:
+    """
+    Insert every note in file in one transaction; nothing is written if any
+    record is invalid. Returns the number of notes imported.
+    """
+    records = parse_markdown_zip(file) if fmt == "markdown" else parse_ndjson(file)
+
+    def insert_all(conn) -> int:
+        total = 0
+        cur = conn.cursor()
+        try:
+            for batch in _batches(records, BATCH_SIZE):
+                if db.is_sqlite:
+                    cur.executemany(
+                        "INSERT INTO notes (title, content, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        [
+                            (
+                                title,
+                                content,
+                                created.isoformat(sep=" ", timespec="seconds"),
+                                updated.isoformat(sep=" ", timespec="seconds"),
+                            )
+                            for title, content, created, updated in batch
+                        ],
+                    )
+                else:
+                    buffer = io.StringIO()
+                    csv.writer(buffer).writerows(
+                        (title, content, created.isoformat(), updated.isoformat())
+                        for title, content, created, updated in batch
+                    )
+                    buffer.seek(0)
+                    cur.copy_expert(
+                        "COPY notes (title, content, created_at, updated_at) "
+                        "FROM STDIN WITH (FORMAT csv)",
+                        buffer,
+                    )
+                total += len(batch)
+        finally:
+            cur.close()
+        return total
+
+    # One long transaction made of many short statements: no statement deadline
+    return await db.run(insert_all, timeout=0)
+
+
+# -------------------------------------------------------------------------
+# Command Line
+# -------------------------------------------------------------------------
+async def _cli(args) -> None:
+    from .main import db, init_db
+
+    await db.open()
+    try:
+        await init_db()
+        if args.command == "export":
+            output = open(args.output, "wb") if args.output else sys.stdout.buffer
+            try:
+                async for chunk in export_notes(db, args.format):
+                    output.write(chunk)
+            finally:
+                if args.output:
+                    output.close()
+        else:
+            fmt = args.format or detect_format(args.file)
+            with open(args.file, "rb") as file:
+                count = await import_notes(db, file, fmt)
+            print(f"Imported {count} notes from {args.file}", file=sys.stderr)
+    finally:
+        await db.close()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export or import DunamisMax notes")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Write all notes to a file")
+    export_parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    export_parser.add_argument("--output", "-o", help="Output path (default: stdout)")
+    import_parser = subparsers.add_parser("import", help="Load notes from a file")
+    import_parser.add_argument("file", help="NDJSON file or Markdown zip archive")
+    import_parser.add_argument("--format", choices=sorted(FORMATS))
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_cli(args))
+    except InvalidImportError as e:
+        parser.exit(1, f"Import failed: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
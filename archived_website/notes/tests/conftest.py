@@ -0,0 +1,20 @@
+"""
+Make this service importable as `app`, as it is when uvicorn runs from the
+service directory. Every service is a package named `app`, so one imported
+for another service's tests is forgotten first.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+
+for name in [name for name in sys.modules if name == "app" or name.startswith("app.")]:
+    del sys.modules[name]
+sys.path.insert(0, str(SERVICE_DIR))
+
+# app.main reads these at import; the database is only opened at startup
+os.environ.setdefault("NOTES_DB_BACKEND", "sqlite")
+os.environ.setdefault("NOTES_SQLITE_PATH", str(Path(tempfile.gettempdir()) / "notes-tests.sqlite3"))
@@ -0,0 +1,25 @@
+from app.main import decode_cursor, encode_cursor, fts5_query
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor({"created_at": "2024-01-02 03:04:05.678", "id": 42})
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ("2024-01-02 03:04:05.678", 42)
+
+
+def test_cursor_keeps_separators_in_the_timestamp():
+    cursor = encode_cursor({"created_at": "a|b", "id": 7})
+    assert decode_cursor(cursor) == ("a|b", 7)
+
+
+def test_malformed_cursors_decode_to_none():
+    assert decode_cursor("not base64!") is None
+    assert decode_cursor(encode_cursor({"created_at": "x", "id": "y"})) is None
+    assert decode_cursor("") is None
+
+
+def test_fts5_query_quotes_every_term():
+    assert fts5_query("hello world") == '"hello" "world"'
+    assert fts5_query('  say "hi"  ') == '"say" """hi"""'
+    assert fts5_query("a* OR NEAR(b)") == '"a*" "OR" "NEAR(b)"'
+    assert fts5_query("   ") == ""
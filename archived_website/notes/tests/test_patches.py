@@ -0,0 +1,40 @@
+import pytest
+
+from app.patches import PatchError, TextPatch, apply_patch, apply_patches
+
+
+def patch(pos, delete=0, insert="", field="content"):
+    return TextPatch(field=field, pos=pos, delete=delete, insert=insert)
+
+
+def test_insert_delete_replace():
+    assert apply_patch("hello world", patch(5, insert=",")) == "hello, world"
+    assert apply_patch("hello world", patch(5, delete=6)) == "hello"
+    assert apply_patch("hello world", patch(6, delete=5, insert="there")) == "hello there"
+
+
+def test_positions_are_utf16_code_units():
+    # The emoji is two UTF-16 code units, as String.length counts it in the browser
+    assert apply_patch("a😀b", patch(3, delete=1, insert="c")) == "a😀c"
+    assert apply_patch("a😀b", patch(1, delete=2)) == "ab"
+
+
+def test_splitting_a_surrogate_pair_fails():
+    with pytest.raises(PatchError):
+        apply_patch("a😀b", patch(2, delete=1))
+
+
+def test_past_the_end_fails():
+    with pytest.raises(PatchError):
+        apply_patch("abc", patch(2, delete=2))
+    assert apply_patch("abc", patch(3, insert="d")) == "abcd"
+
+
+def test_patches_apply_in_order():
+    patches = [patch(0, insert="New ", field="title"), patch(0, delete=3, insert="Body")]
+    assert apply_patches("title", "old text", patches) == ("New title", "Body text")
+
+
+def test_title_cannot_be_emptied():
+    with pytest.raises(PatchError):
+        apply_patches("title", "", [patch(0, delete=5, field="title")])
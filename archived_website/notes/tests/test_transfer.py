@@ -0,0 +1,40 @@
+import io
+import zipfile
+
+import pytest
+
+from app import transfer
+from app.transfer import InvalidImportError, parse_markdown_zip
+
+
+def archive(members: dict[str, bytes]) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def test_markdown_members_become_notes():
+    records = list(parse_markdown_zip(archive({"a.md": b"hello", "skip.txt": b"x"})))
+    assert len(records) == 1
+    assert records[0][:2] == ("a", "hello")
+
+
+def test_undecodable_member_names_the_file():
+    with pytest.raises(InvalidImportError, match="bad.md"):
+        list(parse_markdown_zip(archive({"bad.md": b"\xff\xfe\xfa"})))
+
+
+def test_corrupt_member_names_the_file():
+    data = archive({"note.md": b"hello world"}).getvalue()
+    corrupt = io.BytesIO(data.replace(b"hello world", b"jello world", 1))
+    with pytest.raises(InvalidImportError, match="note.md"):
+        list(parse_markdown_zip(corrupt))
+
+
+def test_oversized_member_is_rejected_before_reading(monkeypatch):
+    monkeypatch.setattr(transfer, "MAX_MEMBER_SIZE", 4)
+    with pytest.raises(InvalidImportError, match="big.md.*limit"):
+        list(parse_markdown_zip(archive({"big.md": b"hello"})))
@@ -0,0 +1,7 @@
+"""
+Code shared by the DunamisMax services.
+
+Each service adds the archived_website directory to sys.path at import time
+so `from shared... import ...` works whether it runs on its own under uvicorn
+or alongside the others.
+"""
@@ -0,0 +1,324 @@
+"""
+Fingerprinted, precompressed static assets for every DunamisMax service.
+
+Build step (run from the archived_website directory after changing any file
+under <service>/app/static):
+    python -m shared.assets build              # every service
+    python -m shared.assets build notes        # selected services
+
+For each service this writes app/static/dist/ containing:
+  - a content-hashed copy of every asset (styles.3f9a1c2e07.css)
+  - .br and .gz variants of text assets (Brotli needs the `brotli` package)
+  - the variable font subset to Latin and converted to WOFF2 (needs
+    `fonttools` + `brotli`; without them the TTF is copied under a hashed name)
+  - manifest.json mapping each source name to its hashed path
+Font references inside CSS are rewritten to the hashed files.
+
+At runtime AssetFiles replaces StaticFiles: it serves the smallest variant the
+client accepts and marks hashed files as immutable. register_asset_helpers()
+adds asset_url() to the Jinja environment so templates link to hashed names,
+falling back to the plain files when no build has been run. cached_templates()
+builds the Jinja2Templates object with a bytecode cache, so a new worker loads
+compiled templates instead of compiling them on its first requests.
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+from pathlib import Path
+from typing import Optional
+
+import jinja2
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+from starlette.responses import Response
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are built without it
+    brotli = None
+
+logger = logging.getLogger("DunamisMaxAssets")
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+SERVICES = ["dunamismax", "messenger", "ai_agents", "converter_service", "notes"]
+
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+HASH_LENGTH = 10
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".svg", ".ico", ".json", ".txt", ".ttf"}
+MIN_COMPRESS_SIZE = 256
+# Basic Latin, Latin-1 Supplement, Latin Extended-A, general punctuation,
+# currency and a few symbols used in the templates (arrows, ellipsis, bullets)
+FONT_UNICODES = "U+0000-024F,U+2000-206F,U+20A0-20CF,U+2190-21FF,U+2212,U+FEFF"
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "public, no-cache"
+# Compiled templates; unset uses a private per-user directory under the system
+# temp dir, empty turns the cache off
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR")
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+CSS_URL = re.compile(
+    r"""url\(\s*(["']?)/static/([^"')]+)\1\s*\)(\s*format\(\s*["'][^"']*["']\s*\))?"""
+)
+FONT_FORMATS = {".woff2": "woff2", ".ttf": "truetype"}
+
+
+# -------------------------------------------------------------------------
+# Build
+# -------------------------------------------------------------------------
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(name: str, data: bytes, suffix: Optional[str] = None) -> str:
+    path = Path(name)
+    return str(path.with_name(f"{path.stem}.{content_hash(data)}{suffix or path.suffix}"))
+
+
+def subset_font(source: Path) -> Optional[bytes]:
+    """Return a Latin-only WOFF2 version of a font, or None if fontTools is unavailable."""
+    try:
+        from fontTools import subset
+    except ImportError:
+        return None
+    if brotli is None:  # WOFF2 encoding is Brotli
+        return None
+
+    options = subset.Options()
+    options.flavor = "woff2"
+    options.layout_features = ["*"]
+    options.name_IDs = ["*"]
+    options.notdef_outline = True
+    font = subset.load_font(str(source), options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=subset.parse_unicodes(FONT_UNICODES))
+    subsetter.subset(font)
+    output = io.BytesIO()
+    subset.save_font(font, output, options)
+    return output.getvalue()
+
+
+def rewrite_css(css: str, manifest: dict[str, str]) -> str:
+    """Point /static/... references at hashed siblings in dist/ (relative URLs)."""
+
+    def replace(match: re.Match) -> str:
+        target = manifest.get(match.group(2))
+        if target is None:
+            return match.group(0)
+        relative = target[len(DIST_DIR) + 1:]
+        font_format = FONT_FORMATS.get(Path(target).suffix)
+        if match.group(3) and font_format:
+            return f'url("{relative}") format("{font_format}")'
+        return f'url("{relative}"){match.group(3) or ""}'
+
+    return CSS_URL.sub(replace, css)
+
+
+def write_variants(path: Path) -> list[str]:
+    """Write .gz (and .br) next to path when they are smaller; return the encodings written."""
+    data = path.read_bytes()
+    if path.suffix not in COMPRESSIBLE_SUFFIXES or len(data) < MIN_COMPRESS_SIZE:
+        return []
+    written = []
+    compressed = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressed["br"] = brotli.compress(data, quality=11)
+    for encoding, suffix in ENCODINGS:
+        payload = compressed.get(encoding)
+        if payload is not None and len(payload) < len(data):
+            path.with_name(path.name + suffix).write_bytes(payload)
+            written.append(encoding)
+    return written
+
+
+def build_static(static_dir: Path) -> dict[str, str]:
+    """Build static_dir/dist and return the manifest."""
+    dist = static_dir / DIST_DIR
+    if dist.exists():
+        shutil.rmtree(dist)
+    dist.mkdir()
+
+    sources = sorted(
+        path for path in static_dir.rglob("*")
+        if path.is_file() and dist not in path.parents
+    )
+    manifest: dict[str, str] = {}
+    stylesheets = []
+
+    # Fonts and images first, so stylesheets can reference their hashed names
+    for source in sources:
+        name = source.relative_to(static_dir).as_posix()
+        if source.suffix == ".css":
+            stylesheets.append((source, name))
+            continue
+        data = source.read_bytes()
+        suffix = None
+        if source.suffix == ".ttf":
+            woff2 = subset_font(source)
+            if woff2 is not None:
+                data, suffix = woff2, ".woff2"
+        target = f"{DIST_DIR}/{hashed_name(name, data, suffix)}"
+        (static_dir / target).parent.mkdir(parents=True, exist_ok=True)
+        (static_dir / target).write_bytes(data)
+        manifest[name] = target
+
+    for source, name in stylesheets:
+        data = rewrite_css(source.read_text(encoding="utf-8"), manifest).encode("utf-8")
+        target = f"{DIST_DIR}/{hashed_name(name, data)}"
+        (static_dir / target).parent.mkdir(parents=True, exist_ok=True)
+        (static_dir / target).write_bytes(data)
+        manifest[name] = target
+
+    for target in manifest.values():
+        write_variants(static_dir / target)
+
+    (dist / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+    return manifest
+
+
+def report(static_dir: Path, manifest: dict[str, str]) -> None:
+    for name, target in sorted(manifest.items()):
+        original = (static_dir / name).stat().st_size
+        built = static_dir / target
+        sizes = [f"{built.stat().st_size:>9,}"]
+        for encoding, suffix in ENCODINGS:
+            variant = built.with_name(built.name + suffix)
+            if variant.exists():
+                sizes.append(f"{encoding} {variant.stat().st_size:,}")
+        print(f"  {name:<32} {original:>9,} -> {' / '.join(sizes)}")
+
+
+# -------------------------------------------------------------------------
+# Runtime
+# -------------------------------------------------------------------------
+def accepted_encodings(scope: Scope) -> set[str]:
+    for key, value in scope["headers"]:
+        if key == b"accept-encoding":
+            encodings = set()
+            for item in value.decode("latin-1").split(","):
+                coding, _, params = item.partition(";")
+                params = params.replace(" ", "")
+                if params.startswith("q="):
+                    try:
+                        if float(params[2:]) == 0:
+                            continue
+                    except ValueError:
+                        pass
+                encodings.add(coding.strip().lower())
+            return encodings
+    return set()
+
+
+class AssetFiles(StaticFiles):
+    """
+    StaticFiles that serves prebuilt .br/.gz variants from dist/ and sets
+    cache headers: hashed files are immutable, everything else revalidates.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        path = path.lstrip("/")
+        hashed = path.startswith(DIST_DIR + "/") and not path.endswith(MANIFEST_NAME)
+        if hashed:
+            accepted = accepted_encodings(scope)
+            for encoding, suffix in ENCODINGS:
+                if encoding not in accepted:
+                    continue
+                _, stat_result = self.lookup_path(path + suffix)
+                if stat_result is None:
+                    continue
+                # FileResponse guesses the media type of "x.css.br" as text/css
+                response = await super().get_response(path + suffix, scope)
+                response.headers["Content-Encoding"] = encoding
+                response.headers["Vary"] = "Accept-Encoding"
+                response.headers["Cache-Control"] = IMMUTABLE_CACHE
+                return response
+
+        response = await super().get_response(path, scope)
+        if hashed:
+            response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE if hashed else REVALIDATE_CACHE
+        return response
+
+
+def load_manifest(static_dir: Path) -> dict[str, str]:
+    manifest_path = Path(static_dir) / DIST_DIR / MANIFEST_NAME
+    try:
+        return json.loads(manifest_path.read_text())
+    except FileNotFoundError:
+        logger.info(
+            f"No asset manifest at {manifest_path}; serving unhashed files "
+            "(run `python -m shared.assets build`)"
+        )
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Ignoring unreadable asset manifest {manifest_path}: {e}")
+    return {}
+
+
+def cached_templates(directory: Path) -> Jinja2Templates:
+    """
+    Jinja2Templates for directory that keeps compiled templates in
+    TEMPLATE_CACHE_DIR. Entries are keyed by template path and checked
+    against the source, so an edited template is simply compiled again.
+    """
+    bytecode_cache = None
+    if TEMPLATE_CACHE_DIR is None:
+        bytecode_cache = jinja2.FileSystemBytecodeCache()
+    elif TEMPLATE_CACHE_DIR:
+        Path(TEMPLATE_CACHE_DIR).mkdir(mode=0o700, parents=True, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(directory),
+        autoescape=True,
+        bytecode_cache=bytecode_cache,
+    )
+    return Jinja2Templates(env=env)
+
+
+def register_asset_helpers(templates: Jinja2Templates, static_dir: Path) -> None:
+    """Expose asset_url('styles.css') to templates, resolving hashed names."""
+    manifest = load_manifest(static_dir)
+
+    @jinja2.pass_context
+    def asset_url(context, name: str) -> str:
+        return str(context["request"].url_for("static", path=manifest.get(name, name)))
+
+    templates.env.globals["asset_url"] = asset_url
+
+
+# -------------------------------------------------------------------------
+# Command Line
+# -------------------------------------------------------------------------
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build fingerprinted static assets")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Hash, compress and subset assets")
+    build_parser.add_argument("services", nargs="*", help=f"Any of: {', '.join(SERVICES)}")
+    args = parser.parse_args(argv)
+    unknown = set(args.services) - set(SERVICES)
+    if unknown:
+        parser.error(f"unknown service(s): {', '.join(sorted(unknown))}")
+
+    if brotli is None:
+        print("brotli is not installed: building gzip variants only", file=sys.stderr)
+    for service in args.services or SERVICES:
+        static_dir = ROOT_DIR / service / "app" / "static"
+        if not static_dir.is_dir():
+            print(f"{service}: no static directory, skipped", file=sys.stderr)
+            continue
+        manifest = build_static(static_dir)
+        print(f"{service}: {len(manifest)} assets -> {os.path.relpath(static_dir / DIST_DIR)}")
+        report(static_dir, manifest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+In-process image conversion on a pool of worker processes.
+
+    engine = ImageEngine(workers=4)
+    await engine.start()
+    await engine.convert(src, dst, "webp", width=800, quality=80)
+
+Starting FFmpeg for every still image costs far more than decoding and
+encoding it, so images are converted with Pillow in long-lived worker
+processes instead. Each worker loads every codec plugin and encodes a tiny
+image in each output format once when it starts, so requests never pay for
+imports or codec setup. Workers are separate processes, so throughput scales
+with their number (one per core by default).
+
+Inputs Pillow cannot handle (unknown or corrupt files, animations) raise
+UnsupportedImage, and the caller falls back to FFmpeg. If Pillow is not
+installed the engine reports itself unavailable and every image goes to FFmpeg.
+
+A conversion past the engine's timeout cannot be cancelled inside its worker,
+so the pool is replaced and its workers killed, rather than leaving them busy
+with a pathological image while new ones queue behind it.
+
+Workers are started with "spawn" (forking a process that already runs
+threads, such as the log writer, can deadlock the child) and import this
+module by name, which is why it lives in shared/ rather than under a
+service's `app` package.
+"""
+
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Optional
+
+try:
+    from PIL import ExifTags, Image, ImageOps, UnidentifiedImageError, features
+except ImportError:  # optional: every image goes through FFmpeg without it
+    Image = None
+
+logger = logging.getLogger("DunamisMaxImages")
+
+# File extension -> Pillow format name
+PILLOW_FORMATS = {
+    "jpg": "JPEG",
+    "jpeg": "JPEG",
+    "png": "PNG",
+    "gif": "GIF",
+    "bmp": "BMP",
+    "webp": "WEBP",
+    "tiff": "TIFF",
+    "tif": "TIFF",
+}
+
+# Pixel modes each encoder writes as-is; anything else is converted first
+SAVE_MODES = {
+    "JPEG": {"L", "RGB", "CMYK"},
+    "PNG": {"1", "L", "LA", "P", "RGB", "RGBA", "I;16"},
+    "GIF": {"1", "L", "P", "RGB", "RGBA"},
+    "BMP": {"1", "L", "P", "RGB", "RGBA"},
+    "WEBP": {"RGB", "RGBA"},
+    "TIFF": {"1", "L", "LA", "P", "RGB", "RGBA", "CMYK", "I;16"},
+}
+LOSSY_FORMATS = {"JPEG", "WEBP"}
+
+
+class UnsupportedImage(Exception):
+    """The image engine cannot convert this input; use FFmpeg instead."""
+
+
+# -------------------------------------------------------------------------
+# Worker Side
+# -------------------------------------------------------------------------
+def _init_worker() -> None:
+    """Load every codec plugin and run each encoder once."""
+    Image.init()
+    sample = Image.new("RGB", (8, 8))
+    for pillow_format in set(PILLOW_FORMATS.values()):
+        try:
+            sample.save(io.BytesIO(), pillow_format)
+        except (KeyError, OSError):
+            pass  # encoder not compiled in; supported_formats() leaves it out
+
+
+def _ready() -> bool:
+    return True
+
+
+def _fit(size: tuple[int, int], width: Optional[int], height: Optional[int]) -> tuple[int, int]:
+    """Scale size down to fit width x height (either may be None), keeping its aspect ratio."""
+    scale = min(
+        width / size[0] if width else 1.0,
+        height / size[1] if height else 1.0,
+        1.0,
+    )
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def _prepare(image: "Image.Image", pillow_format: str) -> "Image.Image":
+    if image.mode in SAVE_MODES[pillow_format]:
+        return image
+    has_alpha = "A" in image.getbands() or "transparency" in image.info
+    if has_alpha and "RGBA" in SAVE_MODES[pillow_format]:
+        return image.convert("RGBA")
+    if has_alpha:
+        # Formats without alpha (JPEG) get a white background, not black
+        rgba = image.convert("RGBA")
+        flat = Image.new("RGB", rgba.size, (255, 255, 255))
+        flat.paste(rgba, mask=rgba.getchannel("A"))
+        return flat
+    return image.convert("RGB")
+
+
+def convert_image(
+    input_path: str,
+    output_path: str,
+    output_format: str,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    quality: Optional[int] = None,
+) -> tuple[int, int]:
+    """Convert one image (runs in a worker). Returns the output size."""
+    pillow_format = PILLOW_FORMATS[output_format]
+    try:
+        with Image.open(input_path) as image:
+            if getattr(image, "n_frames", 1) > 1:
+                raise UnsupportedImage("Animated images are converted with FFmpeg")
+            if width or height:
+                # JPEG can decode at 1/2, 1/4 or 1/8 scale, far cheaper than a
+                # full decode; the box is in stored (pre-rotation) orientation
+                orientation = image.getexif().get(ExifTags.Base.Orientation, 1)
+                box = (height, width) if orientation in (5, 6, 7, 8) else (width, height)
+                image.draft(image.mode, _fit(image.size, *box))
+            icc_profile = image.info.get("icc_profile")
+            image = ImageOps.exif_transpose(image)
+            if width or height:
+                target = _fit(image.size, width, height)
+                if target != image.size:
+                    image = image.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            image = _prepare(image, pillow_format)
+
+            options = {}
+            if icc_profile and pillow_format in ("JPEG", "PNG", "WEBP", "TIFF"):
+                options["icc_profile"] = icc_profile
+            if quality and pillow_format in LOSSY_FORMATS:
+                options["quality"] = quality
+            image.save(output_path, pillow_format, **options)
+            return image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise UnsupportedImage(str(e)) from None
+    except (OSError, ValueError, SyntaxError) as e:
+        # Truncated or unusual files that Pillow opens but cannot decode
+        raise UnsupportedImage(f"{type(e).__name__}: {e}") from None
+
+
+# -------------------------------------------------------------------------
+# Engine
+# -------------------------------------------------------------------------
+def supported_formats() -> set[str]:
+    """Extensions Pillow can both read and write in this installation."""
+    if Image is None:
+        return set()
+    Image.init()
+    usable = set()
+    for extension, pillow_format in PILLOW_FORMATS.items():
+        if pillow_format == "WEBP" and not features.check("webp"):
+            continue
+        if pillow_format in Image.OPEN and pillow_format in Image.SAVE:
+            usable.add(extension)
+    return usable
+
+
+class ImageEngine:
+    """Converts images in a pool of warm worker processes."""
+
+    def __init__(self, workers: int, timeout: Optional[float] = None) -> None:
+        self.workers = workers
+        self.timeout = timeout
+        # Filled in by start(): the workers load Pillow's plugins anyway, so
+        # asking one keeps the 50-odd plugin imports out of this process
+        self.formats: set[str] = set()
+        self.pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def available(self) -> bool:
+        return self.pool is not None
+
+    def supports(self, input_format: str, output_format: str) -> bool:
+        return self.available and input_format in self.formats and output_format in self.formats
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+
+    async def start(self) -> None:
+        """
+        Start every worker, so requests do not wait for them. Until this
+        finishes, supports() is False and images go to FFmpeg, so callers
+        may run it in the background instead of delaying start-up.
+        """
+        if self.workers <= 0:
+            return
+        if Image is None:
+            logger.warning("Pillow is not installed; images will be converted with FFmpeg")
+            return
+        pool = self._new_pool()
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(
+                *(loop.run_in_executor(pool, _ready) for _ in range(self.workers))
+            )
+            formats = await loop.run_in_executor(pool, supported_formats)
+        except (OSError, RuntimeError) as e:  # BrokenProcessPool is a RuntimeError
+            pool.shutdown(wait=False, cancel_futures=True)
+            logger.error(f"Image engine failed to start, using FFmpeg for images: {e}")
+            return
+        except asyncio.CancelledError:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        if not formats:
+            pool.shutdown(wait=False, cancel_futures=True)
+            logger.warning("Pillow supports none of the image formats; using FFmpeg for images")
+            return
+        self.formats = formats
+        self.pool = pool
+        logger.info(
+            f"Image engine ready: {self.workers} workers, formats {', '.join(sorted(self.formats))}"
+        )
+
+    async def stop(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    async def convert(
+        self,
+        input_path: Path,
+        output_path: Path,
+        output_format: str,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        quality: Optional[int] = None,
+    ) -> tuple[int, int]:
+        """
+        Convert input_path to output_path. Raises UnsupportedImage when the
+        input needs FFmpeg, and TimeoutError past the engine's timeout.
+        """
+        if self.pool is None:
+            raise UnsupportedImage("Image engine is not running")
+        pool = self.pool
+        future = asyncio.get_running_loop().run_in_executor(
+            pool,
+            convert_image,
+            str(input_path),
+            str(output_path),
+            output_format,
+            width,
+            height,
+            quality,
+        )
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            # The worker is still decoding: kill it rather than let it hold a slot
+            self._recycle(pool, f"Image conversion of {input_path.name} timed out")
+            raise
+        except BrokenProcessPool:
+            # A worker died (e.g. a decoder crash): replace the pool and let
+            # FFmpeg handle the file that was being converted
+            self._recycle(pool, "Image worker pool broke")
+            raise UnsupportedImage("Image worker crashed") from None
+
+    def _recycle(self, pool: ProcessPoolExecutor, reason: str) -> None:
+        """
+        Replace pool with a new one and kill its workers. Conversions still
+        running or queued on it fail with BrokenProcessPool and go to FFmpeg.
+        """
+        if self.pool is not pool:
+            return  # another conversion on this pool already replaced it
+        logger.error(f"{reason}; restarting the image workers")
+        # ProcessPoolExecutor has no public way to stop a busy worker
+        processes = list((pool._processes or {}).values())
+        for process in processes:
+            process.terminate()
+        pool.shutdown(wait=False)
+        self.pool = self._new_pool()
+        # Warm the new workers now, not on the next image
+        for _ in range(self.workers):
+            self.pool.submit(_ready)
@@ -0,0 +1,293 @@
+"""
+Non-blocking logging shared by the DunamisMax services.
+
+    logger = configure_logging("notes", "NotesApp", BASE_DIR / "logs" / "notes.log")
+    app.add_middleware(RequestIdMiddleware)
+
+Every record goes through a QueueHandler into an in-memory queue; a single
+QueueListener thread formats it and does the file and console I/O, so a slow
+disk never blocks the event loop. Each service writes JSON lines to its own
+size-rotated file; records are tagged with the service (by logger name) and
+the id of the request being handled.
+
+High-volume lines opt into sampling with `extra=SAMPLED`: only one in every
+1/LOG_SAMPLE_RATE of them (per call site) is written, and the kept ones carry
+`sample_rate` so counts can be scaled back up. Warnings and errors are never
+sampled. If the queue fills up, records are dropped rather than waiting, and
+the number dropped is logged once there is room again.
+
+Environment:
+    LOG_LEVEL           minimum level (default INFO)
+    LOG_MAX_BYTES       rotate files at this size (default 10 MB)
+    LOG_BACKUP_COUNT    rotated files to keep (default 5)
+    LOG_SAMPLE_RATE     share of sampled lines to keep (default 0.1)
+    LOG_QUEUE_SIZE      records buffered before dropping (default 10000)
+    LOG_CONSOLE_FORMAT  "text" (default) or "json"
+"""
+
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Optional, Union
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_CONSOLE_FORMAT = os.getenv("LOG_CONSOLE_FORMAT", "text").lower()
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+
+# Pass as extra= on hot-path log calls to have them sampled
+SAMPLED = {"sampled": True}
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+REQUEST_ID_HEADER = b"x-request-id"
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+# -------------------------------------------------------------------------
+# Filters & Formatters
+# -------------------------------------------------------------------------
+class ContextFilter(logging.Filter):
+    """
+    Stamp each record with its service and request id. Runs in the thread and
+    task that logged, before the record is queued, so the context is still set.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.services: dict[str, str] = {}
+
+    def service_for(self, name: str) -> str:
+        while name:
+            service = self.services.get(name)
+            if service is not None:
+                return service
+            name = name.rpartition(".")[0]
+        return ""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.service = self.service_for(record.name)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep one in every N records marked `sampled`, counted per call site."""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self.counts: dict[tuple, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False) or record.levelno >= logging.WARNING:
+            return True
+        if self.every == 0:
+            return False
+        site = (record.name, record.lineno)
+        seen = self.counts.get(site, 0)
+        self.counts[site] = seen + 1
+        if seen % self.every:
+            return False
+        record.sample_rate = 1 / self.every
+        return True
+
+
+class ServiceFilter(logging.Filter):
+    """Route records to one service's file; unattributed records go to every file."""
+
+    def __init__(self, service: str) -> None:
+        super().__init__()
+        self.service = service
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return getattr(record, "service", "") in ("", self.service)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "service": getattr(record, "service", ""),
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        sample_rate = getattr(record, "sample_rate", None)
+        if sample_rate is not None:
+            payload["sample_rate"] = sample_rate
+        if record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: full queue means the record is dropped and counted."""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now (arguments may change later),
+        # but keep the record's other fields for the formatters
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        if self.dropped:
+            with self._lock:
+                dropped, self.dropped = self.dropped, 0
+            notice = logging.LogRecord(
+                record.name, logging.WARNING, __file__, 0,
+                f"Dropped {dropped} log records (logging queue full)", None, None,
+            )
+            notice.service = ""
+            notice.request_id = "-"
+            try:
+                self.queue.put_nowait(notice)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += dropped
+
+
+# -------------------------------------------------------------------------
+# Setup
+# -------------------------------------------------------------------------
+class _LoggingState:
+    """Process-wide queue and listener, shared by every service in the process."""
+
+    def __init__(self) -> None:
+        self.queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.context = ContextFilter()
+        self.handler = _DroppingQueueHandler(self.queue)
+        self.handler.addFilter(self.context)
+        self.handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+
+        console = logging.StreamHandler()
+        console.setFormatter(
+            JsonFormatter() if LOG_CONSOLE_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+        )
+        self.listener = QueueListener(self.queue, console, respect_handler_level=True)
+        self.files: dict[str, RotatingFileHandler] = {}
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(self.handler)
+        root.setLevel(LOG_LEVEL)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def add_file(self, service: str, path: Path) -> None:
+        if service in self.files:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(
+            path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+        handler.setFormatter(JsonFormatter())
+        handler.addFilter(ServiceFilter(service))
+        self.files[service] = handler
+        # The listener thread reads this tuple per record; replacing it is atomic
+        self.listener.handlers = (*self.listener.handlers, handler)
+
+
+_state: Optional[_LoggingState] = None
+_state_lock = threading.Lock()
+
+
+def configure_logging(
+    service: str,
+    logger_name: str,
+    log_file: Union[str, Path, None] = None,
+    level: Optional[str] = None,
+) -> logging.Logger:
+    """
+    Route logging through the background queue (once per process), write
+    records from logger_name and its children to log_file, and return that
+    logger (set to level, if given).
+    """
+    global _state
+    with _state_lock:
+        if _state is None:
+            _state = _LoggingState()
+        _state.context.services[logger_name] = service
+        if log_file is not None:
+            _state.add_file(service, Path(log_file))
+    logger = logging.getLogger(logger_name)
+    if level:
+        logger.setLevel(level.upper())
+    return logger
+
+
+# -------------------------------------------------------------------------
+# Request IDs
+# -------------------------------------------------------------------------
+class RequestIdMiddleware:
+    """
+    Give every HTTP request and WebSocket session an id (the client's
+    X-Request-ID if it looks sane, otherwise a new one), make it available to
+    log records, and echo it in the response headers.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = ""
+        for key, value in scope["headers"]:
+            if key == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")
+                break
+        if not VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((REQUEST_ID_HEADER, request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
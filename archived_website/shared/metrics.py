@@ -0,0 +1,343 @@
+"""
+Prometheus-style metrics for the DunamisMax services.
+
+    metrics = instrument(app, "notes")
+    metrics.gauge("notes_db_pool_in_use", "Connections checked out", lambda: db.stats()["in_use"])
+
+instrument() adds:
+  - http_request_duration_seconds{method,route,status}  histogram per route template
+  - http_requests_in_progress                            gauge
+  - event_loop_lag_seconds                               histogram (plus a gauge of the last sample)
+  - process_resident_memory_bytes / process_start_time_seconds
+  - GET /metrics in the Prometheus text format (version 0.0.4)
+
+Each app owns its own Metrics object, so services sharing one process through
+the gateway still report separately. /metrics needs METRICS_TOKEN, sent as
+`Authorization: Bearer <token>`; without it set the endpoint answers 404, like
+/debug/*. The metrics are collected either way.
+"""
+
+import asyncio
+import hmac
+import math
+import os
+import resource
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+LOOP_LAG_INTERVAL = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.5"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOOP_LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_PROCESS_START = time.time()
+_PAGE_SIZE = resource.getpagesize()
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# -------------------------------------------------------------------------
+# Metric Types
+# -------------------------------------------------------------------------
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+
+class _Value(_Metric):
+    """A single number per label set, either updated in place or read from a callback."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Iterable[str] = (),
+        callback: Optional[Callable[[], float]] = None,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.values: dict[tuple, float] = {}
+        self.callback = callback
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def collect(self) -> list[str]:
+        lines = self.header()
+        if self.callback is not None:
+            try:
+                lines.append(f"{self.name} {_format_value(self.callback())}")
+            except Exception:
+                pass  # a broken callback must not take /metrics down
+            return lines
+        return lines + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in sorted(self.values.items())
+        ]
+
+
+class Counter(_Value):
+    kind = "counter"
+
+
+class Gauge(_Value):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self.values[self._key(labels)] = value
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0.0)
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self.series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def collect(self) -> list[str]:
+        lines = self.header()
+        for key, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+# -------------------------------------------------------------------------
+# Registry
+# -------------------------------------------------------------------------
+class Metrics:
+    """The metrics of one service."""
+
+    def __init__(self, service: str) -> None:
+        self.service = service
+        self.metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered for {self.service}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self,
+        name: str,
+        documentation: str,
+        callback: Optional[Callable[[], float]] = None,
+        labels: Iterable[str] = (),
+    ) -> Counter:
+        return self._register(Counter(name, documentation, labels, callback))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        callback: Optional[Callable[[], float]] = None,
+        labels: Iterable[str] = (),
+    ) -> Gauge:
+        return self._register(Gauge(name, documentation, labels, callback))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+def resident_memory_bytes() -> float:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        # Peak rather than current RSS, but better than nothing off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# -------------------------------------------------------------------------
+# Instrumentation
+# -------------------------------------------------------------------------
+class MetricsMiddleware:
+    """Times every HTTP request and labels it with the matched route template."""
+
+    def __init__(self, app: ASGIApp, metrics: Metrics) -> None:
+        self.app = app
+        self.latency = metrics.metrics["http_request_duration_seconds"]
+        self.in_progress = metrics.metrics["http_requests_in_progress"]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.in_progress.dec()
+            self.latency.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=route_template(scope, status),
+                status=status,
+            )
+
+
+def route_template(scope: Scope, status: int) -> str:
+    """
+    The path pattern that matched ("/notes/{note_id}/edit"), never the raw
+    path, so ids do not create one series per URL.
+    """
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    mounted = scope.get("root_path", "")[len(scope.get("app_root_path", "")):]
+    if mounted:
+        return mounted + "/{path}"  # e.g. static files
+    return "unmatched" if status == 404 else "other"
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a sleeping task."""
+
+    def __init__(self, metrics: Metrics, interval: float = LOOP_LAG_INTERVAL) -> None:
+        self.interval = interval
+        self.histogram = metrics.histogram(
+            "event_loop_lag_seconds",
+            "Delay between a scheduled wake-up and the event loop running it",
+            buckets=LOOP_LAG_BUCKETS,
+        )
+        self.last = metrics.gauge("event_loop_lag_last_seconds", "Most recent event loop lag sample")
+        self.task: Optional[asyncio.Task] = None
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.histogram.observe(lag)
+            self.last.set(lag)
+
+    async def start(self) -> None:
+        if self.interval > 0 and self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+def instrument(app: FastAPI, service: str) -> Metrics:
+    """Add request metrics, process metrics and a /metrics endpoint to app."""
+    metrics = Metrics(service)
+    metrics.histogram(
+        "http_request_duration_seconds",
+        "Time to serve an HTTP request",
+        labels=("method", "route", "status"),
+    )
+    metrics.gauge("http_requests_in_progress", "HTTP requests being served")
+    metrics.gauge("process_resident_memory_bytes", "Resident memory size", resident_memory_bytes)
+    metrics.gauge("process_start_time_seconds", "Unix time the process started", lambda: _PROCESS_START)
+    loop_lag = LoopLagMonitor(metrics)
+
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+    app.add_event_handler("startup", loop_lag.start)
+    app.add_event_handler("shutdown", loop_lag.stop)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint(request: Request):
+        if not METRICS_TOKEN:
+            return Response(status_code=404)
+        # Constant-time comparison; bytes, because compare_digest rejects non-ASCII str
+        sent = request.headers.get("authorization", "").encode()
+        if not hmac.compare_digest(sent, f"Bearer {METRICS_TOKEN}".encode()):
+            return Response(status_code=401, headers={"WWW-Authenticate": "Bearer"})
+        return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+    app.state.metrics = metrics
+    return metrics
@@ -0,0 +1,302 @@
+"""
+On-demand profiling and slow-request capture for the DunamisMax services.
+
+    watchdog = add_profiling(app, logger)
+    with watchdog.watch(f"WS /ws/chat/{agent_id}"):   # per WebSocket message
+        ...
+
+add_profiling() adds:
+  - GET /debug/profile?seconds=10  samples the stacks of the running worker for
+    a few seconds and returns them in the folded format that flamegraph.pl,
+    speedscope and inferno read ("frame;frame;frame count" per line)
+  - GET /debug/slow                 the most recent slow-request captures
+  - a watchdog thread that snapshots every HTTP request (and every block
+    wrapped in watchdog.watch()) still running after SLOW_REQUEST_THRESHOLD
+    seconds, and logs a warning naming where it is stuck
+
+The profiler is a plain Python thread reading sys._current_frames() RATE times
+a second; nothing is traced between samples, so the overhead stays around a
+few percent and it is safe to run against production traffic. By default only
+the event loop thread is sampled, because that is where a blocking call (a
+synchronous database driver, a CPU-bound loop) stalls every other request;
+pass threads=all to include the thread pool.
+
+A capture holds two stacks: "task", where the slow handler is (suspended at an
+await, or running), and "thread", what the thread running it is executing at
+that moment. If the task is running rather than awaiting, the capture is
+marked "blocking": the handler is holding the event loop, and the thread
+stack shows the call that does it.
+
+Both endpoints need PROFILING_TOKEN, sent as `Authorization: Bearer <token>`.
+Without it set they answer 404. The watchdog runs either way.
+
+Environment:
+    PROFILING_TOKEN          bearer token for /debug/* (unset: disabled)
+    PROFILE_MAX_SECONDS      longest profile a request may ask for (default 60)
+    SLOW_REQUEST_THRESHOLD   seconds before a request is captured (default 2, 0 disables)
+    SLOW_REQUEST_KEEP        captures kept for /debug/slow (default 50)
+"""
+
+import asyncio
+import hmac
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Iterator, Optional
+
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from starlette.middleware import Middleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from shared.logs import request_id_var
+
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+SLOW_REQUEST_THRESHOLD = float(os.getenv("SLOW_REQUEST_THRESHOLD", "2"))
+SLOW_REQUEST_KEEP = int(os.getenv("SLOW_REQUEST_KEEP", "50"))
+
+# Frames kept per captured stack (innermost ones)
+MAX_STACK_DEPTH = 64
+
+# One profile per process at a time: overlapping samplers would skew each other
+_profile_lock = threading.Lock()
+
+
+# -------------------------------------------------------------------------
+# Stacks
+# -------------------------------------------------------------------------
+@lru_cache(maxsize=4096)
+def short_path(filename: str) -> str:
+    """filename relative to the sys.path entry it was imported from."""
+    for entry in sorted((p for p in sys.path if p), key=len, reverse=True):
+        if filename.startswith(entry.rstrip(os.sep) + os.sep):
+            return filename[len(entry.rstrip(os.sep)) + 1 :]
+    return filename
+
+
+def describe(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({short_path(code.co_filename)}:{frame.f_lineno})"
+
+
+def frame_stack(frame) -> list[str]:
+    """The frames from frame outwards, outermost first."""
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        stack.append(describe(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def task_stack(task: asyncio.Task) -> list[str]:
+    """
+    Where a task is: the chain of coroutines down to its current await.
+    (Task.get_stack() stops at the outermost frame of a suspended task.)
+    """
+    stack = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is not None:
+            stack.append(describe(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return stack[-MAX_STACK_DEPTH:]
+
+
+def sample_stacks(seconds: float, rate: float, thread_ids: Optional[set[int]]) -> Counter:
+    """
+    Count folded stacks of the given threads (all but this one if None),
+    sampled rate times a second for seconds.
+    """
+    own = threading.get_ident()
+    interval = 1.0 / rate
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (thread_ids is not None and ident not in thread_ids):
+                continue
+            counts[";".join([names.get(ident, str(ident)), *frame_stack(frame)])] += 1
+        time.sleep(interval)
+    return counts
+
+
+def folded(counts: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+# -------------------------------------------------------------------------
+# Slow Request Watchdog
+# -------------------------------------------------------------------------
+class _Watch:
+    __slots__ = ("label", "request_id", "started", "thread_id", "task", "capture")
+
+    def __init__(self, label: str) -> None:
+        self.label = label
+        self.request_id = request_id_var.get()
+        self.started = time.monotonic()
+        self.thread_id = threading.get_ident()
+        try:
+            self.task: Optional[asyncio.Task] = asyncio.current_task()
+        except RuntimeError:
+            self.task = None  # not on an event loop
+        self.capture: Optional[dict] = None
+
+
+class SlowRequestWatchdog:
+    """Snapshots the stacks of watched blocks that run past a threshold."""
+
+    def __init__(self, logger: logging.Logger, threshold: float, keep: int) -> None:
+        self.logger = logger
+        self.threshold = threshold
+        self.captures: deque[dict] = deque(maxlen=keep)
+        self.active: dict[int, _Watch] = {}
+        self._ids = itertools.count()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @contextmanager
+    def watch(self, label: str) -> Iterator[None]:
+        if self.threshold <= 0:
+            yield
+            return
+        key, watch = next(self._ids), _Watch(label)
+        self.active[key] = watch
+        try:
+            yield
+        finally:
+            del self.active[key]
+            if watch.capture is not None:
+                watch.capture["duration"] = round(time.monotonic() - watch.started, 3)
+
+    def check(self) -> None:
+        """Capture every watched block past the threshold that has not been captured yet."""
+        now = time.monotonic()
+        frames = None
+        for watch in list(self.active.values()):
+            if watch.capture is not None or now - watch.started < self.threshold:
+                continue
+            if frames is None:
+                frames = sys._current_frames()
+            thread = frame_stack(frames[watch.thread_id]) if watch.thread_id in frames else []
+            stack = task_stack(watch.task) if watch.task is not None else []
+            # The task's innermost frame is on the thread: it is running, not awaiting
+            blocking = not stack or stack[-1] in thread
+            watch.capture = {
+                "label": watch.label,
+                "request_id": watch.request_id,
+                "captured_at": datetime.now(timezone.utc).isoformat(),
+                "elapsed": round(now - watch.started, 3),
+                "duration": None,  # filled in when the block finishes
+                "blocking": blocking,
+                "task": stack,
+                "thread": thread,
+            }
+            self.captures.append(watch.capture)
+            where = ((thread if blocking else stack) or ["unknown"])[-1]
+            state = "blocking its thread" if blocking else "awaiting"
+            self.logger.warning(
+                f"Slow {watch.label}: running for {now - watch.started:.1f}s, {state} in {where}"
+            )
+
+    def run(self) -> None:
+        interval = min(0.25, self.threshold / 4)
+        while not self._stop.wait(interval):
+            try:
+                self.check()
+            except Exception:
+                # A frame that vanished mid-walk: try again on the next tick
+                self.logger.debug("Slow request check failed", exc_info=True)
+
+    async def start(self) -> None:
+        if self.threshold > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self.run, name="slow-request-watchdog", daemon=True
+            )
+            self._thread.start()
+
+    async def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=1)
+            self._thread = None
+
+
+class SlowRequestMiddleware:
+    """Watches every HTTP request except the profiling endpoints themselves."""
+
+    def __init__(self, app: ASGIApp, watchdog: SlowRequestWatchdog) -> None:
+        self.app = app
+        self.watchdog = watchdog
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith("/debug/"):
+            await self.app(scope, receive, send)
+            return
+        with self.watchdog.watch(f"{scope['method']} {scope['path']}"):
+            await self.app(scope, receive, send)
+
+
+# -------------------------------------------------------------------------
+# Endpoints
+# -------------------------------------------------------------------------
+def _authorized(request: Request) -> Optional[Response]:
+    """None if the request may use /debug/*, otherwise the response to send."""
+    if not PROFILING_TOKEN:
+        return Response(status_code=404)
+    # Constant-time comparison; bytes, because compare_digest rejects non-ASCII str
+    sent = request.headers.get("authorization", "").encode()
+    if not hmac.compare_digest(sent, f"Bearer {PROFILING_TOKEN}".encode()):
+        return Response(status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    return None
+
+
+def add_profiling(app: FastAPI, logger: logging.Logger) -> SlowRequestWatchdog:
+    """Add the profiling endpoints and the slow-request watchdog to app."""
+    watchdog = SlowRequestWatchdog(logger, SLOW_REQUEST_THRESHOLD, SLOW_REQUEST_KEEP)
+    # Innermost, so RequestIdMiddleware has set the request id a capture records
+    app.user_middleware.append(Middleware(SlowRequestMiddleware, watchdog=watchdog))
+    app.add_event_handler("startup", watchdog.start)
+    app.add_event_handler("shutdown", watchdog.stop)
+
+    @app.get("/debug/profile", include_in_schema=False)
+    async def profile(
+        request: Request,
+        seconds: float = Query(10.0, gt=0),
+        rate: float = Query(100.0, gt=0, le=1000),
+        threads: str = Query("loop", pattern="^(loop|all)$"),
+    ):
+        denied = _authorized(request)
+        if denied is not None:
+            return denied
+        if not _profile_lock.acquire(blocking=False):
+            return JSONResponse({"error": "A profile is already running"}, status_code=409)
+        try:
+            thread_ids = {threading.get_ident()} if threads == "loop" else None
+            seconds = min(seconds, PROFILE_MAX_SECONDS)
+            logger.info(f"Profiling {threads} threads for {seconds:g}s at {rate:g} Hz")
+            counts = await asyncio.to_thread(sample_stacks, seconds, rate, thread_ids)
+        finally:
+            _profile_lock.release()
+        return PlainTextResponse(folded(counts))
+
+    @app.get("/debug/slow", include_in_schema=False)
+    async def slow_requests(request: Request):
+        denied = _authorized(request)
+        if denied is not None:
+            return denied
+        return {"threshold": watchdog.threshold, "captures": list(reversed(watchdog.captures))}
+
+    app.state.watchdog = watchdog
+    return watchdog
@@ -0,0 +1,36 @@
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+
+from shared import images
+from shared.images import ImageEngine
+
+pytestmark = pytest.mark.skipif(images.Image is None, reason="Pillow is not installed")
+
+
+def hang(*args) -> None:
+    """Stands in for convert_image on a pathological input (runs in a worker)."""
+    time.sleep(60)
+
+
+def test_timeout_kills_the_busy_worker(monkeypatch):
+    monkeypatch.setattr(images, "convert_image", hang)
+    engine = ImageEngine(workers=1, timeout=0.5)
+
+    async def run():
+        await engine.start()
+        pool = engine.pool
+        busy = list(pool._processes.values())
+        with pytest.raises(asyncio.TimeoutError):
+            await engine.convert(Path("in.png"), Path("out.webp"), "webp")
+        assert engine.pool is not pool
+        for process in busy:
+            process.join(5)
+            assert not process.is_alive()
+        # The new pool takes work straight away
+        assert await asyncio.get_running_loop().run_in_executor(engine.pool, images._ready)
+        await engine.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,26 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from shared import metrics
+from shared.metrics import instrument
+
+
+def client() -> TestClient:
+    app = FastAPI()
+    instrument(app, "test")
+    return TestClient(app)
+
+
+def test_metrics_are_off_without_a_token(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "")
+    assert client().get("/metrics").status_code == 404
+
+
+def test_metrics_need_the_token(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "secret")
+    with client() as c:
+        assert c.get("/metrics").status_code == 401
+        assert c.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+        response = c.get("/metrics", headers={"Authorization": "Bearer secret"})
+        assert response.status_code == 200
+        assert "http_requests_in_progress" in response.text